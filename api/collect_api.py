@@ -2,18 +2,18 @@
 API для Avatar: фото-доска Collect + webhook Plaud.
 - Фото из канала
 - Приём транскриптов Plaud через Zapier → Raw
-Запуск: python -m api.collect_api (порт 8080 по умолчанию)
+Продакшен: gunicorn -c deploy/gunicorn.conf.py "api.collect_api:create_app()"
+Локально: python -m api.collect_api (dev-сервер Flask, порт 8080 по умолчанию)
 """
 
+import html
 import json
 import os
-import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 
-import requests
 from dotenv import load_dotenv
-from flask import Flask, Response, jsonify, request
+from flask import Blueprint, Flask, Response, jsonify, request, send_file
 from flask_cors import CORS
 
 BASE = Path(__file__).resolve().parent.parent
@@ -28,6 +28,10 @@ for p in [BASE / ".env", Path.cwd() / ".env", BASE / "config" / ".env"]:
 if (BASE / ".env").exists():
     load_dotenv(dotenv_path=BASE / ".env", override=True)
 
+from api import jobs, media_cache, thumbnails, video_previews
+from api.telegram_client import TelegramError, get_client as get_telegram_client, metrics as telegram_metrics
+from db import cache as db_cache, connect
+
 BOT_TOKEN = (os.getenv("BOT_TOKEN") or "").strip()
 DB_PATH = os.getenv("DB_PATH", str(BASE / "db" / "collect.db"))
 
@@ -62,66 +66,140 @@ def _init_raw_owner_user_id():
 
 RAW_OWNER_USER_ID = _init_raw_owner_user_id()
 
-app = Flask(__name__)
-CORS(app)
-
 
-def get_published_entries() -> list[dict]:
-    """Опубликованные записи: id, comment, created_at, photo_file_id."""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        rows = conn.execute(
-            """
-            SELECT id, comment, created_at, photo_file_id
-            FROM collect_entries
-            WHERE published_to_channel = 1
-            ORDER BY created_at DESC
-            """
-        ).fetchall()
+def _init_db() -> None:
+    """Миграции схемы — один раз при старте API, не в каждом запросе.
+    Ошибка миграции не глушится: воркер падает и перезапускается, а не обслуживает старую схему."""
+    from db.migrations import migrate
+    migrate(DB_PATH)
+
+
+bp = Blueprint("collect_api", __name__)
+
+
+def create_app() -> Flask:
+    """Фабрика приложения: миграции + маршруты + воркер фоновых задач. Вызывается в каждом воркере gunicorn."""
+    _init_db()
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(bp)
+    # JOBS_WORKER=0 — задачи выполняет отдельный процесс: python -m api.jobs
+    if os.getenv("JOBS_WORKER", "1") != "0":
+        jobs.start_worker()
+    return app
+
+
+# Фото-доска: размер страницы по умолчанию и максимум
+ENTRIES_PAGE_SIZE = 60
+ENTRIES_MAX_PAGE_SIZE = 200
+
+
+def get_published_entries(before_id: int | None = None, limit: int = ENTRIES_PAGE_SIZE) -> list[dict]:
+    """Опубликованные записи (новые сверху), keyset-пагинация: before_id — id последней показанной."""
+    with connect(DB_PATH, readonly=True) as conn:
+        if before_id:
+            rows = conn.execute(
+                """
+                SELECT id, comment, created_at, COALESCE(media_type, 'photo') AS media_type
+                FROM collect_entries
+                WHERE published_to_channel = 1
+                  AND (created_at, id) < (SELECT created_at, id FROM collect_entries WHERE id = ?)
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+                """,
+                (before_id, limit),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                """
+                SELECT id, comment, created_at, COALESCE(media_type, 'photo') AS media_type
+                FROM collect_entries
+                WHERE published_to_channel = 1
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+                """,
+                (limit,),
+            ).fetchall()
     return [
         {
             "id": r["id"],
             "comment": (r["comment"] or "").strip() or None,
             "created_at": r["created_at"],
-            "photo_file_id": r["photo_file_id"],
+            "media_type": r["media_type"],
+            **_media_urls(r["id"], r["media_type"]),
         }
         for r in rows
     ]
 
 
-def get_photo_file_path(entry_id: int) -> str | None:
-    """Получить file_path из Telegram по entry_id."""
-    with sqlite3.connect(DB_PATH) as conn:
+def _media_urls(entry_id: int, media_type: str) -> dict:
+    """Фото — srcset превью; видео — постер и короткое превью вместо полного файла."""
+    if media_type in video_previews.VIDEO_TYPES:
+        return {
+            "srcset": None,
+            "poster": f"/api/photo/{entry_id}/poster",
+            "preview": f"/api/photo/{entry_id}/preview",
+        }
+    return {"srcset": thumbnails.srcset(entry_id)}
+
+
+def get_published_version() -> tuple[int, int]:
+    """(max(id), count) опубликованных — основа ETag доски. Считается по индексу."""
+    with connect(DB_PATH, readonly=True) as conn:
         row = conn.execute(
-            "SELECT photo_file_id FROM collect_entries WHERE id = ? AND published_to_channel = 1",
+            "SELECT COALESCE(MAX(id), 0), COUNT(*) FROM collect_entries WHERE published_to_channel = 1"
+        ).fetchone()
+    return row[0], row[1]
+
+
+def get_photo_entry(entry_id: int) -> dict | None:
+    """file_id, file_unique_id, media_type и created_at опубликованной записи."""
+    with connect(DB_PATH, readonly=True) as conn:
+        row = conn.execute(
+            """
+            SELECT photo_file_id, file_unique_id, COALESCE(media_type, 'photo') AS media_type, created_at
+            FROM collect_entries WHERE id = ? AND published_to_channel = 1
+            """,
             (entry_id,),
         ).fetchone()
-    if not row:
-        return None
-    file_id = row[0]
-    if not BOT_TOKEN:
-        return None
-    r = requests.get(
-        f"https://api.telegram.org/bot{BOT_TOKEN}/getFile",
-        params={"file_id": file_id},
-        timeout=10,
-    )
-    if not r.ok:
-        return None
-    data = r.json()
-    if not data.get("ok"):
-        return None
-    return data["result"].get("file_path")
+    return dict(row) if row else None
+
 
+def _remember_file_unique_id(entry_id: int, file_unique_id: str) -> None:
+    """Старые записи без file_unique_id: запоминаем после первого getFile, дальше кэш без сети."""
+    with connect(DB_PATH) as conn:
+        conn.execute(
+            "UPDATE collect_entries SET file_unique_id = ? WHERE id = ? AND file_unique_id IS NULL",
+            (file_unique_id, entry_id),
+        )
 
-@app.route("/api/collect/entries", methods=["GET"])
+
+@bp.route("/api/collect/entries", methods=["GET"])
 def api_entries():
-    """Список опубликованных записей (хронология, новые сверху)."""
-    entries = get_published_entries()
-    return jsonify(entries)
+    """
+    Опубликованные записи (хронология, новые сверху). ?before_id=&limit=
+    Ответ: {entries, next_before_id}. ETag из max(id) и числа записей — повторная загрузка → 304.
+    """
+    try:
+        before_id = int(request.args.get("before_id") or 0) or None
+        limit = min(max(int(request.args.get("limit") or ENTRIES_PAGE_SIZE), 1), ENTRIES_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "before_id and limit must be integers"}), 400
+    max_id, count = get_published_version()
+    etag = f"e{max_id}-{count}-{before_id or 0}-{limit}"
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        entries = get_published_entries(before_id=before_id, limit=limit)
+        next_before_id = entries[-1]["id"] if len(entries) == limit else None
+        resp = jsonify({"entries": entries, "next_before_id": next_before_id})
+    resp.set_etag(etag, weak=True)
+    # Браузер хранит ответ, но каждый раз сверяет ETag
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 
-@app.route("/api/plaud/webhook", methods=["POST"])
+@bp.route("/api/plaud/webhook", methods=["POST"])
 def plaud_webhook():
     """
     Webhook для Zapier: Plaud (Transcript & Summary Ready) → POST сюда.
@@ -147,7 +225,7 @@ def plaud_webhook():
     meta_json = json.dumps(metadata) if metadata else None
     user_id = RAW_OWNER_USER_ID
     chat_id = 0
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         cur = conn.execute(
             """
             INSERT INTO raw (user_id, chat_id, title, content, source, created_at, rapa_stage, metadata, tags)
@@ -164,7 +242,7 @@ def plaud_webhook():
     return jsonify({"status": "ok", "raw_id": rowid}), 200
 
 
-@app.route("/api/rapa/review", methods=["GET"])
+@bp.route("/api/rapa/review", methods=["GET"])
 def rapa_review():
     """Обзор RAPA: ?period=daily|weekly|monthly. Требует RAW_OWNER_USER_ID."""
     period = (request.args.get("period") or "daily").lower()
@@ -184,7 +262,7 @@ def rapa_review():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/rapa/raw", methods=["GET"])
+@bp.route("/api/rapa/raw", methods=["GET"])
 def rapa_raw():
     """Список Raw за последние N дней. ?days=7"""
     user_id = RAW_OWNER_USER_ID
@@ -200,22 +278,86 @@ def rapa_raw():
         return jsonify({"error": str(e)}), 500
 
 
-def _ensure_rapa_schema():
+# Маркеры подсветки из FTS5: экранируем текст целиком, потом превращаем маркеры в <mark>
+_HL_START, _HL_END = "\x02", "\x03"
+
+
+def _highlight_html(text: str | None) -> str | None:
+    if text is None:
+        return None
+    return html.escape(text).replace(_HL_START, "<mark>").replace(_HL_END, "</mark>")
+
+
+@bp.route("/api/rapa/search", methods=["GET"])
+def rapa_search():
+    """Полнотекстовый поиск по Raw. ?q=текст&page=1&limit=20. title/snippet — HTML с <mark>."""
+    user_id = RAW_OWNER_USER_ID
+    if not user_id:
+        return jsonify({"error": "RAW_OWNER_USER_ID not set"}), 400
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"error": "q required"}), 400
     try:
-        from bot.rapa import init_rapa_schema
-        with sqlite3.connect(DB_PATH) as conn:
-            init_rapa_schema(conn)
-    except Exception:
-        pass
+        limit = min(max(int(request.args.get("limit", 20)), 1), 100)
+        page = max(int(request.args.get("page", 1)), 1)
+    except ValueError:
+        return jsonify({"error": "page and limit must be integers"}), 400
+    try:
+        from bot.rapa import search_raw
+        res = search_raw(user_id, q, limit=limit, offset=(page - 1) * limit, mark=(_HL_START, _HL_END))
+        for item in res["items"]:
+            item["title"] = _highlight_html(item["title"])
+            item["snippet"] = _highlight_html(item["snippet"])
+        return jsonify({"q": q, "page": page, "limit": limit, "items": res["items"], "has_more": res["has_more"]})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
+# Переклассификация всей raw (bot/reclassify.py) — фоновой задачей: на большой таблице это минуты
+RECLASSIFY_TIMEOUT = float(os.getenv("RECLASSIFY_TIMEOUT", "3600"))
 
-@app.route("/api/rapa/projects", methods=["GET"])
+
+def _run_rapa_reclassify(job: dict) -> dict:
+    from bot.reclassify import reclassify
+
+    return reclassify(DB_PATH, dry_run=job["dry_run"], resume=job["resume"], user_id=job["user_id"])
+
+
+jobs.register("rapa_reclassify", _run_rapa_reclassify, timeout=RECLASSIFY_TIMEOUT)
+
+
+@bp.route("/api/rapa/reclassify", methods=["GET", "POST"])
+def rapa_reclassify():
+    """
+    POST { dry_run?: bool, resume?: bool } — переклассифицировать Raw владельца, 202 { job_id, status_url };
+    итог (в dry-run — переходы областей и diff) — GET /api/jobs/<job_id>. GET — прогресс последних запусков.
+    """
+    user_id = RAW_OWNER_USER_ID
+    if not user_id:
+        return jsonify({"error": "RAW_OWNER_USER_ID not set"}), 400
+    from bot.reclassify import checkpoint_name, get_checkpoint
+    if request.method == "GET":
+        return jsonify({"run": get_checkpoint(checkpoint_name(False, user_id), DB_PATH),
+                        "dry_run": get_checkpoint(checkpoint_name(True, user_id), DB_PATH)})
+    data = request.get_json(force=True, silent=True) or {}
+    # Одна попытка: проход после таймаута не остановить (нить и пул процессов живут дальше),
+    # повтор запустил бы второй проход параллельно с ним. Продолжить — POST с resume: true
+    job_id = jobs.enqueue("rapa_reclassify", {
+        "user_id": user_id, "dry_run": bool(data.get("dry_run")), "resume": bool(data.get("resume")),
+    }, max_attempts=1)
+    status_url = f"/api/jobs/{job_id}"
+    resp = jsonify({"status": "queued", "job_id": job_id, "status_url": status_url})
+    resp.status_code = 202
+    resp.headers["Location"] = status_url
+    return resp
+
+
+@bp.route("/api/rapa/projects", methods=["GET"])
 def rapa_projects():
     """Список проектов для GTD."""
     user_id = RAW_OWNER_USER_ID
     if not user_id:
         return jsonify({"error": "RAW_OWNER_USER_ID not set"}), 400
-    _ensure_rapa_schema()
     try:
         from bot.rapa import get_all_projects
         items = get_all_projects(user_id)
@@ -224,13 +366,12 @@ def rapa_projects():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/rapa/areas", methods=["GET"])
+@bp.route("/api/rapa/areas", methods=["GET"])
 def rapa_areas():
     """Список областей для GTD."""
     user_id = RAW_OWNER_USER_ID
     if not user_id:
         return jsonify({"error": "RAW_OWNER_USER_ID not set"}), 400
-    _ensure_rapa_schema()
     try:
         from bot.rapa import get_all_areas
         items = get_all_areas(user_id)
@@ -239,7 +380,27 @@ def rapa_areas():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/rapa/goals", methods=["GET", "POST"])
+@bp.route("/api/rapa/raw/<int:raw_id>/related", methods=["GET"])
+def rapa_raw_related(raw_id: int):
+    """Похожие Raw (заметки, ресурсы) и проекты для записи; ?k= — сколько (до 50). Локальный индекс bot/related.py."""
+    user_id = RAW_OWNER_USER_ID
+    if not user_id:
+        return jsonify({"error": "RAW_OWNER_USER_ID not set"}), 400
+    k = min(max(request.args.get("k", 10, type=int) or 10, 1), 50)
+    try:
+        from bot import related
+        if related.get_index(DB_PATH) is None:
+            return jsonify({"error": "related index unavailable (numpy not installed)"}), 503
+        items = related.related_items(raw_id, user_id, k=k, path=DB_PATH)
+        if items is None:
+            return jsonify({"error": "raw not found"}), 404
+        return jsonify({"raw_id": raw_id, "related": items,
+                        "suggested_project": related.suggest_for_raw(raw_id, user_id, DB_PATH)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/api/rapa/goals", methods=["GET", "POST"])
 def rapa_goals():
     """Цели на год. GET ?year=2026. POST: {name, area_id?, year?, description?}"""
     user_id = RAW_OWNER_USER_ID
@@ -255,22 +416,17 @@ def rapa_goals():
             year = int(data.get("year", datetime.now().year))
             description = (data.get("description") or "").strip()
             created_at = datetime.utcnow().isoformat()
-            with sqlite3.connect(DB_PATH) as conn:
-                try:
-                    from bot.rapa import init_rapa_schema
-                    init_rapa_schema(conn)
-                except Exception:
-                    pass
+            with connect(DB_PATH) as conn:
                 cur = conn.execute(
                     "INSERT INTO rapa_goals (user_id, area_id, year, name, description, status, created_at) VALUES (?, ?, ?, ?, ?, 'active', ?)",
                     (user_id, area_id, year, name, description or None, created_at),
                 )
                 rowid = cur.lastrowid
+            db_cache.invalidate(DB_PATH)  # своя запись — видна сразу, не через CACHE_CHECK_MS
             return jsonify({"status": "ok", "id": rowid, "year": year}), 201
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     year = int(request.args.get("year", datetime.now().year))
-    _ensure_rapa_schema()
     try:
         from bot.rapa import get_goals_for_year
         items = get_goals_for_year(user_id, year)
@@ -279,22 +435,9 @@ def rapa_goals():
         return jsonify({"error": str(e)}), 500
 
 
-def _ensure_sprint_reports():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS sprint_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sprint_id TEXT NOT NULL,
-                user_id INTEGER NOT NULL,
-                submitted_at TEXT NOT NULL,
-                UNIQUE(sprint_id, user_id)
-            );
-        """)
-
-
 def _sprint_report_submitted(sprint_id: str, user_id: int) -> bool:
     """Проверяет, сдан ли отчёт по спринту."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH, readonly=True) as conn:
         row = conn.execute(
             "SELECT 1 FROM sprint_reports WHERE sprint_id = ? AND user_id = ?",
             (sprint_id, user_id),
@@ -303,7 +446,7 @@ def _sprint_report_submitted(sprint_id: str, user_id: int) -> bool:
 
 
 def _save_sprint_report(sprint_id: str, user_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         conn.execute(
             "INSERT OR REPLACE INTO sprint_reports (sprint_id, user_id, submitted_at) VALUES (?, ?, ?)",
             (sprint_id, user_id, datetime.utcnow().isoformat()),
@@ -316,18 +459,11 @@ def _send_doc_via_bot(file_path: Path, chat_id: int, caption: str = "") -> tuple
         return False, "BOT_TOKEN не задан"
     mime = "text/plain; charset=utf-8" if file_path.suffix.lower() == ".txt" else "application/pdf"
     try:
-        with open(file_path, "rb") as f:
-            r = requests.post(
-                f"https://api.telegram.org/bot{BOT_TOKEN}/sendDocument",
-                data={"chat_id": chat_id, "caption": caption or "Анализ спринта от Perplexity"},
-                files={"document": (file_path.name, f, mime)},
-                timeout=30,
-            )
-        j = r.json() if r.ok else {}
-        if j.get("ok"):
-            return True, ""
-        return False, j.get("description", r.text or str(r.status_code))
-    except Exception as e:
+        get_telegram_client(BOT_TOKEN).send_document(
+            chat_id, file_path, caption=caption or "Анализ спринта от Perplexity", mime=mime
+        )
+        return True, ""
+    except (TelegramError, OSError) as e:
         return False, str(e)
 
 
@@ -337,24 +473,16 @@ def _send_long_text_via_bot(chat_id: int, text: str, title: str = "Анализ
         return False, "BOT_TOKEN не задан"
     if not text:
         return False, "пустой текст"
+    tg = get_telegram_client(BOT_TOKEN)
     chunk_size = 4000
     parts = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
-    last_err = ""
     for i, part in enumerate(parts):
         prefix = f"📋 {title} (часть {i + 1}/{len(parts)})\n\n" if len(parts) > 1 and i == 0 else ("\n\n" if i else "")
         msg = (prefix + part) if i == 0 else part
         try:
-            r = requests.post(
-                f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage",
-                json={"chat_id": chat_id, "text": msg},
-                timeout=30,
-            )
-            j = r.json() if r.ok else {}
-            if not j.get("ok"):
-                last_err = j.get("description", r.text or str(r.status_code))
-                return False, last_err
-        except Exception as e:
-            return False, str(e)
+            tg.send_message(chat_id, msg)
+        except TelegramError as e:
+            return False, e.description
     return True, ""
 
 
@@ -401,16 +529,49 @@ def _get_raw_owner_user_id():
     return 0
 
 
-@app.route("/api/gtd/sprint-report-version", methods=["GET"])
+@bp.route("/api/gtd/sprint-report-version", methods=["GET"])
 def api_sprint_report_version():
     """Проверка: новая версия API (без PDF). Открой в браузере http://localhost:8080/api/gtd/sprint-report-version"""
-    return jsonify({"sprint_report": "text_only", "ok": True}), 200
+    return jsonify({"sprint_report": "text_only", "mode": "job", "ok": True}), 200
+
+
+# Таймаут попытки задачи sprint_report; запрос к LLM — короче, чтобы попытка завершалась сама,
+# а не бросалась очередью (брошенная дошлёт анализ в Telegram вторым сообщением)
+SPRINT_REPORT_TIMEOUT = float(os.getenv("SPRINT_REPORT_TIMEOUT", "120"))
+
+
+def _run_sprint_report(job: dict) -> dict:
+    """Задача sprint_report: Perplexity-анализ → текстом в Collect бот. Результат — прежний ответ эндпоинта."""
+    try:
+        from api.sprint_perplexity import call_perplexity
+    except ImportError as e:
+        raise jobs.PermanentJobError(str(e))
+    try:
+        analysis = call_perplexity(job["payload"], timeout=SPRINT_REPORT_TIMEOUT * 0.75)
+    except ValueError as e:
+        # Нет PERPLEXITY_API_KEY — повтор не поможет
+        raise jobs.PermanentJobError(f"Perplexity: {e}")
+    # Отправляем анализ текстом в Telegram (без PDF — избегаем ошибки fpdf "Not enough horizontal space")
+    sent, telegram_error = _send_long_text_via_bot(job["user_id"], analysis, f"Анализ спринта {job['sprint_id']}")
+    if sent:
+        return {"status": "ok", "submitted": True, "pdf_sent": False, "analysis": analysis}
+    return {
+        "status": "ok",
+        "submitted": True,
+        "warning": "В Telegram не отправилось.",
+        "telegram_error": telegram_error,
+        "analysis": analysis,
+    }
+
 
+jobs.register("sprint_report", _run_sprint_report, timeout=SPRINT_REPORT_TIMEOUT)
 
-@app.route("/api/gtd/sprint-report", methods=["POST"])
+
+@bp.route("/api/gtd/sprint-report", methods=["POST"])
 def api_sprint_report():
     """
-    Приём отчёта по спринту: Perplexity-анализ → отправка текстом в Collect бот (без PDF).
+    Приём отчёта по спринту: отчёт отмечается сданным, анализ Perplexity + отправка в Collect бот —
+    фоновой задачей. Ответ 202 { job_id, status_url }; результат — GET /api/jobs/<job_id>.
     POST JSON: { sprint_id, sprint: {...}, items: [...], insights: [...], comment?: str }
     sprint_id например "s4_2026" для напоминаний.
     """
@@ -439,30 +600,42 @@ def api_sprint_report():
     if comment:
         sprint = {**sprint, "comment": comment}
     payload = {"sprint": sprint, "items": items, "insights": insights}
-    _ensure_sprint_reports()
     _save_sprint_report(sprint_id, user_id)
-    try:
-        from api.sprint_perplexity import call_perplexity
-        analysis = call_perplexity(payload)
-    except Exception as e:
-        return jsonify({"error": f"Perplexity: {e}", "submitted": True}), 500
-    # Отправляем анализ текстом в Telegram (без PDF — избегаем ошибки fpdf "Not enough horizontal space")
-    sent, telegram_error = _send_long_text_via_bot(user_id, analysis, f"Анализ спринта {sprint_id}")
+    job_id = jobs.enqueue("sprint_report", {"user_id": user_id, "sprint_id": sprint_id, "payload": payload})
+    status_url = f"/api/jobs/{job_id}"
+    resp = jsonify({"status": "queued", "submitted": True, "job_id": job_id, "status_url": status_url})
+    resp.status_code = 202
+    resp.headers["Location"] = status_url
+    return resp
 
-    # Всегда возвращаем analysis, чтобы на сайте можно было открыть окно с текстом
-    if sent:
-        return jsonify({"status": "ok", "submitted": True, "pdf_sent": False, "analysis": analysis}), 200
-    return jsonify({
-        "status": "ok",
-        "submitted": True,
-        "warning": "В Telegram не отправилось.",
-        "telegram_error": telegram_error,
-        "analysis": analysis,
-    }), 200
+
+@bp.route("/api/metrics/telegram", methods=["GET"])
+def api_telegram_metrics():
+    """Счётчики вызовов Bot API этого процесса: calls, errors, retries, retry_after, время."""
+    return jsonify(telegram_metrics())
+
+
+@bp.route("/api/metrics/cache", methods=["GET"])
+def api_cache_metrics():
+    """Кэш справочников этого процесса (db/cache.py): hits, misses, stale, size по функциям."""
+    return jsonify(db_cache.metrics())
+
+
+@bp.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id: str):
+    """Статус фоновой задачи: queued | running | done | failed; result — когда done."""
+    job = jobs.get_job(job_id)
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+    resp = jsonify(job)
+    resp.headers["Cache-Control"] = "no-store"
+    if job["status"] in ("queued", "running"):
+        resp.headers["Retry-After"] = "2"
+    return resp
 
 
 # ---------- Diary / Evernote ----------
-@app.route("/api/diary/evernote/auth", methods=["GET"])
+@bp.route("/api/diary/evernote/auth", methods=["GET"])
 def api_diary_evernote_auth():
     """Старт OAuth: редирект на Evernote. После авторизации пользователь вернётся на callback."""
     user_id = RAW_OWNER_USER_ID
@@ -479,7 +652,7 @@ def api_diary_evernote_auth():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/diary/evernote/callback", methods=["GET"])
+@bp.route("/api/diary/evernote/callback", methods=["GET"])
 def api_diary_evernote_callback():
     """Callback от Evernote после OAuth. Сохраняет токен и редиректит на сайт."""
     user_id = RAW_OWNER_USER_ID
@@ -508,7 +681,7 @@ def api_diary_evernote_callback():
     return redirect(front + "#diary-evernote-connected")
 
 
-@app.route("/api/diary/evernote/notes", methods=["GET"])
+@bp.route("/api/diary/evernote/notes", methods=["GET"])
 def api_diary_evernote_notes():
     """Список заметок из Evernote (по сохранённому токену)."""
     user_id = RAW_OWNER_USER_ID
@@ -525,7 +698,7 @@ def api_diary_evernote_notes():
         return jsonify({"error": str(e), "notes": []}), 500
 
 
-@app.route("/api/diary/evernote/status", methods=["GET"])
+@bp.route("/api/diary/evernote/status", methods=["GET"])
 def api_diary_evernote_status():
     """Проверка: подключён ли Evernote."""
     user_id = RAW_OWNER_USER_ID
@@ -539,26 +712,126 @@ def api_diary_evernote_status():
         return jsonify({"connected": False})
 
 
-@app.route("/api/photo/<int:entry_id>", methods=["GET"])
+def _original_media(entry_id: int, entry: dict) -> tuple[Path | None, str | None, Response | None]:
+    """Оригинал из дискового кэша или Telegram: (path, file_unique_id, None) либо (None, None, ответ-ошибка)."""
+    unique_id = entry["file_unique_id"]
+    path = media_cache.lookup(unique_id) if unique_id else None
+    if path is not None:
+        return path, unique_id, None
+    if not BOT_TOKEN:
+        return None, None, Response("Not found", status=404)
+    info = media_cache.get_file_info(BOT_TOKEN, entry["photo_file_id"])
+    if not info:
+        return None, None, Response("Not found", status=404)
+    if not unique_id:
+        unique_id = info["file_unique_id"]
+        _remember_file_unique_id(entry_id, unique_id)
+    path = media_cache.download(BOT_TOKEN, info["file_path"], unique_id)
+    if path is None:
+        return None, None, Response("Failed to fetch", status=502)
+    return path, unique_id, None
+
+
+def _send_cached(path: Path, mimetype: str, etag: str, created_at: str | None) -> Response:
+    try:
+        created = datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        created = None
+    try:
+        return send_file(path, mimetype=mimetype, conditional=True, etag=etag, last_modified=created, max_age=86400)
+    except FileNotFoundError:
+        # Вытеснен из кэша между lookup и отдачей — клиент повторит запрос
+        return Response("Try again", status=503, headers={"Retry-After": "1"})
+
+
+@bp.route("/api/photo/<int:entry_id>", methods=["GET"])
 def api_photo(entry_id: int):
-    """Прокси фото из Telegram по id записи."""
-    file_path = get_photo_file_path(entry_id)
-    if not file_path or not BOT_TOKEN:
+    """
+    Медиа записи из дискового кэша (api/media_cache.py); промах — скачивание из Telegram. Range, ETag, 304.
+    ?w=320|640|1280 — превью фото (api/thumbnails.py), WebP если браузер его принимает, иначе JPEG.
+    """
+    entry = get_photo_entry(entry_id)
+    if not entry:
         return Response("Not found", status=404)
-    url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-    r = requests.get(url, timeout=15)
-    if not r.ok:
-        return Response("Failed to fetch", status=502)
-    ext = (file_path or "").lower().split(".")[-1]
-    mime = "image/jpeg" if ext in ("jpg", "jpeg") else ("image/png" if ext == "png" else "image/jpeg")
-    return Response(
-        r.content,
-        mimetype=mime,
-        headers={"Cache-Control": "public, max-age=86400"},
-    )
+    width = request.args.get("w", type=int)
+    thumb = width and entry["media_type"] == "photo"
+    fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpg"
+    if thumb and entry["file_unique_id"]:
+        cached = thumbnails.cached_thumbnail(entry["file_unique_id"], width, fmt)
+        if cached:
+            return _send_thumbnail(cached, entry["file_unique_id"], width, fmt, entry["created_at"])
+    path, unique_id, error = _original_media(entry_id, entry)
+    if error is not None:
+        return error
+    if thumb:
+        rendered = thumbnails.get_thumbnail(path, unique_id, width, fmt)
+        if rendered:
+            return _send_thumbnail(rendered, unique_id, width, fmt, entry["created_at"])
+    return _send_cached(path, media_cache.mimetype_for(path, entry["media_type"]), unique_id, entry["created_at"])
+
+
+def _send_thumbnail(path: Path, unique_id: str, width: int, fmt: str, created_at: str | None) -> Response:
+    etag = f"{unique_id}~{thumbnails.snap_width(width)}.{fmt}"
+    resp = _send_cached(path, thumbnails.THUMB_FORMATS[fmt], etag, created_at)
+    # Формат выбран по Accept — кэши должны различать
+    resp.vary.add("Accept")
+    return resp
+
+
+def get_video_entry_ids() -> list[int]:
+    with connect(DB_PATH, readonly=True) as conn:
+        rows = conn.execute(
+            "SELECT id FROM collect_entries WHERE published_to_channel = 1 AND media_type IN ('video', 'video_note') ORDER BY id"
+        ).fetchall()
+    return [r[0] for r in rows]
+
+
+def build_video_previews(entry_id: int) -> bool:
+    """Скачивает оригинал видео (если его нет в кэше) и делает постер + превью. True — постер готов."""
+    entry = get_photo_entry(entry_id)
+    if not entry or entry["media_type"] not in video_previews.VIDEO_TYPES:
+        return False
+    if entry["file_unique_id"] and video_previews.cached(entry["file_unique_id"], "preview"):
+        return True
+    path, unique_id, error = _original_media(entry_id, entry)
+    if error is not None:
+        return False
+    return video_previews.render(path, unique_id)
+
+
+def _video_derivative(entry_id: int, kind: str) -> tuple[dict | None, Path | None]:
+    """Запись и готовый постер/превью; если не готово — ставит генерацию в фоновую очередь."""
+    entry = get_photo_entry(entry_id)
+    if not entry or entry["media_type"] not in video_previews.VIDEO_TYPES:
+        return None, None
+    unique_id = entry["file_unique_id"]
+    path = video_previews.cached(unique_id, kind) if unique_id else None
+    if path is None:
+        video_previews.enqueue(entry_id, lambda: build_video_previews(entry_id))
+    return entry, path
+
+
+@bp.route("/api/photo/<int:entry_id>/poster", methods=["GET"])
+def api_video_poster(entry_id: int):
+    """Постер видео-записи; пока не готов — заглушка SVG без кэширования."""
+    entry, path = _video_derivative(entry_id, "poster")
+    if entry is None:
+        return Response("Not found", status=404)
+    if path is None:
+        return Response(video_previews.PLACEHOLDER_SVG, mimetype="image/svg+xml", headers={"Cache-Control": "no-store"})
+    return _send_cached(path, "image/jpeg", f"{entry['file_unique_id']}~poster", entry["created_at"])
+
+
+@bp.route("/api/photo/<int:entry_id>/preview", methods=["GET"])
+def api_video_preview(entry_id: int):
+    """Короткое немое превью видео-записи (mp4, Range). Пока не готово — 404 с Retry-After."""
+    entry, path = _video_derivative(entry_id, "preview")
+    if entry is None or path is None:
+        return Response("Not found", status=404, headers={"Retry-After": "30"} if entry else None)
+    return _send_cached(path, "video/mp4", f"{entry['file_unique_id']}~preview", entry["created_at"])
 
 
 if __name__ == "__main__":
     port = int(os.getenv("COLLECT_API_PORT", "8080"))
-    print("Collect API: sprint-report без PDF (только текст) — порт", port)
-    app.run(host="0.0.0.0", port=port, debug=False)
+    print("Collect API (dev-сервер): sprint-report без PDF (только текст) — порт", port)
+    create_app().run(host="0.0.0.0", port=port, debug=False)
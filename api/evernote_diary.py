@@ -6,7 +6,7 @@ Evernote OAuth 1.0 и получение заметок для раздела Di
 
 import os
 import re
-import sqlite3
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -24,23 +24,14 @@ DB_PATH = os.getenv("DB_PATH", str(BASE / "db" / "collect.db"))
 # Без слеша в конце. Для локальной разработки: http://localhost:8080
 EVERNOTE_CALLBACK_BASE = (os.getenv("EVERNOTE_CALLBACK_BASE") or "").strip()
 
-
-def _ensure_evernote_table(conn: sqlite3.Connection) -> None:
-    conn.executescript("""
-        CREATE TABLE IF NOT EXISTS evernote_tokens (
-            user_id INTEGER PRIMARY KEY,
-            access_token TEXT NOT NULL,
-            note_store_url TEXT,
-            expires_at TEXT,
-            updated_at TEXT NOT NULL
-        );
-    """)
+if str(BASE) not in sys.path:
+    sys.path.insert(0, str(BASE))
+from db import connect
 
 
 def get_evernote_token(user_id: int) -> dict | None:
     """Возвращает {access_token, note_store_url} или None."""
-    with sqlite3.connect(DB_PATH) as conn:
-        _ensure_evernote_table(conn)
+    with connect(DB_PATH, readonly=True) as conn:
         row = conn.execute(
             "SELECT access_token, note_store_url FROM evernote_tokens WHERE user_id = ?",
             (user_id,),
@@ -52,8 +43,7 @@ def get_evernote_token(user_id: int) -> dict | None:
 
 def save_evernote_token(user_id: int, access_token: str, note_store_url: str = "", expires_at: str = "") -> None:
     from datetime import datetime
-    with sqlite3.connect(DB_PATH) as conn:
-        _ensure_evernote_table(conn)
+    with connect(DB_PATH) as conn:
         conn.execute(
             """INSERT OR REPLACE INTO evernote_tokens (user_id, access_token, note_store_url, expires_at, updated_at)
                VALUES (?, ?, ?, ?, ?)""",
@@ -61,16 +51,6 @@ def save_evernote_token(user_id: int, access_token: str, note_store_url: str = "
         )
 
 
-def _ensure_oauth_state_table(conn: sqlite3.Connection) -> None:
-    conn.executescript("""
-        CREATE TABLE IF NOT EXISTS evernote_oauth_state (
-            request_token TEXT PRIMARY KEY,
-            request_token_secret TEXT NOT NULL,
-            created_at TEXT NOT NULL
-        );
-    """)
-
-
 def start_oauth(callback_url: str) -> str:
     """
     Начать OAuth: сохраняет request token в БД, возвращает URL для редиректа на Evernote.
@@ -90,8 +70,7 @@ def start_oauth(callback_url: str) -> str:
     oauth.fetch_request_token(request_token_url)
     auth_url = oauth.authorization_url("https://www.evernote.com/OAuth.action")
     from datetime import datetime
-    with sqlite3.connect(DB_PATH) as conn:
-        _ensure_oauth_state_table(conn)
+    with connect(DB_PATH) as conn:
         conn.execute(
             "INSERT OR REPLACE INTO evernote_oauth_state (request_token, request_token_secret, created_at) VALUES (?, ?, ?)",
             (oauth.token.get("oauth_token"), oauth.token.get("oauth_token_secret", ""), datetime.utcnow().isoformat()),
@@ -108,8 +87,7 @@ def finish_oauth(oauth_token: str, oauth_verifier: str, user_id: int) -> dict:
         from requests_oauthlib import OAuth1Session
     except ImportError:
         raise RuntimeError("Установи requests_oauthlib: pip install requests_oauthlib")
-    with sqlite3.connect(DB_PATH) as conn:
-        _ensure_oauth_state_table(conn)
+    with connect(DB_PATH) as conn:
         row = conn.execute(
             "SELECT request_token_secret FROM evernote_oauth_state WHERE request_token = ?",
             (oauth_token,),
@@ -0,0 +1,230 @@
+"""
+Фоновые задачи API в SQLite (таблица jobs): запрос ставит задачу и сразу отвечает 202,
+воркер выполняет её с таймаутом и повторами, клиент опрашивает /api/jobs/<id>.
+
+Воркер — поток в каждом процессе API (gunicorn-воркеры забирают задачи атомарно,
+UPDATE … RETURNING) или отдельный процесс: python -m api.jobs.
+Задача «running» с истёкшей арендой (процесс упал) снова забирается.
+
+    register("sprint_report", run_sprint_report, timeout=120)
+    job_id = enqueue("sprint_report", {...})
+"""
+
+import json
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+from typing import Callable
+
+from db import connect
+
+POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "1.0"))
+# Пауза перед повтором: RETRY_BASE_DELAY * 2^(попытка-1) секунд
+RETRY_BASE_DELAY = float(os.getenv("JOBS_RETRY_BASE_DELAY", "10"))
+LEASE_GRACE = 30
+# Завершённые задачи храним столько дней (результат успевает забрать клиент)
+KEEP_DAYS = int(os.getenv("JOBS_KEEP_DAYS", "7"))
+PRUNE_INTERVAL = 3600
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentJobError(Exception):
+    """Ошибка, которую повтор не исправит (нет ключа, неверные данные) — задача сразу failed."""
+
+
+_handlers: dict[str, tuple[Callable[[dict], dict], float]] = {}
+_wakeup = threading.Event()
+_worker_thread: threading.Thread | None = None
+_stop = threading.Event()
+
+
+def _worker_id() -> str:
+    # pid на каждый вызов: при gunicorn --preload модуль импортирован ещё в мастере
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def register(kind: str, handler: Callable[[dict], dict], timeout: float = 120) -> None:
+    """handler(payload) -> result (JSON-сериализуемый dict). timeout — на одну попытку, секунды."""
+    _handlers[kind] = (handler, timeout)
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+def enqueue(kind: str, payload: dict, max_attempts: int = 3) -> str:
+    job_id = secrets.token_urlsafe(12)
+    now = _now().isoformat()
+    with connect() as conn:
+        conn.execute(
+            """
+            INSERT INTO jobs (id, kind, payload, status, attempts, max_attempts, run_after, created_at, updated_at)
+            VALUES (?, ?, ?, 'queued', 0, ?, ?, ?, ?)
+            """,
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), max_attempts, now, now, now),
+        )
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id: str) -> dict | None:
+    """Состояние задачи для клиента (без payload)."""
+    with connect(readonly=True) as conn:
+        row = conn.execute(
+            """
+            SELECT id, kind, status, attempts, max_attempts, run_after, result, error, created_at, updated_at
+            FROM jobs WHERE id = ?
+            """,
+            (job_id,),
+        ).fetchone()
+    if not row:
+        return None
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def claim(kinds: list[str]) -> dict | None:
+    """Забирает одну готовую задачу (или брошенную с истёкшей арендой). Атомарно между процессами."""
+    if not kinds:
+        return None
+    now = _now()
+    marks = ",".join("?" * len(kinds))
+    # Аренда — по таймауту вида забранной задачи: долгий вид не должен держать брошенные короткие задачи
+    leases = " ".join("WHEN ? THEN ?" for _ in kinds)
+    lease_args = [x for k in kinds for x in (k, (now + timedelta(seconds=_handlers[k][1] + LEASE_GRACE)).isoformat())]
+    with connect() as conn:
+        row = conn.execute(
+            f"""
+            UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                locked_until = CASE kind {leases} END, locked_by = ?, updated_at = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE kind IN ({marks})
+                  AND ((status = 'queued' AND run_after <= ?) OR (status = 'running' AND locked_until < ?))
+                ORDER BY run_after LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts, max_attempts
+            """,
+            (
+                *lease_args, _worker_id(), now.isoformat(),
+                *kinds, now.isoformat(), now.isoformat(),
+            ),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def _finish(job: dict, status: str, result: dict | None = None, error: str | None = None, retry_in: float | None = None) -> None:
+    """Обновляет задачу, только если она всё ещё наша (attempts и locked_by не сменились)."""
+    now = _now()
+    with connect() as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = ?, result = COALESCE(?, result), error = ?, run_after = ?,
+                locked_until = NULL, locked_by = NULL, updated_at = ?
+            WHERE id = ? AND attempts = ? AND locked_by = ?
+            """,
+            (
+                status,
+                json.dumps(result, ensure_ascii=False) if result is not None else None,
+                error,
+                (now + timedelta(seconds=retry_in or 0)).isoformat(),
+                now.isoformat(),
+                job["id"], job["attempts"], _worker_id(),
+            ),
+        )
+
+
+def run_one(job: dict) -> None:
+    handler, timeout = _handlers[job["kind"]]
+    payload = json.loads(job["payload"])
+    # Своя нить на попытку: зависшую не убить, её результат просто отбрасывается (_finish проверяет attempts)
+    attempt = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"job-{job['kind']}")
+    try:
+        result = attempt.submit(handler, payload).result(timeout=timeout)
+    except PermanentJobError as e:
+        logger.warning("Job %s (%s) failed permanently: %s", job["id"], job["kind"], e)
+        _finish(job, "failed", error=str(e))
+        return
+    except Exception as e:
+        error = f"timeout {timeout:.0f}s" if isinstance(e, FutureTimeout) else f"{type(e).__name__}: {e}"
+        if job["attempts"] < job["max_attempts"]:
+            delay = RETRY_BASE_DELAY * 2 ** (job["attempts"] - 1)
+            logger.warning("Job %s (%s) attempt %s failed: %s — retry in %.0fs", job["id"], job["kind"], job["attempts"], error, delay)
+            _finish(job, "queued", error=error, retry_in=delay)
+        else:
+            logger.warning("Job %s (%s) failed after %s attempts: %s", job["id"], job["kind"], job["attempts"], error)
+            _finish(job, "failed", error=error)
+        return
+    finally:
+        attempt.shutdown(wait=False)
+    _finish(job, "done", result=result)
+    logger.info("Job %s (%s) done", job["id"], job["kind"])
+
+
+def prune() -> int:
+    """Удаляет done/failed старше KEEP_DAYS. Возвращает число удалённых."""
+    cutoff = (_now() - timedelta(days=KEEP_DAYS)).isoformat()
+    with connect() as conn:
+        cur = conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,))
+    return cur.rowcount
+
+
+def _loop() -> None:
+    last_prune = 0.0
+    while not _stop.is_set():
+        try:
+            if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                prune()
+                last_prune = time.monotonic()
+            job = claim(list(_handlers))
+        except Exception as e:
+            logger.warning("Job claim failed: %s", e)
+            job = None
+        if job is None:
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        run_one(job)
+
+
+def start_worker() -> None:
+    """Поток-воркер в текущем процессе (идемпотентно)."""
+    global _worker_thread
+    if _worker_thread is not None and _worker_thread.is_alive():
+        return
+    _stop.clear()
+    _worker_thread = threading.Thread(target=_loop, name="jobs-worker", daemon=True)
+    _worker_thread.start()
+
+
+def stop_worker(timeout: float = 5) -> None:
+    _stop.set()
+    _wakeup.set()
+    if _worker_thread is not None:
+        _worker_thread.join(timeout)
+
+
+def main() -> None:
+    """Отдельный процесс-воркер (если в API поток-воркер выключен: JOBS_WORKER=0)."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    import api.collect_api  # noqa: F401 — регистрирует обработчики задач
+    from db.migrations import migrate
+
+    migrate()
+    start_worker()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop_worker()
+
+
+if __name__ == "__main__":
+    main()
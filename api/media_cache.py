@@ -0,0 +1,180 @@
+"""
+Дисковый кэш медиа из Telegram для /api/photo.
+Файлы адресуются по file_unique_id (не меняется при перевыпуске file_id) и лежат в
+MEDIA_CACHE_DIR/<2 символа>/<file_unique_id>.<ext>. Размер ограничен MEDIA_CACHE_MAX_MB:
+при переполнении удаляются давно не отдававшиеся файлы (LRU по mtime).
+file_path из getFile держится в памяти FILE_PATH_TTL секунд — ссылка Telegram живёт не меньше часа.
+Запросы к Telegram — через общий клиент api/telegram_client.py (keep-alive, повторы, метрики).
+"""
+
+import logging
+import mimetypes
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import requests
+
+from api.telegram_client import TelegramError, get_client
+
+BASE = Path(__file__).resolve().parent.parent
+
+MEDIA_CACHE_DIR = Path(os.getenv("MEDIA_CACHE_DIR", str(BASE / "data" / "media_cache")))
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_MB", "2048")) * 1024 * 1024
+FILE_PATH_TTL = int(os.getenv("TELEGRAM_FILE_PATH_TTL", "3000"))
+FILE_PATH_CACHE_SIZE = 10000
+CHUNK_SIZE = 256 * 1024
+# Чаще, чем раз в минуту, mtime при попадании не трогаем — лишняя запись в inode
+TOUCH_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+_file_paths: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+_file_paths_lock = threading.Lock()
+_download_locks: dict[str, threading.Lock] = {}
+_download_locks_guard = threading.Lock()
+_size_lock = threading.Lock()
+_cache_bytes: int | None = None
+
+# Если расширение file_path не распознано — MIME по типу записи
+_DEFAULT_MIME = {"photo": "image/jpeg", "video": "video/mp4", "video_note": "video/mp4"}
+
+
+def get_file_info(token: str, file_id: str) -> dict | None:
+    """getFile с TTL-кэшем: {file_path, file_unique_id, file_size} или None."""
+    now = time.monotonic()
+    with _file_paths_lock:
+        hit = _file_paths.get(file_id)
+        if hit and hit[0] > now:
+            _file_paths.move_to_end(file_id)
+            return hit[1]
+    try:
+        info = get_client(token).get_file(file_id)
+    except TelegramError as e:
+        logger.warning("getFile failed: %s", e)
+        return None
+    if not info or not info.get("file_path"):
+        return None
+    with _file_paths_lock:
+        _file_paths[file_id] = (now + FILE_PATH_TTL, info)
+        _file_paths.move_to_end(file_id)
+        while len(_file_paths) > FILE_PATH_CACHE_SIZE:
+            _file_paths.popitem(last=False)
+    return info
+
+
+def shard_dir(unique_id: str) -> Path:
+    return MEDIA_CACHE_DIR / unique_id[:2]
+
+
+def touch(path: Path) -> bool:
+    """Отметка использования для LRU. False — файл уже вытеснен."""
+    try:
+        if time.time() - path.stat().st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def lookup(unique_id: str) -> Path | None:
+    """Путь к закэшированному оригиналу или None. Попадание обновляет mtime (LRU)."""
+    shard = shard_dir(unique_id)
+    try:
+        with os.scandir(shard) as it:
+            for entry in it:
+                if entry.name.split(".", 1)[0] == unique_id and not entry.name.startswith("."):
+                    path = Path(entry.path)
+                    break
+            else:
+                return None
+    except FileNotFoundError:
+        return None
+    return path if touch(path) else None
+
+
+def _lock_for(unique_id: str) -> threading.Lock:
+    with _download_locks_guard:
+        return _download_locks.setdefault(unique_id, threading.Lock())
+
+
+def download(token: str, file_path: str, unique_id: str) -> Path | None:
+    """Скачивает файл потоком во временный файл и атомарно кладёт в кэш. Один unique_id — одна загрузка."""
+    with _lock_for(unique_id):
+        cached = lookup(unique_id)
+        if cached:
+            return cached
+        ext = Path(file_path).suffix.lower()
+        target = shard_dir(unique_id) / f"{unique_id}{ext}"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Точка в начале — lookup не увидит недокачанный файл; uuid — несколько процессов API
+        tmp = target.parent / f".{unique_id}.{uuid.uuid4().hex}.part"
+        size = 0
+        try:
+            with get_client(token).stream_file(file_path) as r, open(tmp, "wb") as f:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp, target)
+        except (TelegramError, requests.RequestException, OSError) as e:
+            logger.warning("Telegram file download %s failed: %s", file_path, e)
+            tmp.unlink(missing_ok=True)
+            return None
+    account(size)
+    return target
+
+
+def mimetype_for(path: Path, media_type: str | None) -> str:
+    guessed, _ = mimetypes.guess_type(path.name)
+    if guessed and guessed.split("/")[0] in ("image", "video"):
+        return guessed
+    return _DEFAULT_MIME.get(media_type or "photo", "application/octet-stream")
+
+
+def _scan() -> list[tuple[float, int, Path]]:
+    out = []
+    if not MEDIA_CACHE_DIR.exists():
+        return out
+    for shard in MEDIA_CACHE_DIR.iterdir():
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard):
+            if entry.name.startswith("."):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            out.append((st.st_mtime, st.st_size, Path(entry.path)))
+    return out
+
+
+def account(added: int) -> None:
+    """Учёт размера кэша; при превышении лимита — вытеснение до 90% лимита."""
+    global _cache_bytes
+    with _size_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan())
+        else:
+            _cache_bytes += added
+        if _cache_bytes > MEDIA_CACHE_MAX_BYTES:
+            _cache_bytes = evict(int(MEDIA_CACHE_MAX_BYTES * 0.9))
+
+
+def evict(target_bytes: int) -> int:
+    """Удаляет самые старые по mtime файлы, пока кэш больше target_bytes. Возвращает итоговый размер."""
+    files = sorted(_scan())
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in files:
+        if total <= target_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    if removed:
+        logger.info("Media cache: evicted %s files, %s MB left", removed, total // (1024 * 1024))
+    return total
@@ -26,15 +26,21 @@ SYSTEM_PROMPT = """Ты — Perplexity, личный помощник и коу
 Не ссылайся на JSON/колонки в явном виде; говори человеческим языком."""
 
 
-def call_perplexity(sprint_json: dict, api_key: str | None = None) -> str:
-    """Вызывает Perplexity API и возвращает текст анализа."""
+def call_perplexity(sprint_json: dict, api_key: str | None = None, timeout: float | None = None) -> str:
+    """
+    Вызывает Perplexity API и возвращает текст анализа.
+    PERPLEXITY_BASE_URL — другой OpenAI-совместимый адрес (локальная заглушка scripts/stub_llm.py).
+    Повторы делает очередь задач (api/jobs.py), поэтому у клиента их нет.
+    """
     import os
     key = api_key or os.getenv("PERPLEXITY_API_KEY", "").strip()
     if not key:
         raise ValueError("PERPLEXITY_API_KEY не задан в .env")
+    base_url = os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai").strip()
+    timeout = timeout or float(os.getenv("PERPLEXITY_TIMEOUT", "90"))
     try:
         from openai import OpenAI
-        client = OpenAI(api_key=key, base_url="https://api.perplexity.ai")
+        client = OpenAI(api_key=key, base_url=base_url, timeout=timeout, max_retries=0)
     except ImportError:
         from perplexity import Perplexity
         client = Perplexity(api_key=key)
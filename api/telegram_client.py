@@ -0,0 +1,251 @@
+"""
+Клиент Telegram Bot API для процесса API (collect_api, media_cache, фоновые задачи).
+- Одна keep-alive requests.Session с пулом соединений на токен — без TLS-рукопожатия на каждый вызов
+- Таймауты по методам (METHOD_TIMEOUTS)
+- 429: ждём parameters.retry_after и повторяем; 5xx и ошибки соединения — повтор с backoff и jitter
+  (sendMessage/sendDocument после отправленного запроса не повторяем — иначе дубль)
+- Лимиты частоты: на чат (личка 1/с, группа/канал 20/мин) и общий 30/с
+- Метрики по методам: metrics() → GET /api/metrics/telegram
+
+    tg = get_client(BOT_TOKEN)
+    tg.send_message(chat_id, "текст")
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError
+
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+
+# (connect, read) секунд
+METHOD_TIMEOUTS = {
+    "getFile": (5, 10),
+    "sendMessage": (5, 15),
+    "sendDocument": (5, 60),
+    "download": (5, 60),
+}
+DEFAULT_TIMEOUT = (5, 20)
+MAX_RETRIES = 3
+# retry_after больше этого не ждём — вызывающий получит ошибку (запрос не должен висеть минутами)
+MAX_RETRY_AFTER = 60
+PRIVATE_CHAT_INTERVAL = 1.0
+GROUP_CHAT_INTERVAL = 3.0
+GLOBAL_INTERVAL = 1 / 30
+# Методы, которые безопасно повторить после отправки запроса
+IDEMPOTENT = {"getFile", "getMe", "download"}
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramError(Exception):
+    def __init__(self, description: str, error_code: int | None = None, retry_after: int | None = None):
+        super().__init__(description)
+        self.description = description
+        self.error_code = error_code
+        self.retry_after = retry_after
+
+
+def _request_not_sent(e: requests.ConnectionError) -> bool:
+    """Соединение не установилось — запрос точно не дошёл до Telegram."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = e.args[0] if e.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class _RateLimiter:
+    """Минимальный интервал между вызовами на ключ (чат) — ожидание вместо 429."""
+
+    def __init__(self):
+        self._next: dict[object, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: object, interval: float) -> float:
+        """Резервирует слот и спит до него. Возвращает время ожидания."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(key, 0.0))
+            self._next[key] = slot + interval
+            if len(self._next) > 10000:
+                self._next = {k: v for k, v in self._next.items() if v > now}
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def penalize(self, key: object, seconds: float) -> None:
+        """После 429 следующий вызов в этот чат — не раньше чем через retry_after."""
+        with self._lock:
+            self._next[key] = max(self._next.get(key, 0.0), time.monotonic() + seconds)
+
+
+class BotApiClient:
+    def __init__(self, token: str, base_url: str = TELEGRAM_API_BASE, pool_size: int = 32):
+        self.token = token
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._limiter = _RateLimiter()
+        self._metrics: dict[str, dict[str, float]] = {}
+        self._metrics_lock = threading.Lock()
+
+    # ---------- метрики ----------
+
+    def _count(self, method: str, **inc: float) -> None:
+        with self._metrics_lock:
+            m = self._metrics.setdefault(
+                method, {"calls": 0, "errors": 0, "retries": 0, "retry_after": 0, "rate_wait_s": 0.0, "time_s": 0.0}
+            )
+            for k, v in inc.items():
+                m[k] += v
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        with self._metrics_lock:
+            return {k: {**v, "time_s": round(v["time_s"], 3), "rate_wait_s": round(v["rate_wait_s"], 3)}
+                    for k, v in self._metrics.items()}
+
+    # ---------- вызовы ----------
+
+    @staticmethod
+    def _penalty_key(method: str, chat_id: int | str | None) -> object:
+        # 429 без чата (getFile) — пауза только для этого метода: отправки в чаты она не касается
+        return chat_id if chat_id is not None else ("method", method)
+
+    def _throttle(self, method: str, chat_id: int | str | None) -> None:
+        # Лимиты Telegram — на отправку в чаты; getFile и скачивание не ограничиваем, только ждём после 429
+        if chat_id is None:
+            waited = self._limiter.acquire(self._penalty_key(method, None), 0)
+            if waited:
+                self._count(method, rate_wait_s=waited)
+            return
+        private = isinstance(chat_id, int) and chat_id > 0
+        waited = self._limiter.acquire("*", GLOBAL_INTERVAL)
+        waited += self._limiter.acquire(chat_id, PRIVATE_CHAT_INTERVAL if private else GROUP_CHAT_INTERVAL)
+        if waited:
+            self._count(method, rate_wait_s=waited)
+
+    def call(self, method: str, data: dict | None = None, files: dict | None = None) -> dict | bool:
+        """Вызов метода Bot API. Возвращает result, иначе TelegramError (после повторов)."""
+        data = data or {}
+        chat_id = data.get("chat_id")
+        timeout = METHOD_TIMEOUTS.get(method, DEFAULT_TIMEOUT)
+        url = f"{self.base_url}/bot{self.token}/{method}"
+        last_error: TelegramError | None = None
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                self._count(method, retries=1)
+            self._throttle(method, chat_id)
+            for f in (files or {}).values():
+                # Повтор sendDocument: файл читаем сначала
+                fileobj = f[1] if isinstance(f, tuple) else f
+                if hasattr(fileobj, "seek"):
+                    fileobj.seek(0)
+            t0 = time.perf_counter()
+            try:
+                if files:
+                    r = self.session.post(url, data=data, files=files, timeout=timeout)
+                else:
+                    r = self.session.post(url, json=data, timeout=timeout)
+            except requests.ConnectionError as e:
+                last_error = TelegramError(f"connection error: {e}")
+                self._count(method, calls=1, errors=1, time_s=time.perf_counter() - t0)
+                # Соединение не установилось — повтор безопасен для любого метода
+                if not _request_not_sent(e) and method not in IDEMPOTENT:
+                    raise last_error
+                self._backoff(attempt)
+                continue
+            except requests.Timeout as e:
+                self._count(method, calls=1, errors=1, time_s=time.perf_counter() - t0)
+                last_error = TelegramError(f"timeout: {e}")
+                if method not in IDEMPOTENT:
+                    raise last_error
+                self._backoff(attempt)
+                continue
+            self._count(method, calls=1, time_s=time.perf_counter() - t0)
+            try:
+                body = r.json()
+            except ValueError:
+                body = {"ok": False, "description": r.text[:200] or f"HTTP {r.status_code}", "error_code": r.status_code}
+            if body.get("ok"):
+                return body.get("result")
+            self._count(method, errors=1)
+            retry_after = (body.get("parameters") or {}).get("retry_after")
+            last_error = TelegramError(body.get("description") or f"HTTP {r.status_code}", body.get("error_code") or r.status_code, retry_after)
+            if r.status_code == 429 and retry_after is not None:
+                if retry_after > MAX_RETRY_AFTER:
+                    raise last_error
+                self._count(method, retry_after=1)
+                logger.warning("Telegram %s: flood control, retry after %ss", method, retry_after)
+                self._limiter.penalize(self._penalty_key(method, chat_id), retry_after)
+                continue
+            if r.status_code >= 500:
+                self._backoff(attempt)
+                continue
+            raise last_error
+        raise last_error or TelegramError(f"{method}: retries exhausted")
+
+    @staticmethod
+    def _backoff(attempt: int) -> None:
+        time.sleep(min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.8, 1.2))
+
+    # ---------- методы ----------
+
+    def get_file(self, file_id: str) -> dict:
+        return self.call("getFile", {"file_id": file_id})
+
+    def send_message(self, chat_id: int | str, text: str, **params) -> dict:
+        return self.call("sendMessage", {"chat_id": chat_id, "text": text, **params})
+
+    def send_document(self, chat_id: int | str, path: Path, caption: str = "", mime: str = "application/octet-stream") -> dict:
+        with open(path, "rb") as f:
+            return self.call("sendDocument", {"chat_id": chat_id, "caption": caption}, files={"document": (path.name, f, mime)})
+
+    @contextmanager
+    def stream_file(self, file_path: str):
+        """Скачивание файла по file_path из getFile: контекст с потоковым requests.Response (ok проверен)."""
+        t0 = time.perf_counter()
+        try:
+            r = self.session.get(f"{self.base_url}/file/bot{self.token}/{file_path}", stream=True, timeout=METHOD_TIMEOUTS["download"])
+        except requests.RequestException:
+            self._count("download", calls=1, errors=1, time_s=time.perf_counter() - t0)
+            raise
+        try:
+            if not r.ok:
+                self._count("download", calls=1, errors=1, time_s=time.perf_counter() - t0)
+                raise TelegramError(f"download HTTP {r.status_code}", r.status_code)
+            yield r
+            self._count("download", calls=1, time_s=time.perf_counter() - t0)
+        finally:
+            r.close()
+
+
+_clients: dict[str, BotApiClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(token: str) -> BotApiClient:
+    """Общий клиент на токен (одна сессия и одни лимиты на процесс)."""
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            client = _clients[token] = BotApiClient(token)
+        return client
+
+
+def metrics() -> dict:
+    """Метрики всех клиентов процесса (токен не раскрываем — только id бота)."""
+    with _clients_lock:
+        clients = list(_clients.items())
+    return {token.split(":", 1)[0]: client.metrics() for token, client in clients}
@@ -0,0 +1,124 @@
+"""
+Превью фото для доски Collect: ширины THUMB_WIDTHS в WebP и JPEG.
+Делаются при первом запросе /api/photo/<id>?w= из оригинала в дисковом кэше (api/media_cache.py)
+и лежат рядом с ним: <file_unique_id>~<w>.<webp|jpg> — вытесняются тем же LRU.
+Превью не зависит от оригинала: если тот вытеснен, а превью нет — в Telegram не ходим.
+Ресайз идёт в пуле процессов (Pillow держит GIL на декодировании), потоки API только ждут результат.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+from api import media_cache
+
+THUMB_WIDTHS = (320, 640, 1280)
+THUMB_FORMATS = {"webp": "image/webp", "jpg": "image/jpeg"}
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "2"))
+THUMB_TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_pending: dict[str, Future] = {}
+_pending_lock = threading.RLock()
+
+
+def snap_width(width: int) -> int:
+    """Ближайшая доступная ширина не меньше запрошенной (или максимальная)."""
+    for w in THUMB_WIDTHS:
+        if w >= width:
+            return w
+    return THUMB_WIDTHS[-1]
+
+
+def thumb_path(unique_id: str, width: int, fmt: str) -> Path:
+    return media_cache.shard_dir(unique_id) / f"{unique_id}~{snap_width(width)}.{fmt}"
+
+
+def cached_thumbnail(unique_id: str, width: int, fmt: str) -> Path | None:
+    path = thumb_path(unique_id, width, fmt)
+    return path if media_cache.touch(path) else None
+
+
+def _render(original: str, unique_id: str) -> list[str]:
+    """В процессе пула: все ширины × форматы за одно декодирование. Больше оригинала не растягиваем."""
+    from PIL import Image, ImageOps
+
+    src = Path(original)
+    out = []
+    with Image.open(src) as img:
+        # JPEG: декодирование сразу в уменьшенном масштабе (DCT scaling) — в разы быстрее
+        img.draft("RGB", (THUMB_WIDTHS[-1], THUMB_WIDTHS[-1]))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        for width in sorted(THUMB_WIDTHS, reverse=True):
+            if img.width > width:
+                img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+            for fmt in THUMB_FORMATS:
+                dst = thumb_path(unique_id, width, fmt)
+                tmp = dst.parent / f".{dst.name}.{uuid.uuid4().hex}.part"
+                if fmt == "webp":
+                    img.save(tmp, "WEBP", quality=78, method=4)
+                else:
+                    img.save(tmp, "JPEG", quality=80, optimize=True, progressive=True)
+                os.replace(tmp, dst)
+                out.append(str(dst))
+    return out
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: fork из многопоточного веб-сервера может унаследовать захваченные локи
+            _pool = ProcessPoolExecutor(THUMB_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def get_thumbnail(original: Path, unique_id: str, width: int, fmt: str) -> Path | None:
+    """Путь к превью; при отсутствии — рендер в пуле (один на unique_id). None — Pillow нет или ошибка."""
+    path = cached_thumbnail(unique_id, width, fmt)
+    if path:
+        return path
+    path = thumb_path(unique_id, width, fmt)
+    with _pending_lock:
+        fut = _pending.get(unique_id)
+        if fut is None:
+            fut = _get_pool().submit(_render, str(original), unique_id)
+            _pending[unique_id] = fut
+            fut.add_done_callback(lambda f: _on_rendered(unique_id, f))
+    try:
+        fut.result(timeout=THUMB_TIMEOUT)
+    except ImportError:
+        logger.warning("Pillow не установлен — отдаю оригинал (pip install Pillow)")
+        return None
+    except Exception as e:
+        logger.warning("Thumbnail %s failed: %s", unique_id, e)
+        return None
+    return path if path.exists() else None
+
+
+def _on_rendered(unique_id: str, fut: Future) -> None:
+    with _pending_lock:
+        _pending.pop(unique_id, None)
+    if fut.cancelled() or fut.exception() is not None:
+        return
+    media_cache.account(sum(Path(p).stat().st_size for p in fut.result() if Path(p).exists()))
+
+
+def srcset(entry_id: int) -> list[dict]:
+    """Список для srcset фото-доски: [{w, src}], src относительно адреса API."""
+    return [{"w": w, "src": f"/api/photo/{entry_id}?w={w}"} for w in THUMB_WIDTHS]
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
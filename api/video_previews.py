@@ -0,0 +1,145 @@
+"""
+Постеры и превью для видео-записей фото-доски (video, video_note).
+ffmpeg делает кадр-постер (JPEG до POSTER_WIDTH px) и короткий немой ролик (до PREVIEW_WIDTH px,
+PREVIEW_SECONDS с, H.264 с низким битрейтом). Файлы лежат в дисковом кэше рядом с оригиналом:
+<file_unique_id>~poster.jpg и <file_unique_id>~preview.mp4 — вытесняются тем же LRU.
+Генерация — фоновая очередь в процессе API (по одной задаче: ffmpeg сам многопоточный),
+запускается первым запросом постера. Заполнить заранее для всех записей: python -m api.video_previews
+"""
+
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from api import media_cache
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFMPEG_TIMEOUT = 180
+POSTER_WIDTH = 640
+PREVIEW_WIDTH = 480
+PREVIEW_SECONDS = 4
+VIDEO_TYPES = ("video", "video_note")
+# После неудачи запись не трогаем столько секунд — битый файл не гоняем по кругу
+RETRY_AFTER_FAILURE = 3600
+
+# Заглушка в сетке, пока постер не готов (отдаётся с no-store)
+PLACEHOLDER_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100">'
+    '<rect width="100" height="100" fill="#2a2a2a"/>'
+    '<path d="M40 32 L70 50 L40 68 Z" fill="#777"/></svg>'
+)
+
+logger = logging.getLogger(__name__)
+
+_worker: ThreadPoolExecutor | None = None
+_queued: set[int] = set()
+_failed: dict[int, float] = {}
+_lock = threading.Lock()
+
+
+def poster_path(unique_id: str) -> Path:
+    return media_cache.shard_dir(unique_id) / f"{unique_id}~poster.jpg"
+
+
+def preview_path(unique_id: str) -> Path:
+    return media_cache.shard_dir(unique_id) / f"{unique_id}~preview.mp4"
+
+
+def cached(unique_id: str, kind: str) -> Path | None:
+    """kind: 'poster' | 'preview'. Путь, если файл уже сделан."""
+    path = poster_path(unique_id) if kind == "poster" else preview_path(unique_id)
+    return path if media_cache.touch(path) else None
+
+
+def _ffmpeg(args: list[str], dst: Path) -> bool:
+    """ffmpeg во временный файл и атомарная замена; False — ошибка (лог с хвостом stderr)."""
+    tmp = dst.parent / f".{dst.stem}.{uuid.uuid4().hex}{dst.suffix}"
+    try:
+        proc = subprocess.run(
+            [FFMPEG_BIN, "-nostdin", "-v", "error", "-y", *args, str(tmp)],
+            capture_output=True, timeout=FFMPEG_TIMEOUT,
+        )
+    except FileNotFoundError:
+        logger.warning("ffmpeg не найден (%s) — постеры видео не делаются", FFMPEG_BIN)
+        return False
+    except subprocess.TimeoutExpired:
+        logger.warning("ffmpeg timeout for %s", dst.name)
+        tmp.unlink(missing_ok=True)
+        return False
+    if proc.returncode != 0 or not tmp.exists() or tmp.stat().st_size == 0:
+        logger.warning("ffmpeg failed for %s: %s", dst.name, proc.stderr.decode(errors="replace")[-500:])
+        tmp.unlink(missing_ok=True)
+        return False
+    os.replace(tmp, dst)
+    return True
+
+
+def render(original: Path, unique_id: str) -> bool:
+    """Постер + превью для одного видео. True, если постер есть."""
+    poster, preview = poster_path(unique_id), preview_path(unique_id)
+    added = 0
+    if not poster.exists():
+        scale = f"scale='min({POSTER_WIDTH},iw)':-2"
+        # Кадр на 1 с лучше первого (часто чёрный); ролик короче секунды — берём первый
+        ok = (_ffmpeg(["-ss", "1", "-i", str(original), "-frames:v", "1", "-vf", scale, "-q:v", "4"], poster)
+              or _ffmpeg(["-i", str(original), "-frames:v", "1", "-vf", scale, "-q:v", "4"], poster))
+        if not ok:
+            return False
+        added += poster.stat().st_size
+    if not preview.exists():
+        ok = _ffmpeg([
+            "-i", str(original), "-t", str(PREVIEW_SECONDS), "-an",
+            "-vf", f"scale='min({PREVIEW_WIDTH},iw)':-2,fps=24",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "30", "-maxrate", "400k", "-bufsize", "800k",
+            "-pix_fmt", "yuv420p", "-movflags", "+faststart",
+        ], preview)
+        if ok:
+            added += preview.stat().st_size
+    media_cache.account(added)
+    return True
+
+
+def enqueue(entry_id: int, job: Callable[[], bool]) -> None:
+    """Ставит job (скачать оригинал + render) в фоновую очередь; повторные вызовы для той же записи — no-op."""
+    global _worker
+    with _lock:
+        if entry_id in _queued or time.time() - _failed.get(entry_id, 0) < RETRY_AFTER_FAILURE:
+            return
+        _queued.add(entry_id)
+        if _worker is None:
+            _worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="video-previews")
+    _worker.submit(_run_job, entry_id, job)
+
+
+def _run_job(entry_id: int, job: Callable[[], bool]) -> None:
+    ok = False
+    try:
+        ok = job()
+    except Exception as e:
+        logger.warning("Video previews for entry %s failed: %s", entry_id, e)
+    with _lock:
+        _queued.discard(entry_id)
+        if not ok:
+            _failed[entry_id] = time.time()
+
+
+def main() -> None:
+    """Заполнение для всех опубликованных видео-записей (синхронно, по одной)."""
+    from api.collect_api import build_video_previews, get_video_entry_ids
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    ids = get_video_entry_ids()
+    done = sum(1 for entry_id in ids if build_video_previews(entry_id))
+    logger.info("Video previews: %s/%s entries ready", done, len(ids))
+    sys.exit(0 if done == len(ids) else 1)
+
+
+if __name__ == "__main__":
+    main()
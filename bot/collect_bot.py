@@ -5,19 +5,24 @@ Collect bot — MVP.
 RAPA: Raw → Assign → Project → Archive.
 """
 
+import asyncio
 import json
 import logging
 import re
-import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
 
 from aiogram import Bot, Dispatcher, F
+from aiogram.enums import MessageOriginType
 from aiogram.filters import BaseFilter, Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import BotCommand
 from aiogram.types import CallbackQuery
 from aiogram.types import InlineKeyboardButton
 from aiogram.types import InlineKeyboardMarkup
+from aiogram.types import InputMediaPhoto
+from aiogram.types import InputMediaVideo
 from aiogram.types import Message
 from aiogram.types import MenuButtonCommands
 from aiogram.types import MenuButtonWebApp
@@ -36,6 +41,13 @@ for _p in [BASE / ".env", Path.cwd() / ".env", BASE / "config" / ".env"]:
     if _p.exists():
         load_dotenv(dotenv_path=_p, override=True)
 
+from bot import outbox, publisher, scheduler
+from bot.fsm_storage import SQLiteStorage
+from bot.media_groups import MediaGroupCollector
+from bot.throttling import BurstMiddleware
+from db import cache as db_cache, connect
+from db.aio import run_read, run_write
+
 BOT_TOKEN = (os.getenv("BOT_TOKEN") or "").strip()
 DB_PATH = os.getenv("DB_PATH", str(BASE / "db" / "collect.db"))
 _raw = (os.getenv("CHANNEL_ID") or "").strip()
@@ -49,6 +61,21 @@ if _raw:
 # Время отложенного поста (HH:MM), например 20:00. Пусто = постить сразу.
 POST_SCHEDULE_TIME = (os.getenv("POST_SCHEDULE_TIME") or "").strip() or None
 
+# Альбомы: подряд идущие фото/видео одного дня — одним постом sendMediaGroup (до 10). 0 = по одному
+CHANNEL_POST_ALBUMS = (os.getenv("CHANNEL_POST_ALBUMS") or "0").strip() != "0"
+ALBUM_MAX_ITEMS = 10
+ALBUM_MEDIA_TYPES = ("photo", "video")
+
+# Приём апдейтов: polling (getUpdates) или webhook (Telegram сам шлёт апдейты на WEBHOOK_URL + WEBHOOK_PATH).
+# Webhook слушает WEBHOOK_HOST:WEBHOOK_PORT за тем же nginx, что и API; проверка заголовка
+# X-Telegram-Bot-Api-Secret-Token (WEBHOOK_SECRET, пусто — выводится из BOT_TOKEN).
+BOT_MODE = (os.getenv("BOT_MODE") or "polling").strip().lower()
+WEBHOOK_URL = (os.getenv("WEBHOOK_URL") or "").strip().rstrip("/")
+WEBHOOK_PATH = (os.getenv("WEBHOOK_PATH") or "/tg/webhook").strip()
+WEBHOOK_SECRET = (os.getenv("WEBHOOK_SECRET") or "").strip()
+WEBHOOK_HOST = (os.getenv("WEBHOOK_HOST") or "127.0.0.1").strip()
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8081"))
+
 # Время проверки «не было фото за день» и поста заготовки (HH:MM), например 23:00.
 FALLBACK_TIME = (os.getenv("FALLBACK_TIME") or "").strip() or "23:00"
 
@@ -64,16 +91,26 @@ SPRINT_REMINDER_START = (os.getenv("SPRINT_REMINDER_START") or "2026-02-26").str
 SPRINT_REMINDER_TIME = (os.getenv("SPRINT_REMINDER_TIME") or "10:00").strip()
 CURRENT_SPRINT_ID = (os.getenv("CURRENT_SPRINT_ID") or "s4_2026").strip()
 
-# Глобальный планировщик (для /postat и заготовок)
+# Пересказ Raw в ai_summary (bot/summarize.py): раз в N минут на лидере. 0 = не запускать
+SUMMARY_INTERVAL_MINUTES = int(os.getenv("SUMMARY_INTERVAL_MINUTES", "10") or 0)
+
+# Глобальный планировщик (для /postat и заготовок): задания в SQLite, выполняет экземпляр-лидер
 _scheduler: AsyncIOScheduler | None = None
+_leader: scheduler.Leader | None = None
+# Ежедневные задания (id задания = имя задачи в bot/scheduler.py)
+DAILY_JOBS = ("scheduled_post", "fallback_check", "daily_review", "sprint_reminder")
+# Лимит постов в канал (token bucket), создаётся в event loop бота
+_post_bucket: publisher.TokenBucket | None = None
+
+
+class Mode(StatesGroup):
+    """Режимы пользователя (FSM, хранятся в SQLite — переживают рестарт)."""
+    adding_stock = State()  # фото/видео идут в fallback_photos
+    adding_raw = State()  # фото/видео идут в raw
 
-# Режим «добавляю заготовки»: user_id в этом set — фото идут в fallback_photos
-_adding_stock: set[int] = set()
-# Режим «добавляю в Raw»: user_id в этом set — фото идут в raw
-_adding_raw: set[int] = set()
 
-# Ожидающее видео для поста по команде /post: user_id -> { entry_id, file_id, caption, media_type }
-_pending_post: dict[int, dict] = {}
+# Фоновая доставка outbox (повторы, посты упавшего процесса)
+_outbox_task: asyncio.Task | None = None
 
 # Теги для Raw — выбор из списка кнопками
 RAW_TAGS = ["diary", "работа", "идея"]
@@ -97,131 +134,101 @@ logger = logging.getLogger(__name__)
 
 
 def init_db() -> None:
-    """Создаёт таблицу collect_entries, если её нет. Миграция: published_to_channel."""
-    db_file = Path(DB_PATH)
-    db_file.parent.mkdir(parents=True, exist_ok=True)
-
-    init_sql = (BASE / "db" / "init.sql").read_text(encoding="utf-8")
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.executescript(init_sql)
-        # RAPA schema
-        try:
-            from bot.rapa import init_rapa_schema
-            init_rapa_schema(conn)
-        except Exception as e:
-            logger.warning("RAPA schema init: %s", e)
-        # Миграция: добавить published_to_channel для существующих БД
-        try:
-            conn.execute("ALTER TABLE collect_entries ADD COLUMN published_to_channel INTEGER DEFAULT 0")
-        except sqlite3.OperationalError:
-            pass
-        try:
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_collect_published ON collect_entries(published_to_channel)")
-        except sqlite3.OperationalError:
-            pass
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS fallback_photos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                photo_file_id TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                used_at TEXT
-            );
-            CREATE INDEX IF NOT EXISTS idx_fallback_used ON fallback_photos(used_at);
-        """)
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS raw (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                chat_id INTEGER NOT NULL,
-                title TEXT,
-                content TEXT NOT NULL,
-                source TEXT DEFAULT 'Telegram',
-                created_at TEXT NOT NULL,
-                rapa_stage TEXT DEFAULT 'Raw',
-                gtd_type TEXT,
-                ai_summary TEXT,
-                metadata TEXT,
-                tags TEXT
-            );
-            CREATE INDEX IF NOT EXISTS idx_raw_user_created ON raw(user_id, created_at);
-        """)
-        # Миграция: media_type для collect_entries (photo | video)
-        try:
-            conn.execute("ALTER TABLE collect_entries ADD COLUMN media_type TEXT DEFAULT 'photo'")
-            logger.info("Added media_type column to collect_entries")
-        except sqlite3.OperationalError:
-            pass
-        # Миграция: media_type для fallback_photos
-        try:
-            conn.execute("ALTER TABLE fallback_photos ADD COLUMN media_type TEXT DEFAULT 'photo'")
-            logger.info("Added media_type column to fallback_photos")
-        except sqlite3.OperationalError:
-            pass
-        # Миграция: tags для raw (если таблица уже существовала без колонки)
-        try:
-            conn.execute("ALTER TABLE raw ADD COLUMN tags TEXT")
-            logger.info("Added tags column to raw")
-        except sqlite3.OperationalError:
-            pass  # колонка уже есть
-        # sprint_reports: сданные отчёты по спринтам (для напоминаний + Perplexity)
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS sprint_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sprint_id TEXT NOT NULL,
-                user_id INTEGER NOT NULL,
-                submitted_at TEXT NOT NULL,
-                UNIQUE(sprint_id, user_id)
-            );
-            CREATE INDEX IF NOT EXISTS idx_sprint_reports_id ON sprint_reports(sprint_id, user_id);
-        """)
-    logger.info("DB initialized: %s", DB_PATH)
+    """Создаёт/обновляет схему БД (версионные миграции db/migrations.py, один раз при старте)."""
+    from db.migrations import migrate
+    version = migrate(DB_PATH)
+    logger.info("DB initialized: %s (schema v%s)", DB_PATH, version)
 
 
 def save_entry(
-    user_id: int, chat_id: int, message_id: int, file_id: str, comment: str | None, media_type: str = "photo"
+    user_id: int,
+    chat_id: int,
+    message_id: int,
+    file_id: str,
+    comment: str | None,
+    media_type: str = "photo",
+    file_unique_id: str | None = None,
+    media_items: list[dict] | None = None,
 ) -> int:
-    """Сохраняет запись в collect_entries. media_type: 'photo' | 'video'. Возвращает id."""
+    """Сохраняет запись в collect_entries. media_type: 'photo' | 'video'. Возвращает id.
+    media_items — все части альбома (file_id — обложка), пост уйдёт одним sendMediaGroup."""
     created_at = datetime.utcnow().isoformat()
-    with sqlite3.connect(DB_PATH) as conn:
+    items_json = json.dumps(media_items, ensure_ascii=False) if media_items else None
+    with connect(DB_PATH) as conn:
         cur = conn.execute(
             """
-            INSERT INTO collect_entries (user_id, chat_id, message_id, photo_file_id, photo_file_path, comment, created_at, tags, published_to_channel, media_type)
-            VALUES (?, ?, ?, ?, NULL, ?, ?, NULL, 0, ?)
+            INSERT INTO collect_entries (user_id, chat_id, message_id, photo_file_id, photo_file_path, comment, created_at, tags, published_to_channel, media_type, file_unique_id, media_items)
+            VALUES (?, ?, ?, ?, NULL, ?, ?, NULL, 0, ?, ?, ?)
             """,
-            (user_id, chat_id, message_id, file_id, comment or "", created_at, media_type),
+            (user_id, chat_id, message_id, file_id, comment or "", created_at, media_type, file_unique_id, items_json),
         )
         rowid = cur.lastrowid
     logger.info("Saved entry: id=%s user=%s chat=%s msg=%s", rowid, user_id, chat_id, message_id)
     return rowid
 
 
-def get_unpublished_entries() -> list[tuple[int, str, str | None, str]]:
-    """Возвращает [(id, file_id, comment, media_type), ...] для неопубликованных записей."""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+def get_unpublished_entries() -> list[tuple[int, str, str | None, str, str]]:
+    """Возвращает [(id, file_id, comment, media_type, created_at), ...] для неопубликованных записей."""
+    with connect(DB_PATH) as conn:
         rows = conn.execute(
-            "SELECT id, photo_file_id, comment, COALESCE(media_type, 'photo') as media_type FROM collect_entries WHERE published_to_channel = 0 ORDER BY id"
+            "SELECT id, photo_file_id, comment, COALESCE(media_type, 'photo') as media_type, created_at FROM collect_entries WHERE published_to_channel = 0 ORDER BY id"
         ).fetchall()
-    return [(r["id"], r["photo_file_id"], r["comment"] or None, r["media_type"] or "photo") for r in rows]
+    return [(r["id"], r["photo_file_id"], r["comment"] or None, r["media_type"] or "photo", r["created_at"] or "") for r in rows]
 
 
 def mark_published(entry_id: int) -> None:
     """Помечает запись как опубликованную."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         conn.execute("UPDATE collect_entries SET published_to_channel = 1 WHERE id = ?", (entry_id,))
 
 
 def mark_unpublished(entry_id: int) -> None:
     """Откатывает пометку (если пост не удался)."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         conn.execute("UPDATE collect_entries SET published_to_channel = 0 WHERE id = ?", (entry_id,))
 
 
+def group_into_posts(entries: list[tuple]) -> list[list[tuple]]:
+    """Очередь → посты: подряд идущие фото/видео одного дня — альбом до ALBUM_MAX_ITEMS, остальное (кружки) по одному."""
+    posts: list[list[tuple]] = []
+    for entry in entries:
+        last = posts[-1] if posts else None
+        if (
+            last
+            and entry[3] in ALBUM_MEDIA_TYPES
+            and last[-1][3] in ALBUM_MEDIA_TYPES
+            and len(last) < ALBUM_MAX_ITEMS
+            and last[-1][4][:10] == entry[4][:10]
+        ):
+            last.append(entry)
+        else:
+            posts.append([entry])
+    return posts
+
+
+def get_pending_video(user_id: int) -> tuple[int, str, str | None, str, str] | None:
+    """Последнее неопубликованное видео/кружок пользователя для /post: (id, file_id, comment, media_type, created_at)."""
+    with connect(DB_PATH) as conn:
+        r = conn.execute(
+            """
+            SELECT id, photo_file_id, comment, media_type, created_at FROM collect_entries
+            WHERE user_id = ? AND published_to_channel = 0 AND media_type IN ('video', 'video_note')
+            ORDER BY id DESC LIMIT 1
+            """,
+            (user_id,),
+        ).fetchone()
+    return (r["id"], r["photo_file_id"], r["comment"] or None, r["media_type"], r["created_at"] or "") if r else None
+
+
+def get_outbox_id(entry_id: int) -> int | None:
+    with connect(DB_PATH) as conn:
+        row = conn.execute("SELECT outbox_id FROM collect_entries WHERE id = ?", (entry_id,)).fetchone()
+    return row[0] if row else None
+
+
 def get_unpublished_for_user(user_id: int) -> list[tuple[int, str | None]]:
     """Возвращает [(id, comment), ...] неопубликованных записей пользователя (новые сверху)."""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+    with connect(DB_PATH) as conn:
         rows = conn.execute(
             "SELECT id, comment FROM collect_entries WHERE published_to_channel = 0 AND user_id = ? ORDER BY id DESC",
             (user_id,),
@@ -258,7 +265,7 @@ def save_raw(
     created_at = datetime.utcnow().isoformat()
     meta_json = json.dumps(metadata) if metadata else None
     tags_str = ",".join(tags) if tags else None
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         cur = conn.execute(
             """
             INSERT INTO raw (user_id, chat_id, title, content, source, created_at, rapa_stage, metadata, tags)
@@ -277,10 +284,48 @@ def save_raw(
     return rowid
 
 
+def save_raw_many(user_id: int, chat_id: int, items: list[tuple[str, list[str]]], source: str = "Telegram") -> list[int]:
+    """Пачка Raw [(текст, теги), ...] одной транзакцией, сразу с предложением Assign (как save_raw + propose_assign)."""
+    from bot import related
+    from bot.rapa import area_id_for, classify_raw
+
+    now = datetime.utcnow().isoformat()
+    ids: list[int] = []
+    with connect(DB_PATH) as conn:
+        for content, tags in items:
+            content = (content or "").strip() or "…"
+            title = content[:80] + "..." if len(content) > 80 else content
+            cls = classify_raw(content)
+            cur = conn.execute(
+                """
+                INSERT INTO raw (user_id, chat_id, title, content, source, created_at, rapa_stage, metadata, tags,
+                                 gtd_type, para_type, area_id, assign_proposed_at)
+                VALUES (?, ?, ?, ?, ?, ?, 'Assign', NULL, ?, ?, ?, ?, ?)
+                """,
+                (user_id, chat_id, title, content, source, now, ",".join(tags) if tags else None,
+                 cls["gtd_type"], cls["para_type"], area_id_for(user_id, cls.get("area_slug"), DB_PATH), now),
+            )
+            ids.append(cur.lastrowid)
+    try:
+        # Как в propose_assign: индекс похожих и предложенный проект, но одной записью в индекс на пачку
+        texts = [(content or "").strip() or "…" for content, _ in items]
+        suggested = []
+        for rid, vec in zip(ids, related.index_raw_many(list(zip(ids, texts)), user_id, DB_PATH)):
+            project = related.suggest_project(vec, user_id, DB_PATH)
+            if project:
+                suggested.append((project["project_id"], rid))
+        if suggested:
+            with connect(DB_PATH) as conn:
+                conn.executemany("UPDATE raw SET suggested_project_id = ? WHERE id = ?", suggested)
+    except Exception as e:
+        logger.warning("related index for raw batch: %s", e)
+    logger.info("Saved raw batch: %s items user=%s source=%s", len(ids), user_id, source)
+    return ids
+
+
 def add_tag_to_raw(raw_id: int, user_id: int, tag: str) -> bool:
     """Добавляет тег к записи Raw. Возвращает True если обновлено."""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+    with connect(DB_PATH) as conn:
         row = conn.execute("SELECT tags FROM raw WHERE id = ? AND user_id = ?", (raw_id, user_id)).fetchone()
         if not row:
             return False
@@ -308,13 +353,22 @@ def build_raw_tag_keyboard(raw_id: int, exclude_tags: list[str] | None = None) -
 
 
 def cancel_entry(entry_id: int, user_id: int) -> bool:
-    """Удаляет отложенную запись. Возвращает True если удалено."""
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.execute(
-            "DELETE FROM collect_entries WHERE id = ? AND user_id = ? AND published_to_channel = 0",
+    """Удаляет отложенную запись (и её пост из outbox, если он ещё не отправляется). Возвращает True если удалено."""
+    with connect(DB_PATH) as conn:
+        row = conn.execute(
+            "SELECT outbox_id FROM collect_entries WHERE id = ? AND user_id = ? AND published_to_channel = 0",
             (entry_id, user_id),
-        )
-    return cur.rowcount > 0
+        ).fetchone()
+        if not row:
+            return False
+        if row["outbox_id"]:
+            cur = conn.execute("DELETE FROM channel_outbox WHERE id = ? AND status IN ('queued', 'failed')", (row["outbox_id"],))
+            if cur.rowcount == 0:
+                return False  # уже отправляется
+            # Остальные записи альбома вернутся в очередь следующей публикации
+            conn.execute("UPDATE collect_entries SET outbox_id = NULL WHERE outbox_id = ?", (row["outbox_id"],))
+        conn.execute("DELETE FROM collect_entries WHERE id = ?", (entry_id,))
+    return True
 
 
 # --- Заготовки (fallback) ---
@@ -322,7 +376,7 @@ def cancel_entry(entry_id: int, user_id: int) -> bool:
 def add_fallback(user_id: int, file_id: str, media_type: str = "photo") -> int:
     """Добавляет фото/видео в заготовки. media_type: 'photo' | 'video'. Возвращает id."""
     created_at = datetime.utcnow().isoformat()
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         cur = conn.execute(
             "INSERT INTO fallback_photos (user_id, photo_file_id, created_at, used_at, media_type) VALUES (?, ?, ?, NULL, ?)",
             (user_id, file_id, created_at, media_type),
@@ -330,14 +384,25 @@ def add_fallback(user_id: int, file_id: str, media_type: str = "photo") -> int:
         return cur.lastrowid
 
 
+def add_fallbacks(user_id: int, items: list[tuple[str, str]]) -> int:
+    """Несколько заготовок [(file_id, media_type), ...] одной транзакцией (альбом). Возвращает число."""
+    created_at = datetime.utcnow().isoformat()
+    with connect(DB_PATH) as conn:
+        conn.executemany(
+            "INSERT INTO fallback_photos (user_id, photo_file_id, created_at, used_at, media_type) VALUES (?, ?, ?, NULL, ?)",
+            [(user_id, file_id, created_at, media_type) for file_id, media_type in items],
+        )
+    return len(items)
+
+
 def get_fallback_unused_count() -> int:
     """Количество неиспользованных заготовок."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         return conn.execute("SELECT COUNT(*) FROM fallback_photos WHERE used_at IS NULL").fetchone()[0]
 
 
 def get_fallback_unused_count_for_user(user_id: int) -> int:
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         return conn.execute(
             "SELECT COUNT(*) FROM fallback_photos WHERE used_at IS NULL AND user_id = ?", (user_id,)
         ).fetchone()[0]
@@ -345,8 +410,7 @@ def get_fallback_unused_count_for_user(user_id: int) -> int:
 
 def get_random_unused_fallback() -> tuple[int, int, str, str] | None:
     """Возвращает (id, user_id, file_id, media_type) или None."""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+    with connect(DB_PATH) as conn:
         row = conn.execute(
             "SELECT id, user_id, photo_file_id, COALESCE(media_type, 'photo') as media_type FROM fallback_photos WHERE used_at IS NULL ORDER BY RANDOM() LIMIT 1"
         ).fetchone()
@@ -355,15 +419,10 @@ def get_random_unused_fallback() -> tuple[int, int, str, str] | None:
     return (row["id"], row["user_id"], row["photo_file_id"], row["media_type"] or "photo")
 
 
-def mark_fallback_used(fallback_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("UPDATE fallback_photos SET used_at = ? WHERE id = ?", (datetime.utcnow().isoformat(), fallback_id))
-
-
 def count_photos_sent_today_by_user(user_id: int) -> int:
     """Считает, сколько фото за сегодня отправил пользователь (collect_entries за сегодня)."""
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         return conn.execute(
             "SELECT COUNT(*) FROM collect_entries WHERE user_id = ? AND created_at >= ?",
             (user_id, today_start),
@@ -382,9 +441,33 @@ async def _post_media_to_channel(
         await bot.send_photo(chat_id=CHANNEL_ID, photo=file_id, caption=caption)
 
 
+async def _post_album_to_channel(bot: Bot, entries: list[tuple]) -> None:
+    """Публикует 2–10 фото/видео одним альбомом (подпись у каждого элемента своя)."""
+    media = [
+        InputMediaVideo(media=file_id, caption=caption) if media_type == "video" else InputMediaPhoto(media=file_id, caption=caption)
+        for _, file_id, caption, media_type, _ in entries
+    ]
+    await bot.send_media_group(chat_id=CHANNEL_ID, media=media)
+
+
+async def _send_outbox_row(bot: Bot, row: dict) -> None:
+    """Отправка строки outbox: один элемент — обычный пост, несколько — альбом."""
+    items = row["items"]
+    if len(items) == 1:
+        await _post_media_to_channel(bot, items[0]["file_id"], items[0]["caption"], items[0]["media_type"])
+    else:
+        await _post_album_to_channel(bot, [(None, i["file_id"], i["caption"], i["media_type"], None) for i in items])
+
+
+async def publish_entries_now(bot: Bot, posts: list[list[tuple]]) -> dict:
+    """В outbox и сразу отправить (не дожидаясь воркера). Не ушедшее остаётся в очереди с повтором."""
+    ids = await run_write(outbox.enqueue_entries, posts)
+    return await outbox.deliver(lambda row: _send_outbox_row(bot, row), _channel_bucket(), ids=ids)
+
+
 def sprint_report_submitted(sprint_id: str, user_id: int) -> bool:
     """Проверяет, сдан ли отчёт по спринту."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         row = conn.execute(
             "SELECT 1 FROM sprint_reports WHERE sprint_id = ? AND user_id = ?",
             (sprint_id, user_id),
@@ -394,7 +477,7 @@ def sprint_report_submitted(sprint_id: str, user_id: int) -> bool:
 
 def get_owner_user_id() -> int | None:
     """user_id владельца (из последней записи collect или fallback)."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with connect(DB_PATH) as conn:
         row = conn.execute("SELECT user_id FROM collect_entries ORDER BY id DESC LIMIT 1").fetchone()
         if row:
             return row[0]
@@ -404,7 +487,7 @@ def get_owner_user_id() -> int | None:
     return None
 
 
-async def on_photo(message: Message, bot: Bot) -> None:
+async def on_photo(message: Message, bot: Bot, raw_state: str | None = None) -> None:
     """Обработчик: фото с подписью или без."""
     user_id = message.from_user.id if message.from_user else 0
     chat_id = message.chat.id
@@ -417,33 +500,39 @@ async def on_photo(message: Message, bot: Bot) -> None:
         await message.reply("Не вижу фото. Отправь фото с подписью или без.")
         return
 
+    if message.media_group_id:
+        _albums.add(message, raw_state=raw_state)  # весь альбом — в on_album
+        return
+
     photo_file_id = photo.file_id
 
     # Режим «добавляю заготовки»
-    if user_id in _adding_stock:
-        add_fallback(user_id, photo_file_id)
-        n = get_fallback_unused_count_for_user(user_id)
+    if raw_state == Mode.adding_stock.state:
+        await run_write(add_fallback, user_id, photo_file_id)
+        n = await run_read(get_fallback_unused_count_for_user, user_id)
         await message.reply(f"Добавил в заготовки ✓ Осталось заготовок: {n}. Ещё фото или /done — закончить.")
         return
 
     # Режим «добавляю в Raw» или подпись #raw
-    is_raw = user_id in _adding_raw or (comment and re.search(r"#raw\b", comment, re.I))
+    is_raw = raw_state == Mode.adding_raw.state or (comment and re.search(r"#raw\b", comment, re.I))
     if is_raw:
         content = re.sub(r"#raw\b", "", comment, flags=re.I).strip() if comment else ""
         cleaned, tags = extract_raw_tags(content)
-        raw_id = save_raw(
-            user_id, chat_id, cleaned or "📷 Фото", source="Telegram",
+        raw_id = await run_write(
+            save_raw, user_id, chat_id, cleaned or "📷 Фото", source="Telegram",
             metadata={"photo_file_id": photo_file_id}, tags=tags or None
         )
         tags_hint = f" #{','.join(tags)}" if tags else ""
-        suffix = " Ещё фото или /done — закончить." if user_id in _adding_raw else ""
+        suffix = " Ещё фото или /done — закончить." if raw_state == Mode.adding_raw.state else ""
         text = f"✓ В Raw #%s%s%s" % (raw_id, tags_hint, suffix)
         kb = build_raw_tag_keyboard(raw_id, exclude_tags=tags) if not tags else None
         await message.reply(text, reply_markup=kb)
         return
 
     try:
-        rowid = save_entry(user_id, chat_id, message_id, photo_file_id, comment)
+        rowid = await run_write(
+            save_entry, user_id, chat_id, message_id, photo_file_id, comment, file_unique_id=photo.file_unique_id
+        )
         # Публикуем в канал, если задан CHANNEL_ID
         if CHANNEL_ID:
             if POST_SCHEDULE_TIME:
@@ -453,19 +542,17 @@ async def on_photo(message: Message, bot: Bot) -> None:
                     "Сейчас — нажми /postnow в меню."
                 )
             else:
-                # Мгновенный постинг
-                try:
-                    await _post_media_to_channel(
-                        bot, photo_file_id, comment if comment else None, media_type="photo"
-                    )
+                # Мгновенный постинг (через outbox: при ошибке пост останется в очереди и уйдёт повтором)
+                entry = (rowid, photo_file_id, comment or None, "photo", "")
+                stats = await publish_entries_now(bot, [[entry]])
+                if stats["sent"]:
                     logger.info("Posted to channel: %s", CHANNEL_ID)
-                    mark_published(rowid)
                     await message.reply("Записал твой день и опубликовал в канал ✓")
-                except Exception as ch_err:
-                    logger.exception("Channel post failed: %s", ch_err)
+                else:
+                    error = stats["errors"][0] if stats["errors"] else "пост уже в очереди"
                     await message.reply(
-                        f"Записал в БД, но не удалось опубликовать в канал.\n"
-                        f"Ошибка: {type(ch_err).__name__}: {ch_err}\n\n"
+                        f"Записал в БД, но не удалось опубликовать в канал — повторю автоматически.\n"
+                        f"Ошибка: {error}\n\n"
                         "Проверь: бот админ с правом «Post messages»? /testchannel — тест."
                     )
                     return
@@ -476,7 +563,7 @@ async def on_photo(message: Message, bot: Bot) -> None:
         await message.reply("Не удалось сохранить. Попробуй позже.")
 
 
-async def on_video(message: Message, bot: Bot) -> None:
+async def on_video(message: Message, bot: Bot, raw_state: str | None = None) -> None:
     """Обработчик: видео с подписью или без. Постит в канал как фото."""
     logger.info("on_video: received video from user_id=%s", message.from_user.id if message.from_user else 0)
     user_id = message.from_user.id if message.from_user else 0
@@ -489,40 +576,41 @@ async def on_video(message: Message, bot: Bot) -> None:
         await message.reply("Не вижу видео. Отправь видео с подписью или без.")
         return
 
+    if message.media_group_id:
+        _albums.add(message, raw_state=raw_state)
+        return
+
     video_file_id = video.file_id
 
     # Режим «добавляю заготовки»
-    if user_id in _adding_stock:
-        add_fallback(user_id, video_file_id, media_type="video")
-        n = get_fallback_unused_count_for_user(user_id)
+    if raw_state == Mode.adding_stock.state:
+        await run_write(add_fallback, user_id, video_file_id, media_type="video")
+        n = await run_read(get_fallback_unused_count_for_user, user_id)
         await message.reply(f"Добавил видео в заготовки ✓ Осталось заготовок: {n}. Ещё фото/видео или /done — закончить.")
         return
 
     # Режим «добавляю в Raw» или подпись #raw
-    is_raw = user_id in _adding_raw or (comment and re.search(r"#raw\b", comment, re.I))
+    is_raw = raw_state == Mode.adding_raw.state or (comment and re.search(r"#raw\b", comment, re.I))
     if is_raw:
         content = re.sub(r"#raw\b", "", comment, flags=re.I).strip() if comment else ""
         cleaned, tags = extract_raw_tags(content)
-        raw_id = save_raw(
-            user_id, chat_id, cleaned or "🎬 Видео", source="Telegram",
+        raw_id = await run_write(
+            save_raw, user_id, chat_id, cleaned or "🎬 Видео", source="Telegram",
             metadata={"video_file_id": video_file_id}, tags=tags or None
         )
         tags_hint = f" #{','.join(tags)}" if tags else ""
-        suffix = " Ещё фото/видео или /done — закончить." if user_id in _adding_raw else ""
+        suffix = " Ещё фото/видео или /done — закончить." if raw_state == Mode.adding_raw.state else ""
         text = f"✓ В Raw #%s%s%s" % (raw_id, tags_hint, suffix)
         kb = build_raw_tag_keyboard(raw_id, exclude_tags=tags) if not tags else None
         await message.reply(text, reply_markup=kb)
         return
 
     try:
-        rowid = save_entry(user_id, chat_id, message_id, video_file_id, comment, media_type="video")
+        rowid = await run_write(
+            save_entry, user_id, chat_id, message_id, video_file_id, comment,
+            media_type="video", file_unique_id=video.file_unique_id,
+        )
         if CHANNEL_ID:
-            _pending_post[user_id] = {
-                "entry_id": rowid,
-                "file_id": video_file_id,
-                "caption": comment if comment else None,
-                "media_type": "video",
-            }
             await message.reply(
                 "Видео получено ✓ Напиши /post чтобы опубликовать в канал."
             )
@@ -533,21 +621,107 @@ async def on_video(message: Message, bot: Bot) -> None:
         await message.reply("Не удалось сохранить. Попробуй позже.")
 
 
-async def on_document_video(message: Message, bot: Bot) -> None:
+def _album_part(message: Message) -> dict | None:
+    """Часть альбома: {media_type, file_id, file_unique_id, caption} или None (не фото/видео)."""
+    if message.photo:
+        media, media_type = message.photo[-1], "photo"
+    elif message.video:
+        media, media_type = message.video, "video"
+    else:
+        return None
+    return {"media_type": media_type, "file_id": media.file_id, "file_unique_id": media.file_unique_id,
+            "caption": message.caption or None}
+
+
+async def on_album(messages: list[Message], raw_state: str | None = None) -> None:
+    """Альбом (части с общим media_group_id, собраны MediaGroupCollector): одна запись, один ответ, один пост."""
+    first = messages[0]
+    user_id = first.from_user.id if first.from_user else 0
+    chat_id = first.chat.id
+    parts = [p for p in map(_album_part, messages) if p]
+    if not parts:
+        return
+    # Подпись альбома Telegram кладёт в одну из частей (обычно первую)
+    comment = "\n".join(p["caption"] for p in parts if p["caption"])
+    cover = parts[0]
+    logger.info("on_album: %s parts from user_id=%s (media_group_id=%s)", len(parts), user_id, first.media_group_id)
+
+    if raw_state == Mode.adding_stock.state:
+        added = await run_write(add_fallbacks, user_id, [(p["file_id"], p["media_type"]) for p in parts])
+        n = await run_read(get_fallback_unused_count_for_user, user_id)
+        await first.reply(f"Добавил в заготовки {added} ✓ Осталось заготовок: {n}. Ещё фото/видео или /done — закончить.")
+        return
+
+    is_raw = raw_state == Mode.adding_raw.state or (comment and re.search(r"#raw\b", comment, re.I))
+    if is_raw:
+        content = re.sub(r"#raw\b", "", comment, flags=re.I).strip() if comment else ""
+        cleaned, tags = extract_raw_tags(content)
+        metadata = {
+            f"{cover['media_type']}_file_id": cover["file_id"],
+            "media_group_id": first.media_group_id,
+            "media": [{"media_type": p["media_type"], "file_id": p["file_id"]} for p in parts],
+        }
+        raw_id = await run_write(
+            save_raw, user_id, chat_id, cleaned or f"🖼 Альбом ({len(parts)})", source="Telegram",
+            metadata=metadata, tags=tags or None
+        )
+        tags_hint = f" #{','.join(tags)}" if tags else ""
+        suffix = " Ещё фото/видео или /done — закончить." if raw_state == Mode.adding_raw.state else ""
+        text = f"✓ В Raw #%s (альбом, %s)%s%s" % (raw_id, len(parts), tags_hint, suffix)
+        kb = build_raw_tag_keyboard(raw_id, exclude_tags=tags) if not tags else None
+        await first.reply(text, reply_markup=kb)
+        return
+
+    try:
+        rowid = await run_write(
+            save_entry, user_id, chat_id, first.message_id, cover["file_id"], comment,
+            media_type=cover["media_type"], file_unique_id=cover["file_unique_id"], media_items=parts,
+        )
+        if not CHANNEL_ID:
+            await first.reply(f"Записал твой день ✓ Альбом: {len(parts)}.")
+        elif POST_SCHEDULE_TIME:
+            await first.reply(
+                f"Записал альбом ({len(parts)}) ✓ Опубликую в канал в {POST_SCHEDULE_TIME}. "
+                "Сейчас — нажми /postnow в меню."
+            )
+        else:
+            # Альбом — уже готовый пост: публикуем сразу, в т.ч. с видео (одиночное видео ждёт /post)
+            entry = (rowid, cover["file_id"], comment or None, cover["media_type"], "")
+            stats = await publish_entries_now(first.bot, [[entry]])
+            if stats["sent"]:
+                await first.reply(f"Записал альбом ({len(parts)}) и опубликовал в канал ✓")
+            else:
+                error = stats["errors"][0] if stats["errors"] else "пост уже в очереди"
+                await first.reply(
+                    f"Записал в БД, но не удалось опубликовать в канал — повторю автоматически.\nОшибка: {error}"
+                )
+    except Exception as e:
+        logger.exception("Error saving album: %s", e)
+        await first.reply("Не удалось сохранить альбом. Попробуй позже.")
+
+
+# Части альбомов копятся здесь и уходят в on_album одним вызовом
+_albums = MediaGroupCollector(on_album)
+# Лимит команд на пользователя и склейка пачек текста (bot/throttling.py)
+_burst = BurstMiddleware()
+
+
+async def on_document_video(message: Message, bot: Bot, raw_state: str | None = None) -> None:
     """Видео, отправленное как документ (файл). Перенаправляем в on_video."""
     logger.info("on_document_video: received from user_id=%s", message.from_user.id if message.from_user else 0)
     try:
         doc = message.document
         class _Video:
             file_id = doc.file_id
+            file_unique_id = doc.file_unique_id
         message.video = _Video()
-        await on_video(message, bot)
+        await on_video(message, bot, raw_state)
     except Exception as e:
         logger.exception("Document video handler failed: %s", e)
         await message.reply("Не удалось обработать видео. Попробуй отправить как обычное видео (не файл).")
 
 
-async def on_video_note(message: Message, bot: Bot) -> None:
+async def on_video_note(message: Message, bot: Bot, raw_state: str | None = None) -> None:
     """Обработчик: видеокружок (video note). Предлагает запостить по команде /post."""
     logger.info("on_video_note: received from user_id=%s", message.from_user.id if message.from_user else 0)
     user_id = message.from_user.id if message.from_user else 0
@@ -562,34 +736,31 @@ async def on_video_note(message: Message, bot: Bot) -> None:
 
     file_id = video_note.file_id
 
-    if user_id in _adding_stock:
-        add_fallback(user_id, file_id, media_type="video_note")
-        n = get_fallback_unused_count_for_user(user_id)
+    if raw_state == Mode.adding_stock.state:
+        await run_write(add_fallback, user_id, file_id, media_type="video_note")
+        n = await run_read(get_fallback_unused_count_for_user, user_id)
         await message.reply(f"Добавил в заготовки ✓ Осталось: {n}. Ещё медиа или /done.")
         return
 
-    is_raw = user_id in _adding_raw or (comment and re.search(r"#raw\b", comment, re.I))
+    is_raw = raw_state == Mode.adding_raw.state or (comment and re.search(r"#raw\b", comment, re.I))
     if is_raw:
         content = re.sub(r"#raw\b", "", comment, flags=re.I).strip() if comment else ""
         cleaned, tags = extract_raw_tags(content)
-        raw_id = save_raw(
-            user_id, chat_id, cleaned or "🎬 Видеокружок", source="Telegram",
+        raw_id = await run_write(
+            save_raw, user_id, chat_id, cleaned or "🎬 Видеокружок", source="Telegram",
             metadata={"video_note_file_id": file_id}, tags=tags or None
         )
         tags_hint = f" #{','.join(tags)}" if tags else ""
-        suffix = " Ещё медиа или /done." if user_id in _adding_raw else ""
+        suffix = " Ещё медиа или /done." if raw_state == Mode.adding_raw.state else ""
         await message.reply(f"✓ В Raw #%s%s%s" % (raw_id, tags_hint, suffix))
         return
 
     try:
-        rowid = save_entry(user_id, chat_id, message_id, file_id, comment, media_type="video_note")
+        rowid = await run_write(
+            save_entry, user_id, chat_id, message_id, file_id, comment,
+            media_type="video_note", file_unique_id=video_note.file_unique_id,
+        )
         if CHANNEL_ID:
-            _pending_post[user_id] = {
-                "entry_id": rowid,
-                "file_id": file_id,
-                "caption": comment if comment else None,
-                "media_type": "video_note",
-            }
             await message.reply(
                 "Видео получено ✓ Напиши /post чтобы опубликовать в канал."
             )
@@ -613,16 +784,14 @@ async def cmd_diary(message: Message) -> None:
     if not content:
         await message.reply("Напиши текст после /diary — сохраню в Raw с тегом diary.")
         return
-    raw_id = save_raw(user_id, chat_id, content, source="Telegram", tags=["diary"])
+    raw_id = await run_write(save_raw, user_id, chat_id, content, source="Telegram", tags=["diary"])
     if raw_id:
         await message.reply(f"✓ В Raw #%s #diary" % raw_id)
 
 
-async def cmd_rawphoto(message: Message) -> None:
+async def cmd_rawphoto(message: Message, state: FSMContext) -> None:
     """Режим: следующие фото/видео идут в Raw. /done — выйти."""
-    global _adding_raw
-    user_id = message.from_user.id if message.from_user else 0
-    _adding_raw.add(user_id)
+    await state.set_state(Mode.adding_raw)
     await message.reply("Режим Raw: следующие фото/видео — в Inbox. /done — закончить.")
 
 
@@ -656,7 +825,7 @@ async def cmd_raw(message: Message) -> None:
         return
 
     cleaned, tags = extract_raw_tags(content)
-    raw_id = save_raw(user_id, chat_id, cleaned or "…", source="Telegram", tags=tags or None)
+    raw_id = await run_write(save_raw, user_id, chat_id, cleaned or "…", source="Telegram", tags=tags or None)
     if raw_id:
         tags_hint = f" #{','.join(tags)}" if tags else ""
         text = f"✓ Сохранено в Raw #%s%s\n\n«%s»" % (raw_id, tags_hint, ((cleaned or content)[:100] + "…" if len(cleaned or content) > 100 else (cleaned or content)))
@@ -674,17 +843,46 @@ async def cmd_review(message: Message) -> None:
     try:
         from bot.rapa import build_daily_review, build_weekly_review, build_monthly_review
         if period in ("week", "weekly", "неделя"):
-            out = build_weekly_review(user_id)
+            out = await run_read(build_weekly_review, user_id)
         elif period in ("month", "monthly", "месяц"):
-            out = build_monthly_review(user_id)
+            out = await run_read(build_monthly_review, user_id)
         else:
-            out = build_daily_review(user_id)
+            out = await run_read(build_daily_review, user_id)
         await message.reply(out[:4000])
     except Exception as e:
         logger.exception("Review failed: %s", e)
         await message.reply(f"Ошибка: {e}")
 
 
+async def cmd_find(message: Message) -> None:
+    """/find <запрос> — полнотекстовый поиск по Raw."""
+    user_id = message.from_user.id if message.from_user else 0
+    parts = (message.text or "").strip().split(maxsplit=1)
+    query = parts[1].strip() if len(parts) > 1 else ""
+    if not query:
+        await message.reply("Что искать? /find <слова> — поиск по Raw (заголовок, текст, теги).")
+        return
+    try:
+        from bot.rapa import search_raw
+        res = await run_read(search_raw, user_id, query, limit=10, mark=("[", "]"))
+    except Exception as e:
+        logger.exception("Find failed: %s", e)
+        await message.reply(f"Ошибка поиска: {e}")
+        return
+    if not res["items"]:
+        await message.reply(f"По запросу «{query}» в Raw ничего нет.")
+        return
+    lines = [f"🔎 «{query}»:\n"]
+    for r in res["items"]:
+        date = (r.get("created_at") or "")[:10]
+        lines.append(f"#{r['id']} {date} [{r.get('rapa_stage') or 'Raw'}] {r.get('title') or ''}")
+        if r.get("snippet"):
+            lines.append(f"   {r['snippet']}")
+    if res["has_more"]:
+        lines.append("\n…есть ещё. Уточни запрос.")
+    await message.reply("\n".join(lines)[:4000])
+
+
 async def on_unhandled(message: Message) -> None:
     """Fallback: необработанный контент — логируем и отвечаем."""
     ct = getattr(message, "content_type", "?")
@@ -703,7 +901,8 @@ async def cmd_start(message: Message) -> None:
         f"{schedule_hint}\n\n"
         "Фото/видео → Collect (канал). Фото/видео с #raw или /rawphoto → Raw (Inbox).\n"
         "Теги: /diary или кнопки после сохранения в Raw.\n"
-        "RAPA: Raw раскладывается по слоям (Assign). /review daily|weekly|monthly — обзоры.\n\n"
+        "RAPA: Raw раскладывается по слоям (Assign). /review daily|weekly|monthly — обзоры.\n"
+        "/find <слова> — поиск по Raw.\n\n"
         "/postnow — опубликовать сейчас\n"
         "/postat 18:30 — опубликовать в указанное время\n"
         "/mylist — список отложенных\n"
@@ -714,28 +913,27 @@ async def cmd_start(message: Message) -> None:
     )
 
 
-async def cmd_addstock(message: Message) -> None:
+async def cmd_addstock(message: Message, state: FSMContext) -> None:
     """Включить режим добавления заготовок."""
     user_id = message.from_user.id if message.from_user else 0
-    _adding_stock.add(user_id)
-    n = get_fallback_unused_count_for_user(user_id)
+    await state.set_state(Mode.adding_stock)
+    n = await run_read(get_fallback_unused_count_for_user, user_id)
     await message.reply(
         f"Режим заготовок включён. Отправляй фото — каждое добавлю в заготовки. Закончить — /done.\n"
         f"Сейчас заготовок: {n}"
     )
 
 
-async def cmd_done(message: Message) -> None:
+async def cmd_done(message: Message, state: FSMContext, raw_state: str | None = None) -> None:
     """Выйти из режима заготовок или Raw."""
     user_id = message.from_user.id if message.from_user else 0
-    was_stock = user_id in _adding_stock
-    was_raw = user_id in _adding_raw
-    _adding_stock.discard(user_id)
-    _adding_raw.discard(user_id)
+    was_stock = raw_state == Mode.adding_stock.state
+    was_raw = raw_state == Mode.adding_raw.state
+    await state.clear()
     if was_raw:
         await message.reply("Готово. Режим Raw выключен.")
     elif was_stock:
-        n = get_fallback_unused_count_for_user(user_id)
+        n = await run_read(get_fallback_unused_count_for_user, user_id)
         await message.reply(f"Готово. Заготовок осталось: {n}.")
     else:
         await message.reply("Не был в режиме заготовок или Raw.")
@@ -744,13 +942,13 @@ async def cmd_done(message: Message) -> None:
 async def cmd_stock(message: Message) -> None:
     """Сколько заготовок осталось."""
     user_id = message.from_user.id if message.from_user else 0
-    n = get_fallback_unused_count_for_user(user_id)
+    n = await run_read(get_fallback_unused_count_for_user, user_id)
     await message.reply(f"Заготовок: {n}. Пополнить — /addstock.")
 
 
 async def run_sprint_reminder(bot: Bot) -> None:
     """Напоминание об отчёте по спринту (с SPRINT_REMINDER_START, пока не сдан)."""
-    uid = RAW_OWNER_USER_ID or get_owner_user_id()
+    uid = RAW_OWNER_USER_ID or await run_read(get_owner_user_id)
     if not uid:
         return
     try:
@@ -758,7 +956,7 @@ async def run_sprint_reminder(bot: Bot) -> None:
         today = date.today().isoformat()
         if today < SPRINT_REMINDER_START:
             return
-        if sprint_report_submitted(CURRENT_SPRINT_ID, uid):
+        if await run_read(sprint_report_submitted, CURRENT_SPRINT_ID, uid):
             return
         await bot.send_message(
             chat_id=uid,
@@ -771,30 +969,39 @@ async def run_sprint_reminder(bot: Bot) -> None:
 
 async def run_daily_review(bot: Bot) -> None:
     """Отправляет ежедневный RAPA-обзор владельцу."""
-    uid = RAW_OWNER_USER_ID or get_owner_user_id()
+    uid = RAW_OWNER_USER_ID or await run_read(get_owner_user_id)
     if not uid:
         return
     try:
         from bot.rapa import build_daily_review
-        text = build_daily_review(uid)
+        text = await run_read(build_daily_review, uid)
         await bot.send_message(chat_id=uid, text=text[:4000])
         logger.info("Daily review sent to %s", uid)
     except Exception as e:
         logger.exception("Daily review failed: %s", e)
 
 
+async def run_summarize_raw() -> None:
+    """Пересказы новых Raw (до SUMMARY_LIMIT строк за запуск)."""
+    from bot.summarize import summarize_pending
+    try:
+        await summarize_pending(DB_PATH)
+    except Exception as e:
+        logger.exception("Summaries failed: %s", e)
+
+
 async def run_fallback_check(bot: Bot) -> None:
     """В 23:00: если за день не было ни одного фото — постить заготовку и писать, сколько осталось."""
     if not CHANNEL_ID:
         return
-    owner = get_owner_user_id()
+    owner = await run_read(get_owner_user_id)
     if not owner:
         logger.info("Fallback check: no owner")
         return
-    if count_photos_sent_today_by_user(owner) > 0:
+    if await run_read(count_photos_sent_today_by_user, owner) > 0:
         logger.info("Fallback check: user sent photo today, skip")
         return
-    row = get_random_unused_fallback()
+    row = await run_read(get_random_unused_fallback)
     if not row:
         try:
             await bot.send_message(chat_id=owner, text="Сегодня не было фото, а заготовок нет. Добавь: /addstock")
@@ -802,20 +1009,23 @@ async def run_fallback_check(bot: Bot) -> None:
             pass
         return
     fallback_id, owner_id, file_id, media_type = row
-    mark_fallback_used(fallback_id)  # Сразу помечаем — чтобы другие экземпляры не постили то же
+    # used_at и строка outbox — одной транзакцией: другие экземпляры ту же заготовку не возьмут
+    ids = await run_write(outbox.enqueue_fallback, fallback_id, file_id, media_type)
+    if not ids:
+        return
+    stats = await outbox.deliver(lambda r: _send_outbox_row(bot, r), _channel_bucket(), ids=ids)
+    if not stats["sent"]:
+        logger.warning("Fallback post id=%s queued for retry: %s", fallback_id, stats["errors"])
+        return
+    remaining = await run_read(get_fallback_unused_count_for_user, owner_id)
     try:
-        await _post_media_to_channel(bot, file_id, None, media_type)
-        remaining = get_fallback_unused_count_for_user(owner_id)
         await bot.send_message(
             chat_id=owner_id,
             text=f"Сегодня не было фото — в канал ушла заготовка ✓ Осталось заготовок: {remaining}. Пополни: /addstock",
         )
-        logger.info("Fallback posted: id=%s, remaining=%s", fallback_id, remaining)
     except Exception as ex:
-        logger.exception("Fallback post failed: %s", ex)
-        # Откат: помечаем заготовку как неиспользованную
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.execute("UPDATE fallback_photos SET used_at = NULL WHERE id = ?", (fallback_id,))
+        logger.warning("Fallback notify failed: %s", ex)
+    logger.info("Fallback posted: id=%s, remaining=%s", fallback_id, remaining)
 
 
 async def cmd_channelid(message: Message) -> None:
@@ -825,22 +1035,33 @@ async def cmd_channelid(message: Message) -> None:
     )
 
 
-async def run_scheduled_post(bot: Bot) -> None:
-    """Публикует неопубликованные записи в канал (вызывается по расписанию)."""
+async def run_scheduled_post(bot: Bot) -> dict | None:
+    """Публикует неопубликованные записи в канал (по расписанию, /postat, /postnow). Возвращает статистику пачки."""
     if not CHANNEL_ID:
-        return
-    entries = get_unpublished_entries()
+        return None
+    entries = await run_read(get_unpublished_entries)
     if not entries:
         logger.info("Scheduled post: nothing to publish")
-        return
-    for eid, file_id, caption, media_type in entries:
-        mark_published(eid)  # Сразу помечаем — чтобы другие экземпляры бота не постили то же
-        try:
-            await _post_media_to_channel(bot, file_id, caption, media_type)
-            logger.info("Scheduled post: published entry id=%s", eid)
-        except Exception as ex:
-            logger.exception("Scheduled post failed for id=%s: %s", eid, ex)
-            mark_unpublished(eid)
+        return None
+    posts = group_into_posts(entries) if CHANNEL_POST_ALBUMS else [[e] for e in entries]
+    await run_write(outbox.enqueue_entries, posts)
+    # Всё готовое в outbox: новые посты, повторы, брошенные упавшим процессом
+    stats = await outbox.deliver(lambda row: _send_outbox_row(bot, row), _channel_bucket())
+    logger.info(
+        "Scheduled post: %s/%s posts published in %.1fs (p50 %.0f ms, p95 %.0f ms, retries %s, flood waits %s / %.0fs), "
+        "failed outbox ids: %s",
+        stats["sent"], stats["total"], stats["elapsed_s"], stats["p50_ms"], stats["p95_ms"],
+        stats["retries"], stats["retry_after"], stats["retry_after_s"], [r["id"] for r in stats["failed"]],
+    )
+    return stats
+
+
+def _channel_bucket() -> publisher.TokenBucket:
+    """Один bucket на процесс: /postnow во время запланированной пачки делит с ней лимит канала."""
+    global _post_bucket
+    if _post_bucket is None:
+        _post_bucket = publisher.TokenBucket()
+    return _post_bucket
 
 
 async def cmd_cancel(message: Message) -> None:
@@ -848,7 +1069,7 @@ async def cmd_cancel(message: Message) -> None:
     user_id = message.from_user.id if message.from_user else 0
     text = (message.text or "").strip()
     parts = text.split()
-    entries = get_unpublished_for_user(user_id)
+    entries = await run_read(get_unpublished_for_user, user_id)
     if not entries:
         await message.reply("Нет отложенных фото для отмены.")
         return
@@ -857,7 +1078,7 @@ async def cmd_cancel(message: Message) -> None:
             num = int(parts[1])
             if 1 <= num <= len(entries):
                 entry_id = entries[num - 1][0]
-                if cancel_entry(entry_id, user_id):
+                if await run_write(cancel_entry, entry_id, user_id):
                     await message.reply(f"Отменил фото #{num}.")
                 else:
                     await message.reply("Не удалось отменить.")
@@ -867,7 +1088,7 @@ async def cmd_cancel(message: Message) -> None:
             await message.reply("Укажи номер: /cancel 2")
     else:
         entry_id = entries[0][0]
-        if cancel_entry(entry_id, user_id):
+        if await run_write(cancel_entry, entry_id, user_id):
             await message.reply("Отменил последнее фото.")
         else:
             await message.reply("Не удалось отменить.")
@@ -876,7 +1097,7 @@ async def cmd_cancel(message: Message) -> None:
 async def cmd_mylist(message: Message) -> None:
     """Показать список отложенных фото."""
     user_id = message.from_user.id if message.from_user else 0
-    entries = get_unpublished_for_user(user_id)
+    entries = await run_read(get_unpublished_for_user, user_id)
     if not entries:
         await message.reply("Нет отложенных фото.")
         return
@@ -903,7 +1124,7 @@ async def cmd_postat(message: Message, bot: Bot) -> None:
     except (ValueError, IndexError):
         await message.reply("Формат: /postat HH:MM (например /postat 18:30)")
         return
-    entries = get_unpublished_entries()
+    entries = await run_read(get_unpublished_entries)
     if not entries:
         await message.reply("Нет накопленных постов.")
         return
@@ -913,34 +1134,37 @@ async def cmd_postat(message: Message, bot: Bot) -> None:
     run_date = datetime.now().replace(hour=h, minute=m, second=0, microsecond=0)
     if run_date <= datetime.now():
         run_date += timedelta(days=1)
-    _scheduler.add_job(run_scheduled_post, "date", run_date=run_date, args=[bot])
+    # id по времени: повторный /postat на то же время не создаёт второй пост
+    _scheduler.add_job(
+        scheduler.run_task, "date", run_date=run_date, args=["scheduled_post"],
+        id=f"postat:{run_date:%Y-%m-%dT%H:%M}", replace_existing=True,
+    )
     await message.reply(f"Опубликую {len(entries)} пост(ов) в {time_str} ✓")
 
 
 async def cmd_post(message: Message, bot: Bot) -> None:
     """Опубликовать в канал последнее сохранённое видео (после отправки видео напиши /post)."""
     user_id = message.from_user.id if message.from_user else 0
-    if user_id not in _pending_post:
-        await message.reply("Нет сохранённого видео. Отправь видео или видеокружок, затем напиши /post.")
-        return
     if not CHANNEL_ID:
         await message.reply("CHANNEL_ID не задан.")
         return
-    pending = _pending_post.pop(user_id)
-    try:
-        await _post_media_to_channel(
-            bot,
-            pending["file_id"],
-            pending["caption"],
-            pending.get("media_type", "video"),
-        )
-        mark_published(pending["entry_id"])
+    entry = await run_read(get_pending_video, user_id)
+    if not entry:
+        await message.reply("Нет сохранённого видео. Отправь видео или видеокружок, затем напиши /post.")
+        return
+    outbox_id = await run_read(get_outbox_id, entry[0])
+    if outbox_id:
+        # Уже в очереди (повтор после ошибки) — отправляем сейчас
+        stats = await outbox.deliver(lambda row: _send_outbox_row(bot, row), _channel_bucket(), ids=[outbox_id])
+    else:
+        stats = await publish_entries_now(bot, [[entry]])
+    if stats["sent"]:
         await message.reply("Опубликовано в канал ✓")
         logger.info("Posted pending video to channel: %s", CHANNEL_ID)
-    except Exception as ex:
-        logger.exception("Post failed: %s", ex)
-        _pending_post[user_id] = pending  # вернуть в очередь
-        await message.reply(f"Не удалось опубликовать: {ex}. Попробуй ещё раз /post.")
+    elif stats["errors"]:
+        await message.reply(f"Не удалось опубликовать: {stats['errors'][0]}. Повторю автоматически или попробуй /post.")
+    else:
+        await message.reply("Видео уже в очереди на публикацию — уйдёт в ближайшие минуты.")
 
 
 async def cmd_postnow(message: Message, bot: Bot) -> None:
@@ -948,13 +1172,19 @@ async def cmd_postnow(message: Message, bot: Bot) -> None:
     if not CHANNEL_ID:
         await message.reply("CHANNEL_ID не задан")
         return
-    entries = get_unpublished_entries()
+    entries = await run_read(get_unpublished_entries)
     if not entries:
         await message.reply("Нет накопленных постов для публикации.")
         return
     await message.reply(f"Публикую {len(entries)} пост(ов)...")
-    await run_scheduled_post(bot)
-    await message.reply("Готово ✓")
+    stats = await run_scheduled_post(bot)
+    if stats and stats["failed"]:
+        await message.reply(
+            f"Опубликовано постов: {stats['sent']} из {stats['total']} за {stats['elapsed_s']:.0f} с. "
+            f"Не ушло: {len(stats['failed'])} — повторю автоматически."
+        )
+    else:
+        await message.reply("Готово ✓")
 
 
 async def cmd_testchannel(message: Message, bot: Bot) -> None:
@@ -981,7 +1211,7 @@ async def on_text_to_raw(message: Message) -> None:
     chat_id = message.chat.id
     content = message.text.strip()
     cleaned, tags = extract_raw_tags(content)
-    raw_id = save_raw(user_id, chat_id, cleaned or "…", source="Telegram", tags=tags or None)
+    raw_id = await run_write(save_raw, user_id, chat_id, cleaned or "…", source="Telegram", tags=tags or None)
     if raw_id:
         tags_hint = f" #{','.join(tags)}" if tags else ""
         text = f"✓ В Raw #%s%s" % (raw_id, tags_hint)
@@ -989,6 +1219,24 @@ async def on_text_to_raw(message: Message) -> None:
         await message.reply(text, reply_markup=kb)
 
 
+async def on_text_to_raw_batch(messages: list[Message]) -> None:
+    """Пачка текстов подряд (пересылка, склеено BurstMiddleware): одна транзакция и один ответ-сводка."""
+    messages = [m for m in messages if m.text and not m.text.strip().startswith("/")]
+    if not messages:
+        return
+    last = messages[-1]
+    user_id = last.from_user.id if last.from_user else 0
+    items = [extract_raw_tags(m.text.strip()) for m in messages]
+    ids = await run_write(save_raw_many, user_id, last.chat.id, items)
+    tag_counts: dict[str, int] = {}
+    for _, tags in items:
+        for tag in tags:
+            tag_counts[tag] = tag_counts.get(tag, 0) + 1
+    tags_hint = " " + " ".join(f"#{t}×{n}" if n > 1 else f"#{t}" for t, n in tag_counts.items()) if tag_counts else ""
+    span = f"#{ids[0]}–#{ids[-1]}" if len(ids) > 1 else f"#{ids[0]}"
+    await last.reply(f"✓ {len(ids)} в Raw ({span}){tags_hint}")
+
+
 async def on_raw_tag_callback(callback: CallbackQuery) -> None:
     """Клик по кнопке тега: добавляем тег к записи Raw."""
     data = callback.data or ""
@@ -1001,7 +1249,7 @@ async def on_raw_tag_callback(callback: CallbackQuery) -> None:
         await callback.answer("Ошибка")
         return
     user_id = callback.from_user.id if callback.from_user else 0
-    if add_tag_to_raw(raw_id, user_id, tag):
+    if await run_write(add_tag_to_raw, raw_id, user_id, tag):
         await callback.answer(f"✓ Тег «{tag}» добавлен")
         # Убираем кнопки и обновляем текст
         try:
@@ -1050,6 +1298,7 @@ async def setup_bot_ui(bot: Bot) -> None:
         BotCommand(command="diary", description="В Raw с тегом diary"),
         BotCommand(command="rawphoto", description="Фото → Raw"),
         BotCommand(command="review", description="Обзор daily/weekly/monthly"),
+        BotCommand(command="find", description="Поиск по Raw"),
     ]
     try:
         await bot.set_my_commands(commands=commands)
@@ -1067,26 +1316,52 @@ async def setup_bot_ui(bot: Bot) -> None:
         logger.warning("Failed to set menu button: %s", e)
 
 
-def main() -> None:
-    if not BOT_TOKEN:
-        raise SystemExit("Укажи BOT_TOKEN в .env или config/.env")
+async def start_outbox_worker(bot: Bot) -> None:
+    """Фоновая доставка outbox: повторы по расписанию и посты, брошенные упавшим процессом."""
+    global _outbox_task
+    _outbox_task = asyncio.create_task(outbox.run_worker(lambda row: _send_outbox_row(bot, row), _channel_bucket()))
 
-    init_db()
 
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
+async def on_shutdown(*_) -> None:
+    """Дособирает альбомы, отдаёт лидерство планировщика, останавливает доставку outbox
+    и дожидается очереди записей в БД перед выходом."""
+    await _albums.flush()
+    await _burst.flush()
+    logger.info("Incoming updates: %s", _burst.stats())
+    logger.info("Reference cache: %s", db_cache.metrics())
+    if _leader is not None:
+        await _leader.stop()
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.shutdown(wait=False)
+    if _outbox_task is not None:
+        _outbox_task.cancel()
+    from db.aio import shutdown
+    shutdown(wait=True)
+
+
+def create_dispatcher(bot: Bot) -> Dispatcher:
+    """Dispatcher со всеми хендлерами и планировщиком (main, бенчмарки)."""
+    dp = Dispatcher(storage=SQLiteStorage())
+    dp.message.middleware(_burst)
 
     dp.startup.register(setup_bot_ui)
+    if CHANNEL_ID:
+        dp.startup.register(start_outbox_worker)
+    dp.shutdown.register(on_shutdown)
 
+    # Медиа и захват в Raw не ограничиваем (потерять фото или заметку хуже); тексты подряд склеиваются в одну пачку Raw
+    keep = {"throttle": False}
+    to_raw = {"coalesce": on_text_to_raw_batch}
     dp.message.register(cmd_start, Command("start"))
     dp.message.register(cmd_addstock, Command("addstock"))
     dp.message.register(cmd_done, Command("done"))
     dp.message.register(cmd_stock, Command("stock"))
     dp.message.register(cmd_channelid, Command("channelid"))
-    dp.message.register(cmd_raw, Command("raw"))
-    dp.message.register(cmd_diary, Command("diary"))
-    dp.message.register(cmd_rawphoto, Command("rawphoto"))
+    dp.message.register(cmd_raw, Command("raw"), flags=keep)
+    dp.message.register(cmd_diary, Command("diary"), flags=keep)
+    dp.message.register(cmd_rawphoto, Command("rawphoto"), flags=keep)
     dp.message.register(cmd_review, Command("review"))
+    dp.message.register(cmd_find, Command("find"))
     dp.callback_query.register(on_raw_tag_callback, F.data.startswith("raw_tag:"))
     dp.message.register(cmd_cancel, Command("cancel"))
     dp.message.register(cmd_mylist, Command("mylist"))
@@ -1094,52 +1369,152 @@ def main() -> None:
     dp.message.register(cmd_post, Command("post"))
     dp.message.register(cmd_postnow, Command("postnow"))
     dp.message.register(cmd_testchannel, Command("testchannel"))
+    # Пересланный текст не из канала (пачка пересылок из чатов) — в Raw, склеиваясь; из канала — ID канала
+    dp.message.register(on_text_to_raw, F.forward_origin.type != MessageOriginType.CHANNEL, F.text, flags=to_raw)
     dp.message.register(on_forwarded_from_channel, F.forward_origin)  # до on_photo!
-    dp.message.register(on_photo, F.photo)
-    dp.message.register(on_video, F.video)
-    dp.message.register(on_document_video, F.document, VideoDocumentFilter())
-    dp.message.register(on_video_note, F.video_note)
-    dp.message.register(on_text_to_raw, F.text)  # текст/ссылки → Raw
+    dp.message.register(on_photo, F.photo, flags=keep)
+    dp.message.register(on_video, F.video, flags=keep)
+    dp.message.register(on_document_video, F.document, VideoDocumentFilter(), flags=keep)
+    dp.message.register(on_video_note, F.video_note, flags=keep)
+    dp.message.register(on_text_to_raw, F.text, flags=to_raw)  # текст/ссылки → Raw
     dp.message.register(on_unhandled)  # fallback: всё остальное
 
-    # Планировщик: постинг, fallback, RAPA-обзор, напоминания по спринту
-    if CHANNEL_ID or REVIEW_DAILY_TIME or (SPRINT_REMINDER_START and CURRENT_SPRINT_ID):
+    # Планировщик: постинг, fallback, RAPA-обзор, напоминания по спринту, пересказы Raw
+    if CHANNEL_ID or REVIEW_DAILY_TIME or (SPRINT_REMINDER_START and CURRENT_SPRINT_ID) or SUMMARY_INTERVAL_MINUTES:
         async def start_scheduler(*_):
-            global _scheduler
-            _scheduler = AsyncIOScheduler()
+            global _scheduler, _leader
+            scheduler.register("scheduled_post", lambda: run_scheduled_post(bot))
+            scheduler.register("fallback_check", lambda: run_fallback_check(bot))
+            scheduler.register("daily_review", lambda: run_daily_review(bot))
+            scheduler.register("sprint_reminder", lambda: run_sprint_reminder(bot))
+            scheduler.register("summarize_raw", run_summarize_raw)
+            # На паузе, пока не стали лидером: /postat с любого экземпляра пишется в общее хранилище
+            _scheduler = scheduler.create_scheduler(DB_PATH)
+            _scheduler.start(paused=True)
+            times = {}
             if CHANNEL_ID:
-                try:
-                    if POST_SCHEDULE_TIME:
-                        h, m = map(int, POST_SCHEDULE_TIME.strip().split(":"))
-                        _scheduler.add_job(run_scheduled_post, "cron", hour=h, minute=m, args=[bot])
-                        logger.info("Scheduled post: daily at %s", POST_SCHEDULE_TIME)
-                except (ValueError, IndexError) as e:
-                    logger.warning("Invalid POST_SCHEDULE_TIME: %s", e)
-                try:
-                    h, m = map(int, (FALLBACK_TIME or "23:00").strip().split(":"))
-                    _scheduler.add_job(run_fallback_check, "cron", hour=h, minute=m, args=[bot])
-                    logger.info("Fallback check: daily at %s", FALLBACK_TIME)
-                except (ValueError, IndexError) as e:
-                    logger.warning("Invalid FALLBACK_TIME, using 23:00: %s", e)
-            if REVIEW_DAILY_TIME:
-                try:
-                    h, m = map(int, REVIEW_DAILY_TIME.strip().split(":"))
-                    _scheduler.add_job(run_daily_review, "cron", hour=h, minute=m, args=[bot])
-                    logger.info("Daily review: at %s", REVIEW_DAILY_TIME)
-                except (ValueError, IndexError) as e:
-                    logger.warning("Invalid REVIEW_DAILY_TIME: %s", e)
+                times["scheduled_post"] = POST_SCHEDULE_TIME
+                times["fallback_check"] = FALLBACK_TIME or "23:00"
+            times["daily_review"] = REVIEW_DAILY_TIME
             if SPRINT_REMINDER_START and CURRENT_SPRINT_ID:
-                try:
-                    h, m = map(int, (SPRINT_REMINDER_TIME or "10:00").strip().split(":"))
-                    _scheduler.add_job(run_sprint_reminder, "cron", hour=h, minute=m, args=[bot])
-                    logger.info("Sprint reminder: daily at %s (from %s)", SPRINT_REMINDER_TIME, SPRINT_REMINDER_START)
-                except (ValueError, IndexError) as e:
-                    logger.warning("Invalid SPRINT_REMINDER_TIME: %s", e)
-            _scheduler.start()
+                times["sprint_reminder"] = SPRINT_REMINDER_TIME or "10:00"
+            sync_daily_jobs(times)
+            sync_summary_job(SUMMARY_INTERVAL_MINUTES)
+            # Лидер раз в треть аренды будит планировщик: задания, добавленные другими экземплярами
+            _leader = scheduler.Leader(
+                path=DB_PATH, on_elected=_scheduler.resume, on_demoted=_scheduler.pause, on_renewed=_scheduler.wakeup
+            )
+            _leader.start()
         dp.startup.register(start_scheduler)
+    return dp
+
+
+def sync_daily_jobs(times: dict[str, str | None]) -> None:
+    """
+    Ежедневные задания в хранилище планировщика по .env ({имя: "HH:MM"}). Время не изменилось — задание
+    не трогаем (пропущенный за время простоя запуск выполнится), убранное из .env — удаляем.
+    """
+    from apscheduler.triggers.cron import CronTrigger
+
+    for name in DAILY_JOBS:
+        hhmm = times.get(name)
+        job = _scheduler.get_job(name)
+        if not hhmm:
+            if job:
+                _scheduler.remove_job(name)
+            continue
+        try:
+            h, m = map(int, hhmm.strip().split(":"))
+            trigger = CronTrigger(hour=h, minute=m)
+        except (ValueError, IndexError) as e:
+            logger.warning("Invalid time for %s (%r): %s", name, hhmm, e)
+            continue
+        if job is None or str(job.trigger) != str(trigger):
+            _scheduler.add_job(scheduler.run_task, trigger, args=[name], id=name, replace_existing=True)
+        logger.info("Scheduled %s: daily at %s", name, hhmm)
+
+
+def sync_summary_job(minutes: int) -> None:
+    """Задание summarize_raw раз в minutes минут; интервал не изменился — не трогаем, 0 — удаляем."""
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    job = _scheduler.get_job("summarize_raw")
+    if minutes <= 0:
+        if job:
+            _scheduler.remove_job("summarize_raw")
+        return
+    trigger = IntervalTrigger(minutes=minutes)
+    if job is None or str(job.trigger) != str(trigger):
+        _scheduler.add_job(scheduler.run_task, trigger, args=["summarize_raw"], id="summarize_raw", replace_existing=True)
+    logger.info("Scheduled summarize_raw: every %s min", minutes)
+
+
+def webhook_secret(token: str = "") -> str:
+    """Секрет для setWebhook: WEBHOOK_SECRET или производный от токена (одинаков у всех экземпляров и после рестарта)."""
+    import hashlib
+    return WEBHOOK_SECRET or hashlib.sha256((token or BOT_TOKEN).encode()).hexdigest()
+
+
+async def drop_webhook(bot: Bot) -> None:
+    """Polling: снять webhook, если бот раньше работал в режиме webhook (иначе getUpdates — Conflict)."""
+    try:
+        await bot.delete_webhook(drop_pending_updates=False)
+    except Exception as e:
+        logger.warning("delete_webhook failed: %s", e)
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, url: str | None = None, secret: str | None = None):
+    """
+    aiohttp-приложение: POST WEBHOOK_PATH — апдейты (ответ 200 сразу, обработка в фоне),
+    GET /healthz — проверка живости для nginx/мониторинга. На старте — setWebhook на url.
+    """
+    from aiohttp import web
+    from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+    secret = secret or webhook_secret(bot.token)
+    started = datetime.utcnow()
+
+    async def set_webhook(bot: Bot) -> None:
+        target = (url or WEBHOOK_URL) + WEBHOOK_PATH
+        await bot.set_webhook(target, secret_token=secret, allowed_updates=dp.resolve_used_update_types())
+        logger.info("Webhook set: %s", target)
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response({
+            "ok": True,
+            "mode": "webhook",
+            "uptime_s": int((datetime.utcnow() - started).total_seconds()),
+            "albums_pending": _albums.pending,
+            "updates": _burst.stats(),
+            "cache": db_cache.metrics(),
+        })
+
+    dp.startup.register(set_webhook)
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret).register(app, path=WEBHOOK_PATH)
+    app.router.add_get("/healthz", healthz)
+    setup_application(app, dp, bot=bot)
+    return app
 
-    logger.info("Collect bot starting... CHANNEL_ID=%s POST_SCHEDULE=%s", CHANNEL_ID, POST_SCHEDULE_TIME)
-    dp.run_polling(bot)
+
+def main() -> None:
+    if not BOT_TOKEN:
+        raise SystemExit("Укажи BOT_TOKEN в .env или config/.env")
+
+    init_db()
+
+    bot = Bot(token=BOT_TOKEN)
+    dp = create_dispatcher(bot)
+
+    logger.info("Collect bot starting (%s)... CHANNEL_ID=%s POST_SCHEDULE=%s", BOT_MODE, CHANNEL_ID, POST_SCHEDULE_TIME)
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL.startswith("https://"):
+            raise SystemExit("BOT_MODE=webhook: укажи WEBHOOK_URL (https://домен) в .env")
+        from aiohttp import web
+        web.run_app(create_webhook_app(bot, dp), host=WEBHOOK_HOST, port=WEBHOOK_PORT, print=None)
+    else:
+        dp.startup.register(drop_webhook)
+        dp.run_polling(bot)
 
 
 if __name__ == "__main__":
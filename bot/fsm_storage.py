@@ -0,0 +1,152 @@
+"""
+FSM-хранилище aiogram в SQLite (таблица fsm_state): режимы пользователей (/addstock, /rawphoto)
+переживают рестарт и деплой и видны всем экземплярам бота.
+
+- Чтение — через кэш в процессе (LRU, не дольше FSM_CACHE_TTL секунд), в т.ч. «состояния нет»:
+  FSM-middleware читает состояние на каждом апдейте, и без кэша это поход в БД на каждое сообщение
+- Кэш сверяется на каждом чтении со счётчиком cache_versions['fsm_state'] (триггеры, миграция 017):
+  одно чтение по первичному ключу. Любая запись в fsm_state с любого экземпляра меняет счётчик,
+  и все кэши перечитывают состояние — /addstock с одного экземпляра виден другому сразу, без задержки
+- Запись — сразу в БД (поток-писатель db.aio) и в кэш с версией, прочитанной в той же транзакции
+- Состояние живёт FSM_STATE_TTL_HOURS с последней записи, потом считается пустым (забытый /addstock)
+
+    dp = Dispatcher(storage=SQLiteStorage())
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from db import connect
+from db.aio import run_read, run_write
+
+_VERSION_SQL = "SELECT version FROM cache_versions WHERE name = 'fsm_state'"
+
+CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "10"))
+CACHE_SIZE = 10000
+STATE_TTL = timedelta(hours=float(os.getenv("FSM_STATE_TTL_HOURS", "24")))
+PRUNE_INTERVAL = 3600
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(
+        str(part) if part is not None else ""
+        for part in (key.bot_id, key.chat_id, key.user_id, key.thread_id,
+                     getattr(key, "business_connection_id", None), key.destiny)
+    )
+
+
+def _load(key: str) -> tuple[str | None, dict, str] | None:
+    with connect(readonly=True) as conn:
+        row = conn.execute("SELECT state, data, expires_at FROM fsm_state WHERE key = ?", (key,)).fetchone()
+    if not row:
+        return None
+    return row["state"], json.loads(row["data"]), row["expires_at"]
+
+
+def _version() -> int | None:
+    """Версия fsm_state; None — БД до миграции 017 (кэш не используется)."""
+    try:
+        with connect(readonly=True) as conn:
+            row = conn.execute(_VERSION_SQL).fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+def _save(key: str, state: str | None, data: dict) -> tuple[str, int | None]:
+    """Пишет строку (или удаляет, если пусто). Возвращает (expires_at, версия fsm_state после записи)."""
+    now = datetime.utcnow()
+    expires_at = (now + STATE_TTL).isoformat()
+    with connect() as conn:
+        if state is None and not data:
+            conn.execute("DELETE FROM fsm_state WHERE key = ?", (key,))
+        else:
+            conn.execute(
+                """
+                INSERT INTO fsm_state (key, state, data, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data,
+                    expires_at = excluded.expires_at, updated_at = excluded.updated_at
+                """,
+                (key, state, json.dumps(data, ensure_ascii=False, default=str), expires_at, now.isoformat()),
+            )
+        # В той же транзакции: чужая запись позже нашей даст другую версию
+        row = conn.execute(_VERSION_SQL).fetchone()
+    return expires_at, row[0] if row else None
+
+
+def prune() -> int:
+    """Удаляет истёкшие состояния. Возвращает число удалённых."""
+    with connect() as conn:
+        cur = conn.execute("DELETE FROM fsm_state WHERE expires_at < ?", (datetime.utcnow().isoformat(),))
+    return cur.rowcount
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, cache_ttl: float = CACHE_TTL):
+        self.cache_ttl = cache_ttl
+        # key -> (state, data, expires_at, версия fsm_state, закэшировано в monotonic)
+        self._cache: OrderedDict[str, tuple[str | None, dict, str, int, float]] = OrderedDict()
+        self._last_prune = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    async def _get(self, key: StorageKey) -> tuple[str | None, dict]:
+        k = _key(key)
+        # Синхронно, без потока db.aio: чтение по первичному ключу в WAL — десятки мкс
+        version = _version() if self.cache_ttl > 0 else None
+        cached = self._cache.get(k)
+        if (cached is not None and version is not None and cached[3] == version
+                and time.monotonic() - cached[4] < self.cache_ttl):
+            self.hits += 1
+            self._cache.move_to_end(k)
+            state, data, expires_at = cached[:3]
+        else:
+            self.misses += 1
+            # Версия прочитана до строки: запись между ними даст промах в следующий раз, а не устаревший кэш
+            row = await run_read(_load, k)
+            state, data, expires_at = row or (None, {}, "")
+            self._remember(k, state, data, expires_at, version)
+        if expires_at and expires_at < datetime.utcnow().isoformat():
+            return None, {}
+        return state, data
+
+    def _remember(self, k: str, state: str | None, data: dict, expires_at: str, version: int | None) -> None:
+        if self.cache_ttl <= 0 or version is None:
+            return
+        self._cache[k] = (state, data, expires_at, version, time.monotonic())
+        self._cache.move_to_end(k)
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    async def _put(self, key: StorageKey, state: str | None, data: dict) -> None:
+        k = _key(key)
+        expires_at, version = await run_write(_save, k, state, data)
+        self._remember(k, state, data, expires_at, version)
+        if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            await run_write(prune)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _, data = await self._get(key)
+        await self._put(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._get(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        state, _ = await self._get(key)
+        await self._put(key, state, dict(data))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._get(key))[1])
+
+    async def close(self) -> None:
+        self._cache.clear()
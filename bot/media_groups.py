@@ -0,0 +1,87 @@
+"""
+Альбомы на входе: Telegram присылает альбом из N фото/видео N отдельными сообщениями с общим
+media_group_id. Части копятся, пока между ними не будет паузы MEDIA_GROUP_WINDOW_MS (каждая
+новая часть продлевает окно; 10-я — предел альбома — сразу), потом обработчик получает весь
+альбом разом: одна запись в БД, одна классификация, один ответ, один пост.
+
+    albums = MediaGroupCollector(on_album)
+    if message.media_group_id:
+        albums.add(message, raw_state=raw_state)   # позже: await on_album(messages, raw_state=...)
+        return
+
+Буфер в памяти процесса: альбом, недособранный к остановке, обрабатывается в flush() при shutdown.
+С key= и max_items= тот же буфер склеивает любые пачки сообщений (bot/throttling.py).
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable
+
+from aiogram.types import Message
+
+WINDOW = float(os.getenv("MEDIA_GROUP_WINDOW_MS", "800")) / 1000
+MAX_ITEMS = 10  # больше в одном альбоме Telegram не бывает
+
+logger = logging.getLogger(__name__)
+
+
+class MediaGroupCollector:
+    def __init__(self, handler: Callable[..., Awaitable[Any]], window: float = WINDOW, max_items: int = MAX_ITEMS):
+        self.handler = handler
+        self.window = window
+        self.max_items = max_items
+        # (chat_id, media_group_id) или свой key -> {"messages", "context", "timer"}
+        self._groups: dict[Any, dict] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.parts = 0
+        self.albums = 0
+
+    def add(self, message: Message, key: Any = None, **context: Any) -> None:
+        """Часть альбома в буфер. context (режим пользователя и т.п.) берётся от первой части."""
+        key = key if key is not None else (message.chat.id, message.media_group_id)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = {"messages": [], "context": context, "timer": None}
+        group["messages"].append(message)
+        self.parts += 1
+        if group["timer"] is not None:
+            group["timer"].cancel()
+        if len(group["messages"]) >= self.max_items:
+            self._fire(key)
+        else:
+            group["timer"] = asyncio.get_running_loop().call_later(self.window, self._fire, key)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._groups
+
+    def _fire(self, key: Any) -> None:
+        group = self._groups.pop(key, None)
+        if group is None:
+            return
+        if group["timer"] is not None:
+            group["timer"].cancel()
+        # Части могут прийти не по порядку (несколько апдейтов обрабатываются параллельно)
+        messages = sorted(group["messages"], key=lambda m: m.message_id)
+        task = asyncio.create_task(self._run(messages, group["context"]))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, messages: list[Message], context: dict) -> None:
+        self.albums += 1
+        try:
+            await self.handler(messages, **context)
+        except Exception:
+            logger.exception("Media group %s (%s parts) failed", messages[0].media_group_id, len(messages))
+
+    @property
+    def pending(self) -> int:
+        """Альбомов в буфере (ещё не переданных обработчику)."""
+        return len(self._groups)
+
+    async def flush(self) -> None:
+        """Отдаёт обработчику всё накопленное сейчас и дожидается обработки (остановка бота)."""
+        for key in list(self._groups):
+            self._fire(key)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
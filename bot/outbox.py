@@ -0,0 +1,369 @@
+"""
+Outbox постов в канал (таблица channel_outbox). Пост сначала записывается в очередь (вместе с
+пометкой источника — одной транзакцией), потом отправляется: строку забирают с арендой
+(lease_until), после ответа Telegram — status='sent' и published_to_channel=1 одной транзакцией.
+
+Доставка at-least-once: процесс упал между отправкой и пометкой — аренда истекает, пост уходит
+ещё раз. Ключ идемпотентности (collect:<id записей>, fallback:<id>) не даёт поставить тот же пост
+в очередь дважды (два экземпляра бота, повторный /postnow). Временная ошибка — повтор с паузой,
+после MAX_ATTEMPTS — failed, записи возвращаются в очередь следующей публикации.
+
+    ids = await run_write(enqueue_entries, posts)
+    stats = await deliver(send_row, bucket, ids=ids)   # сразу; остальное добирает run_worker
+    python -m bot.outbox stats | list [--status failed] | retry <id> | prune
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from bot import publisher
+from db import connect
+from db.aio import run_write
+
+# Аренда строки: с момента захвата до отправки (ожидание лимита + повторы); продлевается перед каждой попыткой
+LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "15"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# Пауза перед повтором: RETRY_BASE_DELAY * 2^(попытка-1) секунд
+RETRY_BASE_DELAY = float(os.getenv("OUTBOX_RETRY_BASE_DELAY", "30"))
+KEEP_DAYS = 30
+ALBUM_MAX_ITEMS = 10  # предел sendMediaGroup
+PRUNE_INTERVAL = 3600
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+def _insert(conn, key: str, source: str, source_ids: list[int], items: list[dict]) -> int | None:
+    """Новая строка или повторная постановка после failed. None — такой пост уже в очереди/отправлен."""
+    now = _now().isoformat()
+    row = conn.execute(
+        """
+        INSERT INTO channel_outbox (idempotency_key, source, source_ids, payload, status, attempts, run_after, created_at, updated_at)
+        VALUES (?, ?, ?, ?, 'queued', 0, ?, ?, ?)
+        ON CONFLICT(idempotency_key) DO UPDATE SET
+            status = 'queued', attempts = 0, payload = excluded.payload, run_after = excluded.run_after,
+            last_error = NULL, updated_at = excluded.updated_at
+        WHERE channel_outbox.status = 'failed'
+        RETURNING id
+        """,
+        (key, source, json.dumps(source_ids), json.dumps(items, ensure_ascii=False), now, now, now),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def enqueue_entries(posts: list[list[tuple]]) -> list[int]:
+    """
+    Ставит посты из collect_entries в очередь. Пост — список записей (id, file_id, comment, media_type, created_at),
+    больше одной — альбом; запись-альбом с входа (media_items) разворачивается в свои части. Записи, уже стоящие
+    в очереди или опубликованные, пропускаются. Возвращает id строк outbox.
+    """
+    ids: list[int] = []
+    with connect() as conn:
+        for post in posts:
+            entry_ids = [e[0] for e in post]
+            marks = ",".join("?" * len(entry_ids))
+            free = {
+                r[0]: r[1]
+                for r in conn.execute(
+                    f"""
+                    SELECT id, media_items FROM collect_entries
+                    WHERE id IN ({marks}) AND published_to_channel = 0 AND outbox_id IS NULL
+                    """,
+                    entry_ids,
+                )
+            }
+            post = [e for e in post if e[0] in free]
+            for chunk in _split_album(post, free):
+                entry_ids = [e[0] for e, _ in chunk]
+                items = [item for _, entry_items in chunk for item in entry_items]
+                outbox_id = _insert(conn, "collect:" + ",".join(map(str, entry_ids)), "collect", entry_ids, items)
+                if outbox_id is None:
+                    continue
+                conn.executemany("UPDATE collect_entries SET outbox_id = ? WHERE id = ?", [(outbox_id, eid) for eid in entry_ids])
+                ids.append(outbox_id)
+    return ids
+
+
+def _split_album(post: list[tuple], media_items: dict[int, str | None]) -> list[list[tuple[tuple, list[dict]]]]:
+    """
+    Записи поста → элементы sendMediaGroup. Запись-альбом (media_items) даёт все свои части;
+    если вместе с соседями выходит больше ALBUM_MAX_ITEMS — пост делится по границам записей.
+    """
+    chunks: list[list[tuple[tuple, list[dict]]]] = []
+    size = 0
+    for e in post:
+        parts = json.loads(media_items[e[0]]) if media_items.get(e[0]) else None
+        if parts:
+            items = [{"file_id": p["file_id"], "caption": p.get("caption"), "media_type": p["media_type"]} for p in parts]
+        else:
+            items = [{"file_id": e[1], "caption": e[2], "media_type": e[3]}]
+        if not chunks or size + len(items) > ALBUM_MAX_ITEMS:
+            chunks.append([])
+            size = 0
+        chunks[-1].append((e, items))
+        size += len(items)
+    return chunks
+
+
+def enqueue_fallback(fallback_id: int, file_id: str, media_type: str) -> list[int]:
+    """Заготовка в очередь; used_at ставится в той же транзакции. [] — заготовку уже забрал другой экземпляр."""
+    with connect() as conn:
+        cur = conn.execute(
+            "UPDATE fallback_photos SET used_at = ? WHERE id = ? AND used_at IS NULL", (_now().isoformat(), fallback_id)
+        )
+        if cur.rowcount == 0:
+            return []
+        outbox_id = _insert(
+            conn, f"fallback:{fallback_id}", "fallback", [fallback_id],
+            [{"file_id": file_id, "caption": None, "media_type": media_type}],
+        )
+    return [outbox_id] if outbox_id is not None else []
+
+
+def claim(ids: list[int] | None = None) -> dict | None:
+    """Забирает одну готовую строку (или брошенную с истёкшей арендой) — атомарно между процессами."""
+    now = _now()
+    only = f"AND id IN ({','.join('?' * len(ids))})" if ids else ""
+    with connect() as conn:
+        row = conn.execute(
+            f"""
+            UPDATE channel_outbox SET status = 'sending', attempts = attempts + 1,
+                lease_until = ?, locked_by = ?, updated_at = ?
+            WHERE id = (
+                SELECT id FROM channel_outbox
+                WHERE ((status = 'queued' AND run_after <= ?) OR (status = 'sending' AND lease_until < ?)) {only}
+                ORDER BY id LIMIT 1
+            )
+            RETURNING id, source, source_ids, payload, attempts
+            """,
+            ((now + timedelta(seconds=LEASE_SECONDS)).isoformat(), _worker_id(), now.isoformat(),
+             now.isoformat(), now.isoformat(), *(ids or ())),
+        ).fetchone()
+    if not row:
+        return None
+    return {**dict(row), "source_ids": json.loads(row["source_ids"]), "items": json.loads(row["payload"])}
+
+
+def renew(row: dict) -> bool:
+    """Продлевает аренду перед отправкой. False — аренду забрал другой воркер, слать нельзя."""
+    now = _now()
+    with connect() as conn:
+        cur = conn.execute(
+            """
+            UPDATE channel_outbox SET lease_until = ?, updated_at = ?
+            WHERE id = ? AND status = 'sending' AND attempts = ? AND locked_by = ?
+            """,
+            ((now + timedelta(seconds=LEASE_SECONDS)).isoformat(), now.isoformat(), row["id"], row["attempts"], _worker_id()),
+        )
+    return cur.rowcount > 0
+
+
+def complete(row: dict) -> None:
+    """Пост ушёл: sent + пометка источника. Без проверки аренды — факт отправки важнее, чем кто её сделал."""
+    now = _now().isoformat()
+    with connect() as conn:
+        conn.execute(
+            """
+            UPDATE channel_outbox SET status = 'sent', sent_at = ?, lease_until = NULL, locked_by = NULL,
+                last_error = NULL, updated_at = ?
+            WHERE id = ?
+            """,
+            (now, now, row["id"]),
+        )
+        if row["source"] == "collect":
+            conn.execute("UPDATE collect_entries SET published_to_channel = 1 WHERE outbox_id = ?", (row["id"],))
+
+
+def _release_sources(conn, outbox_id: int, source: str, source_ids: list[int]) -> None:
+    """failed: записи снова доступны следующей публикации, заготовка — снова неиспользованная."""
+    if source == "collect":
+        conn.execute("UPDATE collect_entries SET outbox_id = NULL WHERE outbox_id = ?", (outbox_id,))
+    elif source == "fallback":
+        conn.executemany("UPDATE fallback_photos SET used_at = NULL WHERE id = ?", [(i,) for i in source_ids])
+
+
+def fail(row: dict, error: str) -> None:
+    """Неудачная попытка: повтор с паузой или failed после MAX_ATTEMPTS (только если строка всё ещё наша)."""
+    now = _now()
+    final = row["attempts"] >= MAX_ATTEMPTS
+    delay = RETRY_BASE_DELAY * 2 ** (row["attempts"] - 1)
+    with connect() as conn:
+        cur = conn.execute(
+            """
+            UPDATE channel_outbox SET status = ?, run_after = ?, last_error = ?, lease_until = NULL, locked_by = NULL,
+                updated_at = ?
+            WHERE id = ? AND status = 'sending' AND attempts = ? AND locked_by = ?
+            """,
+            ("failed" if final else "queued", (now + timedelta(seconds=delay)).isoformat(), error[:500], now.isoformat(),
+             row["id"], row["attempts"], _worker_id()),
+        )
+        if cur.rowcount and final:
+            _release_sources(conn, row["id"], row["source"], row["source_ids"])
+    if cur.rowcount:
+        logger.warning("Outbox %s attempt %s failed: %s%s", row["id"], row["attempts"], error,
+                       " — giving up" if final else f" — retry in {delay:.0f}s")
+
+
+class LeaseLost(Exception):
+    """Аренду строки перехватил другой воркер (наша истекла) — не отправляем."""
+
+
+async def deliver(
+    send: Callable[[dict], Awaitable[object]],
+    bucket: publisher.TokenBucket | None = None,
+    ids: list[int] | None = None,
+    concurrency: int = publisher.CHANNEL_POST_CONCURRENCY,
+) -> dict:
+    """
+    Отправляет готовые строки (или только ids) через send(row): row["items"] — [{file_id, caption, media_type}].
+    Возвращает статистику publisher.publish; sent_ids — отправленные строки.
+    """
+    sent_ids: list[int] = []
+
+    async def next_row() -> dict | None:
+        return await run_write(claim, ids)
+
+    async def send_row(row: dict) -> None:
+        if not await run_write(renew, row):
+            raise LeaseLost(f"outbox {row['id']}: lease lost")
+        await send(row)
+        await run_write(complete, row)
+        sent_ids.append(row["id"])
+
+    stats = await publisher.publish(next_row, send_row, bucket=bucket, concurrency=concurrency, cost=lambda r: len(r["items"]))
+    for row, error in zip(stats["failed"], stats["errors"]):
+        await run_write(fail, row, error)
+    stats["sent_ids"] = sent_ids
+    return stats
+
+
+async def run_worker(send: Callable[[dict], Awaitable[object]], bucket: publisher.TokenBucket | None = None) -> None:
+    """Фоновая доставка: повторы по run_after и строки, брошенные упавшим процессом (asyncio-задача бота)."""
+    last_prune = 0.0
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            if loop.time() - last_prune > PRUNE_INTERVAL:
+                await run_write(prune)
+                last_prune = loop.time()
+            stats = await deliver(send, bucket)
+            if stats["total"]:
+                logger.info("Outbox: %s/%s delivered in %.1fs", stats["sent"], stats["total"], stats["elapsed_s"])
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Outbox worker: %s", e)
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def prune() -> int:
+    """Удаляет sent старше KEEP_DAYS. Возвращает число удалённых."""
+    cutoff = (_now() - timedelta(days=KEEP_DAYS)).isoformat()
+    with connect() as conn:
+        conn.execute(
+            """
+            UPDATE collect_entries SET outbox_id = NULL
+            WHERE outbox_id IN (SELECT id FROM channel_outbox WHERE status = 'sent' AND updated_at < ?)
+            """,
+            (cutoff,),
+        )
+        cur = conn.execute("DELETE FROM channel_outbox WHERE status = 'sent' AND updated_at < ?", (cutoff,))
+    return cur.rowcount
+
+
+def stats() -> dict:
+    """Сводка очереди: число строк по статусам, возраст самой старой неотправленной, повторы."""
+    with connect(readonly=True) as conn:
+        by_status = dict(conn.execute("SELECT status, COUNT(*) FROM channel_outbox GROUP BY status").fetchall())
+        oldest = conn.execute(
+            "SELECT MIN(created_at) FROM channel_outbox WHERE status IN ('queued', 'sending')"
+        ).fetchone()[0]
+        retried = conn.execute(
+            "SELECT COUNT(*) FROM channel_outbox WHERE status != 'sent' AND attempts > 0"
+        ).fetchone()[0]
+    age = (_now() - datetime.fromisoformat(oldest)).total_seconds() if oldest else 0
+    return {"by_status": by_status, "oldest_pending_age_s": round(age), "pending_with_attempts": retried}
+
+
+def list_rows(status: str | None = None, limit: int = 20) -> list[dict]:
+    with connect(readonly=True) as conn:
+        rows = conn.execute(
+            f"""
+            SELECT id, idempotency_key, status, attempts, run_after, lease_until, locked_by, last_error, created_at, sent_at
+            FROM channel_outbox {"WHERE status = ?" if status else ""}
+            ORDER BY id DESC LIMIT ?
+            """,
+            (status, limit) if status else (limit,),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def retry(outbox_id: int) -> bool:
+    """failed → queued сейчас (записи снова привязываются, если их не забрал другой пост)."""
+    now = _now().isoformat()
+    with connect() as conn:
+        row = conn.execute(
+            """
+            UPDATE channel_outbox SET status = 'queued', attempts = 0, run_after = ?, last_error = NULL, updated_at = ?
+            WHERE id = ? AND status = 'failed'
+            RETURNING source, source_ids
+            """,
+            (now, now, outbox_id),
+        ).fetchone()
+        if not row:
+            return False
+        source_ids = json.loads(row["source_ids"])
+        if row["source"] == "collect":
+            conn.executemany(
+                "UPDATE collect_entries SET outbox_id = ? WHERE id = ? AND outbox_id IS NULL AND published_to_channel = 0",
+                [(outbox_id, i) for i in source_ids],
+            )
+        elif row["source"] == "fallback":
+            conn.executemany("UPDATE fallback_photos SET used_at = ? WHERE id = ?", [(now, i) for i in source_ids])
+    return True
+
+
+def main() -> None:
+    """Осмотр очереди: python -m bot.outbox stats | list [--status S] [--limit N] | retry ID | prune"""
+    ap = argparse.ArgumentParser(description="channel outbox")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats")
+    ls = sub.add_parser("list")
+    ls.add_argument("--status", choices=("queued", "sending", "sent", "failed"))
+    ls.add_argument("--limit", type=int, default=20)
+    rt = sub.add_parser("retry")
+    rt.add_argument("id", type=int)
+    sub.add_parser("prune")
+    args = ap.parse_args()
+    import bot.collect_bot  # noqa: F401 — .env (DB_PATH), как у бота
+
+    if args.cmd == "stats":
+        print(json.dumps(stats(), ensure_ascii=False, indent=2))
+    elif args.cmd == "list":
+        for r in list_rows(args.status, args.limit):
+            error = f"  error: {r['last_error']}" if r["last_error"] else ""
+            print(f"#{r['id']:<6} {r['status']:<8} attempts {r['attempts']}  {r['idempotency_key']:<24} "
+                  f"created {r['created_at'][:19]}  run_after {r['run_after'][:19]}{error}")
+    elif args.cmd == "retry":
+        print("queued" if retry(args.id) else "not found or not failed")
+    elif args.cmd == "prune":
+        print(f"deleted {prune()}")
+
+
+if __name__ == "__main__":
+    main()
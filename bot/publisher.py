@@ -0,0 +1,167 @@
+"""
+Публикация пачки постов в канал: несколько отправок параллельно, темп — token bucket
+(Telegram: ~20 сообщений в минуту в один канал/группу), TelegramRetryAfter ставит
+на паузу весь bucket, сетевые ошибки и 5xx — повтор с backoff и jitter.
+
+    bucket = TokenBucket(rate_per_min=20, burst=5)
+    stats = await publish(entries, send_one, bucket=bucket, concurrency=3)
+    # stats: sent, failed (список элементов), errors (текст ошибки на каждый failed), retries,
+    #        retry_after_s, elapsed_s, p50_ms, p95_ms, max_ms
+
+Вместо списка можно передать корутину-источник next_item() (None — больше нет): так outbox
+забирает строку из очереди только когда есть свободный слот отправки.
+
+Порядок: слоты bucket выдаются по очереди записей, но при concurrency > 1 соседние посты
+могут прийти в канал в обратном порядке (один ответ задержался) — для строгого порядка concurrency=1.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, Sequence, TypeVar
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+CHANNEL_POST_RATE = float(os.getenv("CHANNEL_POST_RATE", "20"))  # постов в минуту
+CHANNEL_POST_BURST = int(os.getenv("CHANNEL_POST_BURST", "5"))
+CHANNEL_POST_CONCURRENCY = int(os.getenv("CHANNEL_POST_CONCURRENCY", "3"))
+MAX_ATTEMPTS = 4
+# Сколько раз подряд готовы ждать retry_after на одном посте (не считается попыткой)
+MAX_RETRY_AFTER_WAITS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """Асинхронный token bucket: rate_per_min токенов в минуту, не больше burst про запас."""
+
+    def __init__(self, rate_per_min: float = CHANNEL_POST_RATE, burst: int = CHANNEL_POST_BURST):
+        self.rate = rate_per_min / 60
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # asyncio.Lock — FIFO: токены выдаются в порядке вызова acquire
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, n: int = 1) -> float:
+        """Ждёт n токенов (альбом из n сообщений). Больше burst — уходим в долг, следующие ждут дольше.
+        Возвращает время ожидания, секунды."""
+        need = min(n, self.burst)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= need:
+                        self._tokens -= n
+                        return waited
+                    delay = (need - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Flood control: никаких отправок seconds секунд, запас токенов сгорает."""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+
+def _backoff(attempt: int) -> float:
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+async def publish(
+    items: Sequence[T] | Callable[[], Awaitable[T | None]],
+    send: Callable[[T], Awaitable[object]],
+    bucket: TokenBucket | None = None,
+    concurrency: int = CHANNEL_POST_CONCURRENCY,
+    max_attempts: int = MAX_ATTEMPTS,
+    cost: Callable[[T], int] | None = None,
+) -> dict:
+    """
+    Отправляет items через send(item) не более concurrency одновременно, в темпе bucket.
+    cost(item) — сколько сообщений канала занимает элемент (альбом — по числу медиа), по умолчанию 1.
+    Ошибка send, отличная от RetryAfter/сети/5xx (неверный file_id, бот не админ), — сразу failed.
+    """
+    bucket = bucket or TokenBucket()
+    if callable(items):
+        next_item = items
+        workers = concurrency
+    else:
+        pending = list(reversed(items))
+        workers = min(concurrency, len(pending))
+
+        async def next_item() -> T | None:
+            return pending.pop() if pending else None
+
+    latencies: list[float] = []
+    failed: list[T] = []
+    errors: list[str] = []
+    stats = {"total": 0, "sent": 0, "retries": 0, "retry_after": 0, "retry_after_s": 0.0, "rate_wait_s": 0.0}
+
+    async def send_with_retry(item: T) -> str | None:
+        """None — отправлено, иначе текст ошибки."""
+        attempt = 0
+        waits = 0
+        while True:
+            stats["rate_wait_s"] += await bucket.acquire(cost(item) if cost else 1)
+            t0 = time.perf_counter()
+            try:
+                await send(item)
+                latencies.append(time.perf_counter() - t0)
+                return None
+            except TelegramRetryAfter as e:
+                waits += 1
+                stats["retry_after"] += 1
+                stats["retry_after_s"] += e.retry_after
+                logger.warning("Channel post: flood control, retry after %ss", e.retry_after)
+                bucket.pause(e.retry_after)
+                if waits > MAX_RETRY_AFTER_WAITS:
+                    return f"flood control: retry after {e.retry_after}s"
+            except (TelegramNetworkError, TelegramServerError) as e:
+                attempt += 1
+                if attempt >= max_attempts:
+                    logger.warning("Channel post failed after %s attempts: %s", attempt, e)
+                    return f"{type(e).__name__}: {e}"
+                stats["retries"] += 1
+                await asyncio.sleep(_backoff(attempt))
+            except Exception as e:
+                logger.warning("Channel post failed: %s", e)
+                return f"{type(e).__name__}: {e}"
+
+    async def worker() -> None:
+        while True:
+            item = await next_item()
+            if item is None:
+                return
+            stats["total"] += 1
+            error = await send_with_retry(item)
+            if error is None:
+                stats["sent"] += 1
+            else:
+                failed.append(item)
+                errors.append(error)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    stats["rate_wait_s"] = round(stats["rate_wait_s"], 3)
+    latencies.sort()
+    pick = lambda q: round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 1) if latencies else 0.0
+    stats.update(p50_ms=pick(0.5), p95_ms=pick(0.95), max_ms=pick(1.0), failed=failed, errors=errors)
+    return stats
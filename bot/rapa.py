@@ -11,6 +11,10 @@ import sqlite3
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from bot import related
+from db import connect, get_db_path
+from db.cache import cached
+
 logger = logging.getLogger(__name__)
 
 # Супергерои = роли/области
@@ -37,34 +41,34 @@ AREA_KEYWORDS = {
     "ceo": ["проект", "задача", "дедлайн", "спринт", "роудмап", "результат"],
 }
 
+# Слова-действия: есть в тексте → gtd_type = task
+ACTIONABLE_WORDS = ["надо", "нужно", "сделать", "проверить", "позвонить", "написать", "отправить", "купить"]
+
 GTD_TYPES = ["task", "idea", "reference", "someday", "trash"]
 
+# Классификатор: ключевые слова берутся из таблицы rapa_keywords (по умолчанию — AREA_KEYWORDS),
+# скомпилированный регэксп пересобирается при смене её версии (db/cache.py)
+_ENDINGS = ("ами", "ями", "ого", "его", "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ов", "ев", "ья", "ье", "ия", "ие",
+            "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й")
+_TASK = "@task"
 
-def get_db_path() -> str:
-    import os
-    BASE = Path(__file__).resolve().parent.parent
-    return os.getenv("DB_PATH", str(BASE / "db" / "collect.db"))
+# Поиск: сколько самых свежих совпадений ранжировать по bm25
+SEARCH_RANK_WINDOW = 2000
 
 
 def init_rapa_schema(conn: sqlite3.Connection) -> None:
-    """Применяет RAPA-схему и миграции raw."""
+    """Применяет RAPA-схему и миграции raw. Вызывается из db.migrations один раз, не на горячем пути."""
+    from db.migrations import add_column, run_script
+
     schema = (Path(__file__).resolve().parent.parent / "db" / "rapa_schema.sql").read_text(encoding="utf-8")
-    conn.executescript(schema)
+    run_script(conn, schema)
 
     # Миграции rapa_areas
     for col, typ in [("type", "TEXT"), ("goal", "TEXT")]:
-        try:
-            conn.execute(f"ALTER TABLE rapa_areas ADD COLUMN {col} {typ}")
-            logger.info("Added rapa_areas.%s", col)
-        except sqlite3.OperationalError:
-            pass
+        add_column(conn, "rapa_areas", col, typ)
     # Миграции rapa_projects
     for col, typ in [("horizon", "TEXT"), ("impact", "TEXT"), ("effort", "TEXT"), ("start_date", "TEXT"), ("next_review", "TEXT"), ("daily_focus_count", "INTEGER DEFAULT 0")]:
-        try:
-            conn.execute(f"ALTER TABLE rapa_projects ADD COLUMN {col} {typ}")
-            logger.info("Added rapa_projects.%s", col)
-        except sqlite3.OperationalError:
-            pass
+        add_column(conn, "rapa_projects", col, typ)
     # Миграции raw: para_type, project_id, area_id, next_action
     for col, typ in [
         ("para_type", "TEXT DEFAULT 'Raw'"),
@@ -73,56 +77,135 @@ def init_rapa_schema(conn: sqlite3.Connection) -> None:
         ("next_action", "TEXT"),
         ("assign_proposed_at", "TEXT"),
     ]:
-        try:
-            conn.execute(f"ALTER TABLE raw ADD COLUMN {col} {typ}")
-            logger.info("Added raw.%s", col)
-        except sqlite3.OperationalError:
-            pass
+        add_column(conn, "raw", col, typ)
 
     ensure_default_areas(conn)
 
 
-def classify_raw(content: str) -> dict:
-    """Правило-базовая классификация. Возвращает: gtd_type, area_slug, para_type."""
-    text = (content or "").lower().strip()
-    result = {"gtd_type": "idea", "area_slug": None, "para_type": "Raw"}
+def _stem(word: str) -> str:
+    """Грубая основа: срезает одно окончание, если остаётся ≥ 4 букв («тренировка» → «тренировк»)."""
+    word = word.lower().replace("ё", "е").strip()
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 4:
+            return word[: -len(ending)]
+    return word
+
+
+def _trie_regex(stems: list[str]) -> str:
+    """Альтернатива из префиксного дерева: regex-движок идёт по общим префиксам, а не по каждому слову."""
+    trie: dict = {}
+    for stem in stems:
+        node = trie
+        for ch in stem:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def walk(node: dict) -> str:
+        end = "" in node
+        alts = [re.escape(ch) + walk(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if end else body
+
+    return walk(trie)
+
+
+class Classifier:
+    """
+    Ключевые слова всех областей (и слова-действия) в одном регэкспе: начало слова + основа + \w*.
+    Один проход по тексту, каждое совпадение добавляет вес своей области; побеждает наибольший счёт.
+    """
+
+    def __init__(self, keywords: dict[str, list[tuple[str, float]]]):
+        self.index: dict[str, list[tuple[str, float]]] = {}  # основа -> [(slug, вес)]
+        self.order = list(keywords)  # при равном счёте — порядок областей, как раньше
+        for slug, items in keywords.items():
+            for kw, weight in items:
+                self.index.setdefault(_stem(kw), []).append((slug, weight))
+        for word in ACTIONABLE_WORDS:
+            self.index.setdefault(_stem(word), []).append((_TASK, 1.0))
+        self.pattern = re.compile(r"(?<!\w)(" + _trie_regex(list(self.index)) + r")\w*")
+
+    def scores(self, text: str) -> dict[str, float]:
+        scores: dict[str, float] = {}
+        for m in self.pattern.finditer(text):
+            for slug, weight in self.index[m.group(1)]:
+                scores[slug] = scores.get(slug, 0.0) + weight
+        return scores
+
+    def classify(self, content: str) -> dict:
+        text = (content or "").lower().replace("ё", "е").strip()
+        scores = self.scores(text)
+        actionable = scores.pop(_TASK, 0) > 0
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self.order.index(kv[0]) if kv[0] in self.order else 0))
+        total = sum(scores.values())
+        result = {
+            "gtd_type": "task" if actionable else "idea",
+            "area_slug": ranked[0][0] if ranked else None,
+            "para_type": "Raw",
+            "confidence": round(ranked[0][1] / total, 2) if ranked else 0.0,
+            "alternatives": [{"area_slug": slug, "score": score} for slug, score in ranked[1:]],
+        }
+        # para_type: если task + контекст проекта → Project, иначе Area/Resource
+        if actionable and result["area_slug"]:
+            result["para_type"] = "Project"
+        elif "ссылка" in text or "http" in text:
+            result["para_type"] = "Resource"
+        return result
+
+
+def load_keywords(path: str | None = None) -> dict[str, list[tuple[str, float]]]:
+    """Ключевые слова из rapa_keywords; таблицы нет (БД до миграции) или она пуста — AREA_KEYWORDS."""
+    try:
+        with connect(path or get_db_path(), readonly=True) as conn:
+            rows = conn.execute("SELECT area_slug, keyword, weight FROM rapa_keywords ORDER BY id").fetchall()
+    except sqlite3.Error:
+        rows = []
+    keywords: dict[str, list[tuple[str, float]]] = {}
+    for slug, kw, weight in rows:
+        keywords.setdefault(slug, []).append((kw, weight if weight is not None else 1.0))
+    return keywords or {slug: [(kw, 1.0) for kw in kws] for slug, kws in AREA_KEYWORDS.items()}
+
 
-    # Actionable?
-    actionable = any(w in text for w in ["надо", "нужно", "сделать", "проверить", "позвонить", "написать", "отправить", "купить"])
-    if actionable:
-        result["gtd_type"] = "task"
+@cached("rapa_keywords")
+def get_classifier(path: str | None = None) -> Classifier:
+    """Скомпилированный классификатор БД; пересобирается после любой правки rapa_keywords."""
+    return Classifier(load_keywords(path))
 
-    # Area по ключевым словам
-    for slug, keywords in AREA_KEYWORDS.items():
-        if any(kw in text for kw in keywords):
-            result["area_slug"] = slug
-            break
 
-    # para_type: если task + контекст проекта → Project, иначе Area/Resource
-    if result["gtd_type"] == "task" and result["area_slug"]:
-        result["para_type"] = "Project"
-    elif result["gtd_type"] == "reference" or ("ссылка" in text or "http" in text):
-        result["para_type"] = "Resource"
-    elif result["gtd_type"] == "idea" and not result["area_slug"]:
-        result["para_type"] = "Raw"
+def reload_classifier() -> None:
+    """Сбросить скомпилированный классификатор сразу (не дожидаясь проверки версий)."""
+    get_classifier.cache_clear()
 
-    return result
+
+def ensure_default_keywords(conn: sqlite3.Connection) -> None:
+    """Заполняет rapa_keywords словами из AREA_KEYWORDS (вес 1), не трогая уже заданные."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO rapa_keywords (area_slug, keyword, weight) VALUES (?, ?, 1.0)",
+        [(slug, kw) for slug, kws in AREA_KEYWORDS.items() for kw in kws],
+    )
+
+
+def classify_raw(content: str) -> dict:
+    """
+    Правило-базовая классификация. Возвращает: gtd_type, area_slug, para_type,
+    confidence (доля счёта лучшей области) и alternatives — остальные области по убыванию счёта.
+    """
+    return get_classifier().classify(content)
 
 
 def assign_raw(raw_id: int, user_id: int, para_type: str, project_id: int | None, area_id: int | None) -> bool:
     """Обновляет Raw: Assign — кладёт в Project/Area/Resource."""
-    conn = sqlite3.connect(get_db_path())
-    try:
-        conn.execute(
+    with connect(get_db_path()) as conn:
+        cur = conn.execute(
             """
             UPDATE raw SET rapa_stage = 'Assign', para_type = ?, project_id = ?, area_id = ?, assign_proposed_at = ?
             WHERE id = ? AND user_id = ?
             """,
             (para_type, project_id, area_id, datetime.utcnow().isoformat(), raw_id, user_id),
         )
-        return conn.total_changes > 0
-    finally:
-        conn.close()
+    return cur.rowcount > 0
 
 
 def get_area_id_by_slug(conn: sqlite3.Connection, user_id: int, slug: str) -> int | None:
@@ -130,6 +213,21 @@ def get_area_id_by_slug(conn: sqlite3.Connection, user_id: int, slug: str) -> in
     return row[0] if row else None
 
 
+@cached("rapa_areas")
+def get_area_ids(path: str | None = None) -> dict[tuple[int, str], int]:
+    """{(user_id, slug): id} всех областей — справочник для area_id_for."""
+    with connect(path, readonly=True) as conn:
+        return {(r["user_id"], r["slug"]): r["id"] for r in conn.execute("SELECT id, user_id, slug FROM rapa_areas")}
+
+
+def area_id_for(user_id: int, slug: str | None, path: str | None = None) -> int | None:
+    """Как get_area_id_by_slug (своя область пользователя важнее общей), но из кэша — без запроса на сообщение."""
+    if not slug:
+        return None
+    ids = get_area_ids(path=path)
+    return ids.get((user_id, slug), ids.get((0, slug)))
+
+
 def ensure_default_areas(conn: sqlite3.Connection) -> None:
     """Создаёт дефолтные области (user_id=0), если их нет."""
     for name, slug, area_type, goal in SUPERHERO_AREAS:
@@ -140,20 +238,29 @@ def ensure_default_areas(conn: sqlite3.Connection) -> None:
 
 
 def propose_assign(raw_id: int, user_id: int, content: str) -> dict:
-    """Предлагает Assign для Raw. Возвращает {gtd_type, area_slug, para_type}."""
+    """Предлагает Assign для Raw. Возвращает {gtd_type, area_slug, para_type, project}.
+
+    project — ближайший по тексту активный проект ({project_id, name, score}) или None; запись
+    попутно добавляется в индекс похожих (bot/related.py).
+    """
     cls = classify_raw(content)
-    db = get_db_path()
-    with sqlite3.connect(db) as conn:
-        init_rapa_schema(conn)
-        area_id = None
-        if cls.get("area_slug"):
-            area_id = get_area_id_by_slug(conn, user_id, cls["area_slug"])
+    area_id = area_id_for(user_id, cls.get("area_slug"))
+    path = get_db_path()
+    try:
+        cls["project"] = related.suggest_project(related.index_raw(raw_id, user_id, content, path), user_id, path)
+    except Exception as e:
+        # Индекс — подсказка: его сбой не должен мешать сохранению Assign
+        logger.warning("related index for raw %s: %s", raw_id, e)
+        cls["project"] = None
+    with connect(path) as conn:
         conn.execute(
             """
-            UPDATE raw SET gtd_type = ?, rapa_stage = 'Assign', para_type = ?, area_id = ?, assign_proposed_at = ?
+            UPDATE raw SET gtd_type = ?, rapa_stage = 'Assign', para_type = ?, area_id = ?, assign_proposed_at = ?,
+                suggested_project_id = ?
             WHERE id = ? AND user_id = ?
             """,
-            (cls["gtd_type"], cls["para_type"], area_id, datetime.utcnow().isoformat(), raw_id, user_id),
+            (cls["gtd_type"], cls["para_type"], area_id, datetime.utcnow().isoformat(),
+             cls["project"] and cls["project"]["project_id"], raw_id, user_id),
         )
     return cls
 
@@ -161,22 +268,132 @@ def propose_assign(raw_id: int, user_id: int, content: str) -> dict:
 def get_raw_for_review(user_id: int, days: int = 1) -> list[dict]:
     """Raw за последние N дней."""
     since = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    with sqlite3.connect(get_db_path()) as conn:
-        conn.row_factory = sqlite3.Row
+    with connect(get_db_path(), readonly=True) as conn:
         rows = conn.execute(
             """
-            SELECT id, title, content, source, created_at, rapa_stage, gtd_type, para_type, tags
-            FROM raw WHERE user_id = ? AND created_at >= ? ORDER BY created_at DESC
+            SELECT r.id, r.title, r.content, r.source, r.created_at, r.rapa_stage, r.gtd_type, r.para_type, r.tags,
+                r.ai_summary, p.name AS suggested_project
+            FROM raw r LEFT JOIN rapa_projects p ON p.id = r.suggested_project_id
+            WHERE r.user_id = ? AND r.created_at >= ? ORDER BY r.created_at DESC
             """,
             (user_id, since),
         ).fetchall()
     return [dict(r) for r in rows]
 
 
-def get_all_projects(user_id: int) -> list[dict]:
+def _query_terms(query: str, max_terms: int = 8) -> list[str]:
+    return re.findall(r"\w+", (query or "").lower().replace("ё", "е"))[:max_terms]
+
+
+def build_fts_query(query: str, max_terms: int = 8) -> str:
+    """Пользовательский запрос → безопасный FTS5 MATCH: каждое слово в кавычках, с префиксом, через AND."""
+    terms = _query_terms(query, max_terms)
+    return " ".join(f'"{t}"*' if len(t) >= 2 else f'"{t}"' for t in terms)
+
+
+def _terms_regex(terms: list[str]) -> re.Pattern:
+    """Регэксп для подсветки: начало слова, префиксное совпадение, е = ё."""
+    alts = sorted((re.escape(t).replace("е", "[её]") for t in terms), key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(alts) + r")\w*", re.IGNORECASE)
+
+
+def highlight_text(text: str | None, pattern: re.Pattern, mark: tuple[str, str]) -> str | None:
+    if not text:
+        return text
+    return pattern.sub(lambda m: f"{mark[0]}{m.group(0)}{mark[1]}", text)
+
+
+def snippet_text(text: str | None, pattern: re.Pattern, mark: tuple[str, str], words: int = 24) -> str:
+    """Окно ~words слов вокруг первого совпадения, с подсветкой."""
+    if not text:
+        return ""
+    m = pattern.search(text)
+    pos = m.start() if m else 0
+    before = text[:pos].split()
+    after = text[pos:].split()
+    lead = before[-(words // 3):] if before else []
+    chunk = " ".join(lead + after[: words - len(lead)])
+    prefix = "…" if len(before) > len(lead) else ""
+    suffix = "…" if len(after) > words - len(lead) else ""
+    return prefix + highlight_text(chunk, pattern, mark) + suffix
+
+
+def search_raw(
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    mark: tuple[str, str] = ("<mark>", "</mark>"),
+) -> dict:
+    """Полнотекстовый поиск по Raw (raw_fts). Возвращает {items, has_more}; items — с подсветкой.
+    bm25 считается только по SEARCH_RANK_WINDOW самым свежим совпадениям пользователя: частые слова
+    на 100k+ длинных транскриптов иначе ранжируют весь индекс. За окном выдача продолжается более
+    старыми совпадениями по убыванию id (keyset по rowid), так что ничего не теряется. Подсветка — в Python
+    и только для строк страницы (highlight()/snippet() FTS5 заново читают doclist на каждую строку)."""
+    terms = _query_terms(query)
+    if not terms:
+        return {"items": [], "has_more": False}
+    match = build_fts_query(query)
+    # Пользователь — внутри окна: иначе свежие чужие совпадения заполняют окно целиком
+    user_matches = """
+        SELECT raw_fts.rowid AS rowid, bm25(raw_fts, 4.0, 1.0, 2.0, 1.5) AS score
+        FROM raw_fts JOIN raw r ON r.id = raw_fts.rowid
+        WHERE raw_fts MATCH ? AND r.user_id = ?
+    """
+    with connect(get_db_path(), readonly=True) as conn:
+        hits = conn.execute(
+            f"""
+            SELECT h.rowid AS id, h.score
+            FROM ({user_matches} ORDER BY raw_fts.rowid DESC LIMIT ?) h
+            ORDER BY h.score
+            LIMIT ? OFFSET ?
+            """,
+            (match, user_id, SEARCH_RANK_WINDOW, limit + 1, offset),
+        ).fetchall()
+        if len(hits) <= limit:
+            # Окно кончилось на этой странице: если оно было полным, дальше — совпадения старше окна
+            edge = conn.execute(
+                f"SELECT rowid FROM ({user_matches}) ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                (match, user_id, SEARCH_RANK_WINDOW - 1),
+            ).fetchone()
+            if edge:
+                hits += conn.execute(
+                    f"""
+                    SELECT rowid AS id, score FROM ({user_matches} AND raw_fts.rowid < ?)
+                    ORDER BY rowid DESC LIMIT ? OFFSET ?
+                    """,
+                    (match, user_id, edge["rowid"], limit + 1 - len(hits), max(0, offset - SEARCH_RANK_WINDOW)),
+                ).fetchall()
+        page = hits[:limit]
+        if not page:
+            return {"items": [], "has_more": False}
+        ids = [h["id"] for h in page]
+        rows = conn.execute(
+            f"""
+            SELECT id, created_at, source, rapa_stage, para_type, gtd_type, tags, title, content
+            FROM raw WHERE id IN ({",".join("?" * len(ids))})
+            """,
+            ids,
+        ).fetchall()
+    pattern = _terms_regex(terms)
+    by_id = {r["id"]: dict(r) for r in rows}
+    items = []
+    for h in page:
+        item = by_id.get(h["id"])
+        if not item:
+            continue
+        content = item.pop("content")
+        item["title"] = highlight_text(item["title"], pattern, mark)
+        item["snippet"] = snippet_text(content, pattern, mark)
+        item["score"] = h["score"]
+        items.append(item)
+    return {"items": items, "has_more": len(hits) > limit}
+
+
+@cached("rapa_projects", "rapa_areas")
+def get_all_projects(user_id: int, path: str | None = None) -> list[dict]:
     """Все проекты для GTD дашборда."""
-    with sqlite3.connect(get_db_path()) as conn:
-        conn.row_factory = sqlite3.Row
+    with connect(path, readonly=True) as conn:
         rows = conn.execute(
             """
             SELECT p.id, p.name, p.outcome, p.status, p.horizon, p.impact, p.effort,
@@ -190,10 +407,10 @@ def get_all_projects(user_id: int) -> list[dict]:
     return [dict(r) for r in rows]
 
 
-def get_all_areas(user_id: int) -> list[dict]:
+@cached("rapa_areas")
+def get_all_areas(user_id: int, path: str | None = None) -> list[dict]:
     """Все области для GTD дашборда."""
-    with sqlite3.connect(get_db_path()) as conn:
-        conn.row_factory = sqlite3.Row
+    with connect(path, readonly=True) as conn:
         rows = conn.execute(
             "SELECT id, name, slug, type, goal FROM rapa_areas WHERE user_id = ? OR user_id = 0 ORDER BY name",
             (user_id,),
@@ -201,11 +418,10 @@ def get_all_areas(user_id: int) -> list[dict]:
     return [dict(r) for r in rows]
 
 
-def get_goals_for_year(user_id: int, year: int) -> list[dict]:
+@cached("rapa_goals", "rapa_areas")
+def get_goals_for_year(user_id: int, year: int, path: str | None = None) -> list[dict]:
     """Цели на год."""
-    with sqlite3.connect(get_db_path()) as conn:
-        init_rapa_schema(conn)
-        conn.row_factory = sqlite3.Row
+    with connect(path, readonly=True) as conn:
         try:
             rows = conn.execute(
                 """
@@ -221,10 +437,10 @@ def get_goals_for_year(user_id: int, year: int) -> list[dict]:
             return []
 
 
-def get_projects_active(user_id: int) -> list[dict]:
+@cached("rapa_projects", "rapa_areas")
+def get_projects_active(user_id: int, path: str | None = None) -> list[dict]:
     """Активные проекты."""
-    with sqlite3.connect(get_db_path()) as conn:
-        conn.row_factory = sqlite3.Row
+    with connect(path, readonly=True) as conn:
         rows = conn.execute(
             """
             SELECT p.id, p.name, p.outcome, p.status, p.deadline, a.name as area_name
@@ -249,11 +465,16 @@ def build_daily_review(user_id: int) -> str:
     lines.append(f"• Новых записей Raw: {len(raw_list)}\n")
     for r in raw_list:
         content_preview = (r["content"] or "")[:80] + "…" if len(r["content"] or "") > 80 else (r["content"] or "")
+        if r.get("ai_summary"):
+            # Длинная расшифровка — пересказ (bot/summarize.py) вместо первых 80 символов
+            content_preview = r["ai_summary"]
         stage = r.get("rapa_stage") or "Raw"
         gtd = r.get("gtd_type") or ""
         para = r.get("para_type") or "Raw"
         lines.append(f"  #{r['id']} [{stage}] {para} {gtd}")
         lines.append(f"      «{content_preview}»")
+        if r.get("suggested_project"):
+            lines.append(f"      → проект? {r['suggested_project']}")
         lines.append("")
     lines.append("— Подтверди или поправь Assign в Avatar.")
     return "\n".join(lines)
@@ -0,0 +1,228 @@
+"""
+Переклассификация всей таблицы raw (после правки ключевых слов rapa_keywords / AREA_KEYWORDS или
+SUPERHERO_AREAS): то же, что propose_assign, но пачками.
+
+- raw читается по id (id > последнего обработанного) пачками по RECLASSIFY_CHUNK строк
+- пачка классифицируется в пуле процессов (RECLASSIFY_WORKERS, 0 — в текущем), пока читается следующая
+- записываются только изменившиеся строки: executemany + отметка прогресса одной транзакцией на пачку,
+  поэтому прерванный запуск продолжается с места остановки (--resume)
+- строки, уже разобранные вручную (есть project_id или стадия дальше Assign), не трогаются
+- dry-run ничего не меняет в raw: счётчики переходов area «было → стало» и первые DIFF_LIMIT изменений
+
+Прогресс — в таблице batch_checkpoints (name = reclassify / reclassify:dry, с --user-id — reclassify:u<id>…):
+у прохода по одному пользователю свой checkpoint, --resume всей таблицы его не подхватывает.
+
+    python -m bot.reclassify [--dry-run] [--resume] [--chunk 2000] [--workers 4] [--user-id N]
+    POST /api/rapa/reclassify {"dry_run": true} → фоновая задача, GET /api/rapa/reclassify — прогресс
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable
+
+from bot.rapa import Classifier, ensure_default_areas, ensure_default_keywords, load_keywords, reload_classifier
+from db import connect, get_db_path
+
+CHUNK_SIZE = int(os.getenv("RECLASSIFY_CHUNK", "2000"))
+# По умолчанию ядро остаётся чтению и записи; на одном ядре пул только мешает
+WORKERS = int(os.getenv("RECLASSIFY_WORKERS", str(min(4, (os.cpu_count() or 1) - 1))))
+DIFF_LIMIT = 200
+
+logger = logging.getLogger(__name__)
+
+_worker_classifier: Classifier | None = None
+
+
+def _init_worker(keywords: dict) -> None:
+    global _worker_classifier
+    _worker_classifier = Classifier(keywords)
+
+
+def _classify_chunk(rows: list[tuple[int, str | None]]) -> list[tuple[str, str, str | None]]:
+    """В процессе пула: [(id, content)] → [(gtd_type, para_type, area_slug)]."""
+    out = []
+    for _, content in rows:
+        cls = _worker_classifier.classify(content)
+        out.append((cls["gtd_type"], cls["para_type"], cls["area_slug"]))
+    return out
+
+
+def checkpoint_name(dry_run: bool = False, user_id: int | None = None) -> str:
+    return "reclassify" + (f":u{user_id}" if user_id else "") + (":dry" if dry_run else "")
+
+
+def get_checkpoint(name: str, path: str | None = None) -> dict | None:
+    with connect(path, readonly=True) as conn:
+        row = conn.execute("SELECT name, last_id, stats, updated_at FROM batch_checkpoints WHERE name = ?", (name,)).fetchone()
+    if not row:
+        return None
+    return {**dict(row), "stats": json.loads(row["stats"]) if row["stats"] else None}
+
+
+def _save_checkpoint(conn, name: str, last_id: int, stats: dict) -> None:
+    conn.execute(
+        """
+        INSERT INTO batch_checkpoints (name, last_id, stats, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id, stats = excluded.stats, updated_at = excluded.updated_at
+        """,
+        (name, last_id, json.dumps(stats, ensure_ascii=False), datetime.utcnow().isoformat()),
+    )
+
+
+def _read_chunk(path: str, after_id: int, limit: int, user_id: int | None) -> list[tuple]:
+    where = "AND user_id = ?" if user_id else ""
+    args = (after_id, user_id, limit) if user_id else (after_id, limit)
+    with connect(path, readonly=True) as conn:
+        return [tuple(r) for r in conn.execute(
+            f"""
+            SELECT id, user_id, content, gtd_type, para_type, area_id FROM raw
+            WHERE id > ? {where} AND project_id IS NULL AND COALESCE(rapa_stage, 'Raw') IN ('Raw', 'Assign')
+            ORDER BY id LIMIT ?
+            """,
+            args,
+        )]
+
+
+def reclassify(
+    path: str | None = None,
+    chunk: int = CHUNK_SIZE,
+    workers: int = WORKERS,
+    dry_run: bool = False,
+    resume: bool = False,
+    user_id: int | None = None,
+    progress: Callable[[dict], None] | None = None,
+) -> dict:
+    """Проход по raw. Возвращает итоговые счётчики (и diff в dry-run); progress(stats) — после каждой пачки."""
+    path = path or get_db_path()
+    name = checkpoint_name(dry_run, user_id)
+    if not dry_run:
+        # Новые области и ключевые слова из кода — в БД (INSERT OR IGNORE), классификатор бота пересоберётся
+        with connect(path) as conn:
+            ensure_default_areas(conn)
+            ensure_default_keywords(conn)
+        reload_classifier()
+    keywords = load_keywords(path)
+    with connect(path, readonly=True) as conn:
+        area_rows = conn.execute("SELECT id, user_id, slug FROM rapa_areas").fetchall()
+    area_slugs = {r["id"]: r["slug"] for r in area_rows}
+    area_ids = {(r["user_id"], r["slug"]): r["id"] for r in area_rows}
+
+    def area_for(uid: int, slug: str | None) -> int | None:
+        # Как get_area_id_by_slug: своя область пользователя важнее общей (user_id = 0)
+        return area_ids.get((uid, slug), area_ids.get((0, slug))) if slug else None
+
+    checkpoint = get_checkpoint(name, path) if resume else None
+    last_id = checkpoint["last_id"] if checkpoint else 0
+    stats = {"dry_run": dry_run, "started_from": last_id, "last_id": last_id, "processed": 0, "changed": 0,
+             "elapsed_s": 0.0, "rows_per_s": 0.0, "done": False}
+    transitions: Counter = Counter()
+    diff: list[dict] = []
+    t0 = time.perf_counter()
+
+    pool = None
+    if workers > 0:
+        # spawn: пул создаётся и из многопоточного процесса API (воркер задач), fork там небезопасен
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(keywords,))
+    else:
+        _init_worker(keywords)
+    inflight: deque = deque()
+    read_from = last_id
+    try:
+        while True:
+            # Держим в работе до workers + 1 пачек: пул классифицирует, пока читаем и пишем
+            while len(inflight) <= max(workers, 1):
+                rows = _read_chunk(path, read_from, chunk, user_id)
+                if not rows:
+                    break
+                read_from = rows[-1][0]
+                payload = [(r[0], r[2]) for r in rows]
+                inflight.append((rows, pool.submit(_classify_chunk, payload) if pool else _classify_chunk(payload)))
+            if not inflight:
+                break
+            rows, result = inflight.popleft()
+            results = result.result() if pool else result
+
+            updates = []
+            now = datetime.utcnow().isoformat()
+            for (rid, uid, _, old_gtd, old_para, old_area), (gtd, para, slug) in zip(rows, results):
+                area_id = area_for(uid, slug)
+                if (gtd, para, area_id) == (old_gtd, old_para, old_area):
+                    continue
+                old_slug = area_slugs.get(old_area)
+                if old_slug != slug:
+                    transitions[f"{old_slug or '-'} → {slug or '-'}"] += 1
+                if dry_run and len(diff) < DIFF_LIMIT:
+                    diff.append({"id": rid, "user_id": uid,
+                                 "from": {"gtd_type": old_gtd, "para_type": old_para, "area": old_slug},
+                                 "to": {"gtd_type": gtd, "para_type": para, "area": slug}})
+                updates.append((gtd, para, area_id, now, rid))
+
+            stats["processed"] += len(rows)
+            stats["changed"] += len(updates)
+            stats["last_id"] = rows[-1][0]
+            stats["elapsed_s"] = round(time.perf_counter() - t0, 2)
+            stats["rows_per_s"] = round(stats["processed"] / max(stats["elapsed_s"], 1e-6))
+            with connect(path) as conn:
+                if updates and not dry_run:
+                    conn.executemany(
+                        """
+                        UPDATE raw SET gtd_type = ?, para_type = ?, area_id = ?, rapa_stage = 'Assign', assign_proposed_at = ?
+                        WHERE id = ? AND project_id IS NULL AND COALESCE(rapa_stage, 'Raw') IN ('Raw', 'Assign')
+                        """,
+                        updates,
+                    )
+                _save_checkpoint(conn, name, stats["last_id"], stats)
+            if progress:
+                progress(dict(stats))
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    stats["done"] = True
+    stats["areas_changed"] = dict(transitions.most_common())
+    with connect(path) as conn:
+        _save_checkpoint(conn, name, stats["last_id"], stats)
+    logger.info("Reclassify%s: %s rows, %s changed, %s rows/s", " (dry run)" if dry_run else "",
+                stats["processed"], stats["changed"], stats["rows_per_s"])
+    if dry_run:
+        stats["diff"] = diff
+    return stats
+
+
+def main() -> None:
+    """python -m bot.reclassify [--dry-run] [--resume] [--chunk N] [--workers N] [--user-id N] [--diff]"""
+    ap = argparse.ArgumentParser(description="re-run RAPA classification over the whole raw table")
+    ap.add_argument("--dry-run", action="store_true", help="ничего не записывать, показать изменения")
+    ap.add_argument("--resume", action="store_true", help="продолжить с места, где остановился прошлый запуск")
+    ap.add_argument("--chunk", type=int, default=CHUNK_SIZE)
+    ap.add_argument("--workers", type=int, default=WORKERS, help="процессов классификации, 0 — в этом процессе")
+    ap.add_argument("--user-id", type=int)
+    ap.add_argument("--diff", action="store_true", help="в dry-run — напечатать изменения построчно")
+    args = ap.parse_args()
+    import bot.collect_bot  # noqa: F401 — .env (DB_PATH), как у бота
+
+    def report(s: dict) -> None:
+        print(f"  id ≤ {s['last_id']:<8} processed {s['processed']:>8}  changed {s['changed']:>7}  "
+              f"{s['rows_per_s']:>7.0f} rows/s  {s['elapsed_s']:.1f} s", flush=True)
+
+    stats = reclassify(chunk=args.chunk, workers=args.workers, dry_run=args.dry_run, resume=args.resume,
+                       user_id=args.user_id, progress=report)
+    for transition, n in stats["areas_changed"].items():
+        print(f"  {n:>7}  {transition}")
+    if args.dry_run and args.diff:
+        for d in stats["diff"]:
+            print(f"  #{d['id']}: {d['from']} → {d['to']}")
+    print(f"{'dry run: ' if args.dry_run else ''}{stats['processed']} rows, {stats['changed']} changed, "
+          f"{stats['rows_per_s']:.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
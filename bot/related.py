@@ -0,0 +1,569 @@
+"""
+«Похожие» для Raw: локальный векторный индекс без внешних сервисов.
+
+- Вектор текста: символьные 3- и 4-граммы, хэшированные в RELATED_DIM корзин (хэш считается NumPy по
+  кодам символов — одинаков во всех процессах), log(1 + tf) × idf, нормирован по L2
+- Матрица векторов — файл NumPy memmap рядом с БД (<db>.related/): Raw и проекты (name + outcome) в одной
+  матрице, ключ строки = id * 2 + вид (0 — raw, 1 — проект); рядом — владелец строки (user_id): поиск
+  похожих идёт только по строкам пользователя
+- Новая Raw добавляется сразу (propose_assign, save_raw_many): строка в конец файла под блокировкой
+  файла lock (flock, на Windows — msvcrt.locking);
+  проекты переиндексируются, когда меняется их версия в cache_versions (db/cache.py)
+- Запрос — одно умножение матрицы на вектор (косинус) и argpartition; читатели видят новые строки
+  по mtime meta.json. idf берётся на момент добавления: после большого импорта — rebuild
+
+Без numpy (или без блокировки файлов) индекс выключен: похожих нет, проект не предлагается.
+
+    related_items(raw_id, user_id)       # [{kind, id, title, score}, ...]
+    python -m bot.related rebuild | stats | query RAW_ID
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from db import connect, get_db_path
+from db.cache import cached
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+DIM = int(os.getenv("RELATED_DIM", "512"))
+NGRAMS = (3, 4)
+MAX_TEXT_CHARS = 20000
+PROJECT_MIN_SCORE = float(os.getenv("RELATED_PROJECT_MIN_SCORE", "0.35"))
+RAW, PROJECT = 0, 1
+
+_NON_WORD = re.compile(r"[\W_]+")
+_MUL = 0x9E3779B97F4A7C15  # 64-битная константа Фибоначчи-хэширования
+
+logger = logging.getLogger(__name__)
+
+_indexes: dict[str, "Index"] = {}
+
+
+def _empty_meta(dim: int) -> dict:
+    return {"dim": dim, "count": 0, "capacity": 0, "docs": 0, "df": None, "projects_version": None, "generation": 0}
+
+
+def index_dir(path: str | None = None) -> Path:
+    path = path or get_db_path()
+    return Path(os.getenv("RELATED_INDEX_DIR") or f"{path}.related")
+
+
+def _normalize(text: str) -> str:
+    text = (text or "")[:MAX_TEXT_CHARS].lower().replace("ё", "е")
+    return " " + _NON_WORD.sub(" ", text).strip() + " "
+
+
+def term_counts(text: str, dim: int = DIM):
+    """Счётчики хэшированных n-грамм текста: массив float32 длины dim."""
+    import numpy as np
+
+    codes = np.frombuffer(_normalize(text).encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+    counts = np.zeros(dim, dtype=np.float32)
+    for n in NGRAMS:
+        if len(codes) < n:
+            continue
+        h = np.zeros(len(codes) - n + 1, dtype=np.uint64)
+        for j in range(n):
+            h = h * np.uint64(_MUL) + codes[j:len(codes) - n + 1 + j]  # переполнение uint64 — часть хэша
+        h ^= h >> np.uint64(29)
+        counts += np.bincount((h % np.uint64(dim)).astype(np.int64), minlength=dim).astype(np.float32)
+    return counts
+
+
+def _weigh(counts, idf):
+    import numpy as np
+
+    vec = np.log1p(counts) * idf
+    norm = float(np.linalg.norm(vec))
+    return (vec / norm).astype(np.float32) if norm else vec.astype(np.float32)
+
+
+class Index:
+    """Матрица векторов в memmap. Запись — под блокировкой файла (бот и API пишут в один индекс);
+    внутри процесса всё состояние — под self._lock (потоки gunicorn gthread ищут, пока другой пишет)."""
+
+    def __init__(self, directory: Path, dim: int = DIM, meta_name: str = "meta.json"):
+        self.dir = directory
+        self.dim = dim
+        self.meta_name = meta_name  # rebuild собирает новое поколение рядом, со своим meta
+        self._stamp = None
+        self.meta: dict = {}
+        self.vectors = None
+        self.keys = None
+        self.owners = None  # None — индекс до колонки владельцев: пользователь проверяется по БД
+        self.rows: dict[int, int] = {}  # ключ -> строка
+        self._lock = threading.RLock()
+        self._indexed = 0  # сколько строк разобрано в self.rows
+        self._generation = None
+        self._retired = None
+
+    # --- файлы ---
+
+    def _paths(self, capacity: int, generation: int | None = None) -> tuple[Path, Path, Path]:
+        generation = self.meta.get("generation", 0) if generation is None else generation
+        prefix = f"{generation}." if generation else ""
+        return (self.dir / f"vectors.{prefix}{capacity}.f32", self.dir / f"keys.{prefix}{capacity}.i64",
+                self.dir / f"owners.{prefix}{capacity}.i64")
+
+    def _load_meta(self) -> dict:
+        try:
+            return json.loads((self.dir / self.meta_name).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return _empty_meta(self.dim)
+
+    def _save_meta(self) -> None:
+        tmp = self.dir / f"{self.meta_name}.tmp"
+        tmp.write_text(json.dumps(self.meta), encoding="utf-8")
+        os.replace(tmp, self.dir / self.meta_name)  # читатели видят count только после записи строк
+
+    def refresh(self) -> None:
+        """Перечитать meta.json, если его поменял другой процесс; новые строки — в self.rows."""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        import numpy as np
+
+        try:
+            st = (self.dir / self.meta_name).stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._stamp and self.vectors is not None:
+            return
+        self._stamp = stamp
+        self.meta = self._load_meta()
+        if self.meta.get("dim", self.dim) != self.dim:
+            logger.warning("Related index %s: dim %s != RELATED_DIM %s — rebuild", self.dir, self.meta["dim"], self.dim)
+            self.meta = _empty_meta(self.dim)
+        if self.meta["generation"] != self._generation:  # пересобран (rebuild): другие файлы, другие строки
+            self._generation = self.meta["generation"]
+            self.vectors = self.keys = self.owners = None
+            self.rows, self._indexed = {}, 0
+        capacity = self.meta["capacity"]
+        if capacity and (self.vectors is None or self.vectors.shape[0] != capacity):
+            vec_path, key_path, owner_path = self._paths(capacity)
+            self.vectors = np.memmap(vec_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+            self.keys = np.memmap(key_path, dtype=np.int64, mode="r+", shape=(capacity,))
+            self.owners = (np.memmap(owner_path, dtype=np.int64, mode="r+", shape=(capacity,))
+                           if self.meta.get("owners") else None)
+        count = self.meta["count"]
+        for row, key in enumerate(self.keys[self._indexed:count].tolist() if count else [], start=self._indexed):
+            if key >= 0:
+                self.rows[key] = row
+        self._indexed = count
+
+    def _grow(self, need: int) -> None:
+        import numpy as np
+
+        old = self.meta["capacity"]
+        capacity = max(1024, old)
+        while capacity < need:
+            capacity *= 2
+        if capacity == old:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        vec_path, key_path, owner_path = self._paths(capacity)
+        vectors = np.memmap(vec_path, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        keys = np.memmap(key_path, dtype=np.int64, mode="w+", shape=(capacity,))
+        owners = np.memmap(owner_path, dtype=np.int64, mode="w+", shape=(capacity,))
+        keys[:] = -1
+        owners[:] = -1  # владелец неизвестен (строки индекса до колонки владельцев)
+        count = self.meta["count"]
+        if old:
+            vectors[:count] = self.vectors[:count]
+            keys[:count] = self.keys[:count]
+            if self.owners is not None:
+                owners[:count] = self.owners[:count]
+        for m in (vectors, keys, owners):
+            m.flush()
+        self.vectors, self.keys, self.owners = vectors, keys, owners
+        self.meta["capacity"] = capacity
+        self.meta["owners"] = True
+        if old:
+            # Старые файлы удалятся после смены meta; открытые у читателей memmap живут до перечитывания
+            self._retired = self._paths(old)
+
+    # --- запись ---
+
+    def _locked(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.dir / "lock", os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)  # первый байт; LK_LOCK ждёт ~10 с, потом OSError
+                    break
+                except OSError:
+                    continue
+        return fd
+
+    def _unlock(self, fd: int) -> None:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
+
+    def idf(self):
+        import numpy as np
+
+        df = np.asarray(self.meta.get("df") or np.zeros(self.dim), dtype=np.float32)
+        return np.log((1.0 + self.meta.get("docs", 0)) / (1.0 + df)) + 1.0
+
+    def add(self, items: list[tuple[int, str, int]], count_df: bool = True, drop: tuple = (), meta: dict | None = None) -> list:
+        """[(ключ, текст, user_id)] → векторы в индекс (существующий ключ — перезапись). Возвращает векторы.
+
+        drop — ключи, которые убрать из выдачи; meta — поля meta.json, записываемые вместе со строками.
+        """
+        counts = [term_counts(text, self.dim) for _, text, _ in items]
+        with self._lock:
+            fd = self._locked()
+            try:
+                vecs = self._write(items, counts, count_df, drop, meta)
+            finally:
+                self._unlock(fd)
+        return vecs
+
+    def _write(self, items: list[tuple[int, str, int]], counts: list, count_df: bool, drop: tuple, meta: dict | None) -> list:
+        """Тело add(): вызывающий держит self._lock и блокировку файла."""
+        import numpy as np
+
+        self._stamp = None
+        self._refresh()
+        for key in drop:
+            row = self.rows.pop(key, None)
+            if row is not None:
+                self.keys[row] = -1
+                self.vectors[row] = 0
+        if count_df:
+            df = np.asarray(self.meta.get("df") or np.zeros(self.dim), dtype=np.float64)
+            for c in counts:
+                df += c > 0
+            self.meta["df"] = df.round().astype(int).tolist()
+            self.meta["docs"] = self.meta.get("docs", 0) + len(items)
+        idf = self.idf()
+        vecs = [_weigh(c, idf) for c in counts]
+        new = [key for key, _, _ in items if key not in self.rows]
+        self._retired = None
+        self._grow(self.meta["count"] + len(new))
+        for (key, _, owner), vec in zip(items, vecs):
+            row = self.rows.get(key)
+            if row is None:
+                row = self.meta["count"]
+                self.rows[key] = row
+                self.meta["count"] += 1
+            self.vectors[row] = vec
+            self.keys[row] = key
+            if self.owners is not None:
+                self.owners[row] = owner
+        self.meta.update(meta or {})
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.keys.flush()
+            if self.owners is not None:
+                self.owners.flush()
+        self._indexed = self.meta["count"]
+        self._save_meta()
+        for old in self._retired or ():
+            try:
+                old.unlink(missing_ok=True)
+            except OSError:
+                pass  # Windows: файл ещё отображён в память у читателя — останется до rebuild
+        return vecs
+
+    # --- чтение ---
+
+    def vector_of(self, key: int):
+        """Копия вектора (memmap могут заменить при росте) или None."""
+        import numpy as np
+
+        with self._lock:
+            self._refresh()
+            row = self.rows.get(key)
+            return None if row is None else np.array(self.vectors[row])
+
+    def search(self, vec, k: int = 10, kind: int | None = None, exclude: int | None = None,
+               only: list[int] | None = None, user_id: int | None = None) -> list[tuple[int, float]]:
+        """[(ключ, косинус)] по убыванию. kind — только raw или только проекты; only — только эти ключи;
+        user_id — только строки пользователя (и с неизвестным владельцем: их отсеет вызывающий)."""
+        import numpy as np
+
+        with self._lock:
+            self._refresh()
+            count = self.meta["count"]
+            if only is not None:
+                rows = np.array([self.rows[key] for key in only if key in self.rows], dtype=np.int64)
+                if not len(rows):
+                    return []
+                scores, keys = self.vectors[rows] @ vec, self.keys[rows]
+            else:
+                scores, keys = self.vectors[:count] @ vec, np.array(self.keys[:count])
+                live = keys >= 0
+                if kind is not None:
+                    live &= (keys & 1) == kind
+                if user_id is not None and self.owners is not None:
+                    owners = self.owners[:count]
+                    live &= (owners == user_id) | (owners < 0)
+                scores = np.where(live, scores, -1.0)
+                if exclude is not None and exclude in self.rows:
+                    scores[self.rows[exclude]] = -1.0
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(keys[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def get_index(path: str | None = None) -> Index | None:
+    """Индекс БД (один объект на процесс) или None без numpy или блокировки файлов."""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return None
+    if fcntl is None and msvcrt is None:
+        return None
+    directory = index_dir(path)
+    index = _indexes.get(str(directory))
+    if index is None:
+        index = _indexes[str(directory)] = Index(directory)
+    return index
+
+
+def raw_key(raw_id: int) -> int:
+    return raw_id * 2 + RAW
+
+
+def project_key(project_id: int) -> int:
+    return project_id * 2 + PROJECT
+
+
+def _project_text(row) -> str:
+    return " ".join(x for x in (row["name"], row["outcome"]) if x)
+
+
+def sync_projects(path: str | None = None) -> None:
+    """Переиндексировать активные проекты, если rapa_projects менялась (версия из cache_versions)."""
+    from db.cache import versions
+
+    index = get_index(path)
+    if index is None:
+        return
+    version = (versions(path) or {}).get("rapa_projects")
+    with index._lock:
+        index._refresh()
+        if version is not None and index.meta.get("projects_version") == version:
+            return
+        indexed = [key for key in index.rows if key & 1 == PROJECT]
+    with connect(path, readonly=True) as conn:
+        rows = conn.execute("SELECT id, user_id, name, outcome FROM rapa_projects WHERE status = 'active'").fetchall()
+    items = [(project_key(r["id"]), _project_text(r), r["user_id"]) for r in rows]
+    active = {key for key, _, _ in items}
+    gone = tuple(key for key in indexed if key not in active)
+    # Проекты не входят в df: их мало, и они переиндексируются целиком при каждой правке
+    index.add(items, count_df=False, drop=gone, meta={"projects_version": version})
+
+
+def index_raw(raw_id: int, user_id: int, content: str, path: str | None = None):
+    """Новая Raw в индекс (вызывается после вставки). Возвращает вектор или None."""
+    index = get_index(path)
+    if index is None:
+        return None
+    return index.add([(raw_key(raw_id), content or "", user_id)])[0]
+
+
+def index_raw_many(items: list[tuple[int, str]], user_id: int, path: str | None = None) -> list:
+    """Пачка [(raw_id, текст)] пользователя в индекс одной записью. Возвращает векторы (пусто без numpy)."""
+    index = get_index(path)
+    if index is None or not items:
+        return []
+    return index.add([(raw_key(rid), text or "", user_id) for rid, text in items])
+
+
+@cached("rapa_projects")
+def get_user_projects(user_id: int, path: str | None = None) -> dict[int, str]:
+    """Активные проекты пользователя {id: name} — среди них ищется предлагаемый."""
+    with connect(path, readonly=True) as conn:
+        rows = conn.execute("SELECT id, name FROM rapa_projects WHERE user_id = ? AND status = 'active'", (user_id,)).fetchall()
+    return {r["id"]: r["name"] for r in rows}
+
+
+def suggest_project(vec, user_id: int, path: str | None = None) -> dict | None:
+    """Ближайший проект пользователя к вектору, если сходство не ниже RELATED_PROJECT_MIN_SCORE."""
+    index = get_index(path)
+    if index is None or vec is None:
+        return None
+    sync_projects(path)
+    projects = get_user_projects(user_id, path=path)
+    # Только проекты пользователя: чужие, даже более похожие, не должны вытеснять его лучший
+    hits = index.search(vec, k=1, only=[project_key(pid) for pid in projects])
+    if not hits or hits[0][1] < PROJECT_MIN_SCORE:
+        return None
+    project_id, score = hits[0][0] >> 1, hits[0][1]
+    return {"project_id": project_id, "name": projects[project_id], "score": round(score, 3)}
+
+
+def suggest_for_raw(raw_id: int, user_id: int, path: str | None = None) -> dict | None:
+    """Предлагаемый проект для уже проиндексированной Raw (по текущим проектам)."""
+    index = get_index(path)
+    if index is None:
+        return None
+    return suggest_project(index.vector_of(raw_key(raw_id)), user_id, path)
+
+
+def related_items(raw_id: int, user_id: int, k: int = 10, path: str | None = None) -> list[dict] | None:
+    """Похожие на Raw записи и проекты пользователя: [{kind, id, title, score}]. None — нет такой Raw."""
+    index = get_index(path)
+    with connect(path, readonly=True) as conn:
+        row = conn.execute("SELECT content FROM raw WHERE id = ? AND user_id = ?", (raw_id, user_id)).fetchone()
+    if row is None:
+        return None
+    if index is None:
+        return []
+    sync_projects(path)
+    vec = index.vector_of(raw_key(raw_id))
+    if vec is None:
+        # Запись до появления индекса — добавляем при первом запросе
+        vec = index_raw(raw_id, user_id, row["content"], path)
+    # Только строки пользователя; запас — на удалённые из БД и строки индекса без владельца (до rebuild)
+    hits = index.search(vec, k=k * 3, exclude=raw_key(raw_id), user_id=user_id)
+    raw_ids = [key >> 1 for key, _ in hits if key & 1 == RAW]
+    project_ids = [key >> 1 for key, _ in hits if key & 1 == PROJECT]
+    titles: dict[tuple[int, int], dict] = {}
+    with connect(path, readonly=True) as conn:
+        if raw_ids:
+            # По первичному ключу, пользователь — проверкой: с user_id в WHERE SQLite берёт индекс
+            # idx_raw_user_created и просматривает все записи пользователя
+            for r in conn.execute(
+                f"SELECT id, user_id, title, para_type, created_at FROM raw WHERE id IN ({','.join('?' * len(raw_ids))})",
+                raw_ids,
+            ):
+                if r["user_id"] != user_id:
+                    continue
+                titles[(RAW, r["id"])] = {"title": r["title"], "para_type": r["para_type"], "created_at": r["created_at"]}
+        if project_ids:
+            for r in conn.execute(
+                f"SELECT id, name, status FROM rapa_projects WHERE user_id = ? AND id IN ({','.join('?' * len(project_ids))})",
+                (user_id, *project_ids),
+            ):
+                titles[(PROJECT, r["id"])] = {"title": r["name"], "status": r["status"]}
+    out = []
+    for key, score in hits:
+        kind, item_id = key & 1, key >> 1
+        info = titles.get((kind, item_id))
+        if info is None:
+            continue
+        out.append({"kind": "project" if kind == PROJECT else "raw", "id": item_id, "score": round(score, 3), **info})
+        if len(out) == k:
+            break
+    return out
+
+
+def rebuild(path: str | None = None, chunk: int = 5000) -> dict:
+    """Индекс заново по всей raw и проектам (после импорта, смены RELATED_DIM). Два прохода: df, потом векторы.
+
+    Новое поколение собирается рядом с живым (свои файлы и meta.<поколение>.json), бот тем временем
+    пишет в живое. Переключение — под блокировкой живого индекса: записи, добавленные за время сборки,
+    дописываются в новое поколение, затем meta.json заменяется атомарно, файлы старого поколения удаляются.
+    """
+    import numpy as np
+
+    directory = index_dir(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    generation = time.time_ns()
+    build = Index(directory, meta_name=f"meta.{generation}.json")
+    last_id = 0
+
+    def chunks(after: int = 0):
+        nonlocal last_id
+        while True:
+            with connect(path, readonly=True) as conn:
+                rows = conn.execute(
+                    "SELECT id, user_id, content FROM raw WHERE id > ? ORDER BY id LIMIT ?", (after, chunk)
+                ).fetchall()
+            if not rows:
+                return
+            after = last_id = rows[-1]["id"]
+            yield [(raw_key(r["id"]), r["content"] or "", r["user_id"]) for r in rows]
+
+    df = np.zeros(build.dim, dtype=np.float64)
+    docs = 0
+    for rows in chunks():
+        for _, text, _ in rows:
+            df += term_counts(text, build.dim) > 0
+        docs += len(rows)
+    build.meta = {**_empty_meta(build.dim), "df": df.round().astype(int).tolist(), "docs": docs, "generation": generation}
+    build._save_meta()
+    for rows in chunks():
+        build.add(rows, count_df=False)
+
+    live = Index(directory)
+    fd = live._locked()
+    try:
+        # Пока собирали, бот добавлял записи в старое поколение — они же нужны в новом
+        late = [item for rows in chunks(last_id) for item in rows]
+        if late:
+            with build._lock:
+                build._write(late, [term_counts(text, build.dim) for _, text, _ in late], True, (), None)
+        os.replace(directory / build.meta_name, directory / "meta.json")
+        keep = set(build._paths(build.meta["capacity"])) | {directory / "meta.json", directory / "lock"}
+        for f in directory.iterdir():
+            if f not in keep:
+                try:
+                    f.unlink()
+                except OSError:
+                    pass  # Windows: старое поколение ещё отображено у читателя
+    finally:
+        live._unlock(fd)
+    _indexes.pop(str(directory), None)
+    sync_projects(path)
+    return {"rows": docs + len(late), "seconds": round(time.perf_counter() - t0, 1), "dir": str(directory)}
+
+
+def main() -> None:
+    """python -m bot.related rebuild | stats | query RAW_ID [--user-id N] [-k 10]"""
+    ap = argparse.ArgumentParser(description="related-items index over raw and projects")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild")
+    sub.add_parser("stats")
+    q = sub.add_parser("query")
+    q.add_argument("raw_id", type=int)
+    q.add_argument("--user-id", type=int)
+    q.add_argument("-k", type=int, default=10)
+    args = ap.parse_args()
+    import bot.collect_bot as cb  # .env (DB_PATH), как у бота
+
+    if args.cmd == "rebuild":
+        print(json.dumps(rebuild(), ensure_ascii=False))
+    elif args.cmd == "stats":
+        index = get_index()
+        index.refresh()
+        meta = {k: v for k, v in index.meta.items() if k != "df"}
+        print(json.dumps({**meta, "dir": str(index.dir)}, ensure_ascii=False))
+    elif args.cmd == "query":
+        user_id = args.user_id or cb.RAW_OWNER_USER_ID
+        for item in related_items(args.raw_id, user_id, k=args.k) or []:
+            print(f"  {item['score']:.3f}  {item['kind']:<7} #{item['id']:<7} {item['title']}")
+
+
+if __name__ == "__main__":
+    main()
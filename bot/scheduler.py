@@ -0,0 +1,249 @@
+"""
+Планировщик бота, общий для нескольких экземпляров:
+
+- SQLiteJobStore — задания APScheduler в таблице scheduler_jobs (как SQLAlchemyJobStore, без SQLAlchemy):
+  /postat переживает рестарт, пропущенный за время простоя запуск выполняется один раз (coalesce,
+  misfire_grace_time = SCHEDULER_MISFIRE_GRACE)
+- Leader — аренда в таблице leader_lease: задания выполняет только лидер, остальные держат
+  планировщик на паузе. Лидер продлевает аренду каждые SCHEDULER_LEASE_SECONDS/3; умер — через
+  SCHEDULER_LEASE_SECONDS аренду забирает другой экземпляр
+- В задании хранится не функция с ботом (его не сериализовать), а имя: run_task("fallback_check")
+  вызывает то, что зарегистрировано через register() в этом процессе
+
+    register("fallback_check", lambda: run_fallback_check(bot))
+    sched = create_scheduler()
+    sched.add_job(run_task, "cron", hour=23, args=["fallback_check"], id="fallback_check", replace_existing=True)
+    leader = Leader(on_elected=sched.resume, on_demoted=sched.pause)
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+
+from db import connect
+from db.aio import run_write
+
+LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+MISFIRE_GRACE = int(os.getenv("SCHEDULER_MISFIRE_GRACE", "3600"))
+
+logger = logging.getLogger(__name__)
+
+_tasks: dict[str, Callable[[], Awaitable[object]]] = {}
+
+
+def register(name: str, fn: Callable[[], Awaitable[object]]) -> None:
+    _tasks[name] = fn
+
+
+async def run_task(name: str) -> None:
+    """Функция всех заданий планировщика (сериализуется как ссылка на модуль + имя задачи)."""
+    fn = _tasks.get(name)
+    if fn is None:
+        logger.warning("Scheduler: task %r is not registered in this process", name)
+        return
+    await fn()
+
+
+class SQLiteJobStore(BaseJobStore):
+    """Задания в таблице scheduler_jobs (db/migrations.py). Синхронные короткие запросы из потока планировщика."""
+
+    def __init__(self, path: str | None = None, pickle_protocol: int = pickle.HIGHEST_PROTOCOL):
+        super().__init__()
+        self.path = path
+        self.pickle_protocol = pickle_protocol
+
+    def lookup_job(self, job_id):
+        with connect(self.path, readonly=True) as conn:
+            row = conn.execute("SELECT job_state FROM scheduler_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._reconstitute_job(row[0]) if row else None
+
+    def get_due_jobs(self, now):
+        return self._get_jobs("WHERE next_run_time <= ?", (datetime_to_utc_timestamp(now),))
+
+    def get_next_run_time(self):
+        with connect(self.path, readonly=True) as conn:
+            row = conn.execute(
+                "SELECT next_run_time FROM scheduler_jobs WHERE next_run_time IS NOT NULL ORDER BY next_run_time LIMIT 1"
+            ).fetchone()
+        return utc_timestamp_to_datetime(row[0]) if row else None
+
+    def get_all_jobs(self):
+        jobs = self._get_jobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def add_job(self, job):
+        try:
+            with connect(self.path) as conn:
+                conn.execute(
+                    "INSERT INTO scheduler_jobs (id, next_run_time, job_state) VALUES (?, ?, ?)",
+                    (job.id, datetime_to_utc_timestamp(job.next_run_time), self._dump(job)),
+                )
+        except sqlite3.IntegrityError:
+            raise ConflictingIdError(job.id)
+
+    def update_job(self, job):
+        with connect(self.path) as conn:
+            cur = conn.execute(
+                "UPDATE scheduler_jobs SET next_run_time = ?, job_state = ? WHERE id = ?",
+                (datetime_to_utc_timestamp(job.next_run_time), self._dump(job), job.id),
+            )
+        if cur.rowcount == 0:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        with connect(self.path) as conn:
+            cur = conn.execute("DELETE FROM scheduler_jobs WHERE id = ?", (job_id,))
+        if cur.rowcount == 0:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM scheduler_jobs")
+
+    def _dump(self, job) -> bytes:
+        return pickle.dumps(job.__getstate__(), self.pickle_protocol)
+
+    def _reconstitute_job(self, job_state: bytes) -> Job:
+        state = pickle.loads(job_state)
+        state["jobstore"] = self
+        job = Job.__new__(Job)
+        job.__setstate__(state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _get_jobs(self, where: str = "", args: tuple = ()) -> list[Job]:
+        jobs, broken = [], []
+        with connect(self.path, readonly=True) as conn:
+            rows = conn.execute(
+                f"SELECT id, job_state FROM scheduler_jobs {where} ORDER BY next_run_time IS NULL, next_run_time", args
+            ).fetchall()
+        for row in rows:
+            try:
+                jobs.append(self._reconstitute_job(row["job_state"]))
+            except Exception:
+                logger.exception("Scheduler: unable to restore job %r — removing it", row["id"])
+                broken.append((row["id"],))
+        if broken:
+            with connect(self.path) as conn:
+                conn.executemany("DELETE FROM scheduler_jobs WHERE id = ?", broken)
+        return jobs
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} (path={self.path or 'DB_PATH'})>"
+
+
+def create_scheduler(path: str | None = None) -> AsyncIOScheduler:
+    return AsyncIOScheduler(
+        jobstores={"default": SQLiteJobStore(path)},
+        job_defaults={"coalesce": True, "misfire_grace_time": MISFIRE_GRACE, "max_instances": 1},
+    )
+
+
+# --- Аренда лидера ---
+
+def acquire_lease(name: str, holder: str, ttl: float, path: str | None = None) -> bool:
+    """Захват или продление аренды. True — holder лидер до now + ttl."""
+    now = datetime.utcnow()
+    with connect(path) as conn:
+        row = conn.execute(
+            """
+            INSERT INTO leader_lease (name, holder, expires_at, acquired_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                expires_at = excluded.expires_at,
+                acquired_at = CASE WHEN leader_lease.holder = excluded.holder THEN leader_lease.acquired_at
+                                   ELSE excluded.acquired_at END,
+                holder = excluded.holder
+            WHERE leader_lease.holder = excluded.holder OR leader_lease.expires_at < ?
+            RETURNING holder
+            """,
+            (name, holder, (now + timedelta(seconds=ttl)).isoformat(), now.isoformat(), now.isoformat()),
+        ).fetchone()
+    return row is not None
+
+
+def release_lease(name: str, holder: str, path: str | None = None) -> None:
+    with connect(path) as conn:
+        conn.execute("DELETE FROM leader_lease WHERE name = ? AND holder = ?", (name, holder))
+
+
+def current_leader(name: str = "scheduler", path: str | None = None) -> dict | None:
+    with connect(path, readonly=True) as conn:
+        row = conn.execute("SELECT holder, expires_at, acquired_at FROM leader_lease WHERE name = ?", (name,)).fetchone()
+    return dict(row) if row and row["expires_at"] >= datetime.utcnow().isoformat() else None
+
+
+class Leader:
+    """Цикл аренды: on_elected при получении лидерства, on_demoted при потере (или ошибке продления)."""
+
+    def __init__(
+        self,
+        name: str = "scheduler",
+        ttl: float = LEASE_SECONDS,
+        on_elected: Callable[[], object] | None = None,
+        on_demoted: Callable[[], object] | None = None,
+        on_renewed: Callable[[], object] | None = None,
+        path: str | None = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.on_renewed = on_renewed
+        self.path = path
+        self.is_leader = False
+        self._task: asyncio.Task | None = None
+
+    def _set(self, leader: bool) -> None:
+        if leader == self.is_leader:
+            if leader and self.on_renewed:
+                self.on_renewed()
+            return
+        self.is_leader = leader
+        logger.info("Scheduler: %s %s leadership (%s)", self.holder, "took" if leader else "lost", self.name)
+        callback = self.on_elected if leader else self.on_demoted
+        if callback:
+            callback()
+
+    async def tick(self) -> bool:
+        try:
+            ok = await run_write(acquire_lease, self.name, self.holder, self.ttl, self.path)
+        except Exception as e:
+            # Не смогли продлить — считаем, что аренды нет: другой экземпляр заберёт её после истечения
+            logger.warning("Scheduler: lease renewal failed: %s", e)
+            ok = False
+        self._set(ok)
+        return ok
+
+    async def _run(self) -> None:
+        while True:
+            await self.tick()
+            await asyncio.sleep(self.ttl / 3)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановка: отдаём аренду сразу, чтобы другой экземпляр не ждал её истечения."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            self._set(False)
+            try:
+                await run_write(release_lease, self.name, self.holder, self.path)
+            except Exception as e:
+                logger.warning("Scheduler: lease release failed: %s", e)
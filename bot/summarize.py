@@ -0,0 +1,283 @@
+"""
+Офлайн-пересказ Raw в raw.ai_summary (длинные расшифровки Plaud в обзорах и поиске — raw_fts
+индексирует ai_summary).
+
+- Берёт строки без пересказа по id; короче SUMMARY_MIN_CHARS пересказывать незачем — помечаются 'short'
+- Кэш по sha256 текста (summary_cache): повторно пришедший текст (тот же Plaud через Zapier) — без запроса
+- Несколько коротких текстов — один запрос к LLM (до SUMMARY_BATCH_CHARS символов, ответ JSON по номерам),
+  одновременно не больше SUMMARY_CONCURRENCY запросов
+- Нет ключа / сети / ответ не разобран — экстрактивный пересказ: предложения с наибольшим TF-IDF
+  (ai_summary_model = 'extractive'; --upgrade позже перепишет их через LLM)
+
+LLM — OpenAI-совместимый API (PERPLEXITY_API_KEY, PERPLEXITY_BASE_URL, как анализ спринта); локально —
+scripts/stub_llm.py. В боте — задание планировщика summarize_raw раз в SUMMARY_INTERVAL_MINUTES (лидер).
+
+    stats = await summarize_pending()
+    python -m bot.summarize [--limit 500] [--offline] [--upgrade]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+
+from db import connect
+from db.aio import run_read, run_write
+
+MIN_CHARS = int(os.getenv("SUMMARY_MIN_CHARS", "280"))
+BATCH_CHARS = int(os.getenv("SUMMARY_BATCH_CHARS", "6000"))
+BATCH_MAX_ITEMS = 8
+MAX_INPUT_CHARS = int(os.getenv("SUMMARY_MAX_INPUT_CHARS", "12000"))  # длиннее — начало и конец текста
+CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "2"))
+LIMIT = int(os.getenv("SUMMARY_LIMIT", "200"))  # строк за один запуск
+MODEL = (os.getenv("SUMMARY_MODEL") or "sonar").strip()
+TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "60"))
+SENTENCES = 3
+MAX_SUMMARY_CHARS = 400
+
+EXTRACTIVE = "extractive"
+SHORT = "short"
+
+SYSTEM_PROMPT = """Ты пересказываешь личные заметки и расшифровки разговоров для ежедневного обзора.
+На входе — заметки с номерами в квадратных скобках. Для каждой — 1–3 предложения на языке заметки:
+о чём она и что из неё следует (решения, задачи, сроки). Без вступлений и оценок.
+Ответ — только JSON-объект: ключ — номер заметки строкой, значение — пересказ. Пример: {"1": "…", "2": "…"}"""
+
+_SENT_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+_WORD_RE = re.compile(r"\w{4,}")
+_STOP = {"этот", "этого", "этом", "который", "которые", "потому", "когда", "чтобы", "очень", "можно", "будет",
+         "если", "тоже", "просто", "вообще", "значит", "типа", "сейчас", "тогда", "такой", "такая", "такие",
+         "есть", "было", "были", "была", "всех", "всего", "себя", "меня", "тебя", "нужно", "надо", "вот"}
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def _clip(text: str, limit: int) -> str:
+    text = text.strip()
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0].rstrip(",;:—-") + "…"
+
+
+def extractive_summary(text: str, sentences: int = SENTENCES, max_chars: int = MAX_SUMMARY_CHARS) -> str:
+    """Без сети: предложения с наибольшим весом TF-IDF (документы — предложения текста), в исходном порядке."""
+    parts = [s.strip() for s in _SENT_RE.split(text or "") if len(s.strip()) > 20]
+    if len(parts) <= sentences:
+        return _clip(" ".join(parts) or (text or ""), max_chars)
+    docs = [Counter(w for w in _WORD_RE.findall(s.lower().replace("ё", "е")) if w not in _STOP) for s in parts]
+    df = Counter(w for d in docs for w in d)
+    n = len(docs)
+    scores = []
+    for d in docs:
+        size = sum(d.values())
+        # Нормировка на корень длины: длинное предложение не выигрывает только числом слов
+        scores.append(sum(tf * math.log(n / df[w]) for w, tf in d.items()) / math.sqrt(size) if size else 0.0)
+    top: list[int] = []
+    seen: set[str] = set()
+    for i in sorted(range(n), key=lambda i: -scores[i]):
+        if parts[i] not in seen:  # в расшифровках фразы повторяются дословно
+            seen.add(parts[i])
+            top.append(i)
+        if len(top) == sentences:
+            break
+    return _clip(" ".join(parts[i] for i in sorted(top)), max_chars)
+
+
+def _llm_input(text: str) -> str:
+    if len(text) <= MAX_INPUT_CHARS:
+        return text
+    half = MAX_INPUT_CHARS // 2
+    return text[:half] + "\n…\n" + text[-half:]
+
+
+def pack_batches(items: list[tuple[str, str]]) -> list[list[tuple[str, str]]]:
+    """[(hash, text)] → запросы: короткие вместе до BATCH_CHARS / BATCH_MAX_ITEMS, длинный — один."""
+    batches: list[list[tuple[str, str]]] = []
+    current: list[tuple[str, str]] = []
+    size = 0
+    for h, text in sorted(items, key=lambda it: len(it[1])):
+        text = _llm_input(text)
+        if current and (size + len(text) > BATCH_CHARS or len(current) >= BATCH_MAX_ITEMS):
+            batches.append(current)
+            current, size = [], 0
+        current.append((h, text))
+        size += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _llm_client():
+    """AsyncOpenAI на PERPLEXITY_BASE_URL или None (нет ключа / нет пакета openai) — тогда только экстрактивно."""
+    key = (os.getenv("PERPLEXITY_API_KEY") or "").strip()
+    if not key:
+        return None
+    try:
+        from openai import AsyncOpenAI
+    except ImportError:
+        logger.warning("Summaries: openai package not installed — extractive only")
+        return None
+    base_url = (os.getenv("PERPLEXITY_BASE_URL") or "https://api.perplexity.ai").strip()
+    return AsyncOpenAI(api_key=key, base_url=base_url, timeout=TIMEOUT, max_retries=1)
+
+
+def parse_reply(reply: str, count: int) -> dict[int, str]:
+    """JSON {"1": "..."} из ответа (модель может обернуть его в ```json)."""
+    start, end = reply.find("{"), reply.rfind("}")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        data = json.loads(reply[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    out = {}
+    for i in range(1, count + 1):
+        value = data.get(str(i))
+        if isinstance(value, str) and value.strip():
+            out[i] = _clip(value, MAX_SUMMARY_CHARS)
+    return out
+
+
+async def _summarize_batch(client, batch: list[tuple[str, str]], sem: asyncio.Semaphore) -> dict[str, str]:
+    """Один запрос на пачку; {hash: пересказ} для разобранных, пусто при ошибке."""
+    prompt = "\n\n".join(f"[{i}]\n{text}" for i, (_, text) in enumerate(batch, start=1))
+    async with sem:
+        try:
+            resp = await client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+            )
+            reply = resp.choices[0].message.content or ""
+        except Exception as e:
+            logger.warning("Summaries: LLM request (%s items) failed: %s", len(batch), e)
+            return {}
+    parsed = parse_reply(reply, len(batch))
+    if len(parsed) < len(batch):
+        logger.info("Summaries: LLM answered %s of %s items", len(parsed), len(batch))
+    return {batch[i - 1][0]: summary for i, summary in parsed.items()}
+
+
+def _pending(path: str | None, limit: int, upgrade: bool) -> list[tuple[int, str]]:
+    where = "ai_summary_model = 'extractive'" if upgrade else "ai_summary IS NULL AND ai_summary_model IS NULL"
+    with connect(path, readonly=True) as conn:
+        return [(r[0], r[1] or "") for r in conn.execute(f"SELECT id, content FROM raw WHERE {where} ORDER BY id LIMIT ?", (limit,))]
+
+
+def _cached(path: str | None, hashes: list[str]) -> dict[str, tuple[str, str]]:
+    out = {}
+    with connect(path, readonly=True) as conn:
+        for start in range(0, len(hashes), 500):
+            part = hashes[start:start + 500]
+            for r in conn.execute(
+                f"SELECT hash, summary, model FROM summary_cache WHERE hash IN ({','.join('?' * len(part))})", part
+            ):
+                out[r[0]] = (r[1], r[2])
+    return out
+
+
+def _store(path: str | None, rows: list[tuple[str | None, str, int]], cache: list[tuple[str, str, str]], upgrade: bool) -> None:
+    """rows: (ai_summary, model, id); cache: (hash, summary, model) — только пересказы LLM."""
+    guard = "ai_summary_model = 'extractive'" if upgrade else "ai_summary IS NULL AND ai_summary_model IS NULL"
+    now = datetime.utcnow().isoformat()
+    with connect(path) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO summary_cache (hash, summary, model, created_at) VALUES (?, ?, ?, ?)",
+            [(*c, now) for c in cache],
+        )
+        conn.executemany(f"UPDATE raw SET ai_summary = ?, ai_summary_model = ? WHERE id = ? AND {guard}", rows)
+
+
+async def summarize_pending(path: str | None = None, limit: int = LIMIT, llm: bool = True, upgrade: bool = False) -> dict:
+    """Один проход: до limit строк без пересказа. Возвращает счётчики."""
+    t0 = time.perf_counter()
+    rows = await run_read(_pending, path, limit, upgrade)
+    stats = {"rows": len(rows), "short": 0, "cache_hits": 0, "llm_requests": 0, "llm_items": 0, "extractive": 0}
+    updates: list[tuple[str | None, str, int]] = []
+    todo: dict[str, list[tuple[int, str]]] = {}  # hash -> строки с этим текстом
+    for rid, text in rows:
+        if len(text.strip()) < MIN_CHARS and not upgrade:
+            updates.append((None, SHORT, rid))
+            stats["short"] += 1
+        else:
+            todo.setdefault(content_hash(text), []).append((rid, text))
+
+    cached = await run_read(_cached, path, list(todo)) if todo else {}
+    for h, (summary, model) in cached.items():
+        for rid, _ in todo.pop(h):
+            updates.append((summary, model, rid))
+            stats["cache_hits"] += 1
+
+    results: dict[str, str] = {}
+    client = _llm_client() if llm and todo else None
+    if client is not None:
+        batches = pack_batches([(h, group[0][1]) for h, group in todo.items()])
+        sem = asyncio.Semaphore(max(1, CONCURRENCY))
+        for part in await asyncio.gather(*(_summarize_batch(client, b, sem) for b in batches)):
+            results.update(part)
+        stats["llm_requests"] = len(batches)
+        stats["llm_items"] = len(results)
+        await client.close()
+    new_cache = []
+    for h, group in todo.items():
+        if h in results:
+            summary, model = results[h], MODEL
+            new_cache.append((h, summary, model))
+        elif upgrade:
+            continue  # экстрактивный пересказ уже есть
+        else:
+            summary, model = extractive_summary(group[0][1]), EXTRACTIVE
+            stats["extractive"] += len(group)
+        updates.extend((summary, model, rid) for rid, _ in group)
+
+    if updates:
+        await run_write(_store, path, updates, new_cache, upgrade)
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 2)
+    if rows:
+        logger.info("Summaries: %s", stats)
+    return stats
+
+
+async def _run_all(args) -> None:
+    from db.aio import shutdown
+
+    total = Counter()
+    try:
+        while True:
+            stats = await summarize_pending(limit=args.limit, llm=not args.offline, upgrade=args.upgrade)
+            total.update({k: v for k, v in stats.items() if k != "elapsed_s"})
+            print(f"  {stats}", flush=True)
+            if stats["rows"] < args.limit or args.once:
+                break
+            if args.upgrade and stats["llm_items"] == 0:
+                break  # LLM недоступен — экстрактивные остаются как есть
+    finally:
+        shutdown(wait=True)
+    print(f"total: {dict(total)}")
+
+
+def main() -> None:
+    """python -m bot.summarize [--limit N] [--once] [--offline] [--upgrade]"""
+    ap = argparse.ArgumentParser(description="fill raw.ai_summary")
+    ap.add_argument("--limit", type=int, default=LIMIT, help="строк за проход")
+    ap.add_argument("--once", action="store_true", help="один проход (по умолчанию — пока есть строки)")
+    ap.add_argument("--offline", action="store_true", help="без LLM, только экстрактивный пересказ")
+    ap.add_argument("--upgrade", action="store_true", help="переписать экстрактивные пересказы через LLM")
+    args = ap.parse_args()
+    import bot.collect_bot  # noqa: F401 — .env (DB_PATH, ключ LLM), как у бота
+
+    asyncio.run(_run_all(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Входящий поток на пользователя — middleware dp.message (внутренний: видит флаги хендлера):
+
+- Склейка пачек: хендлер с флагом coalesce=<batch(messages)> (текст → Raw). Первое сообщение
+  обрабатывается как обычно; следующее, пришедшее меньше чем через BURST_WINDOW_MS после предыдущего,
+  и все за ним копятся до паузы BURST_WINDOW_MS (или BURST_MAX_ITEMS) и уходят в batch одним вызовом:
+  одна транзакция, один ответ «✓ 47 в Raw». Пересланные из чатов 200 сообщений — 2 ответа вместо 200
+  (пересланный текст не из канала регистрируется на тот же batch, scripts/load_burst.py --forwards)
+- Лимит: остальные хендлеры (команды) — token bucket на пользователя, THROTTLE_RATE в секунду,
+  запас THROTTLE_BURST; сверх — апдейт отбрасывается, пользователю раз в NOTICE_INTERVAL — «помедленнее».
+  Флаг throttle=False — не ограничивать (фото, видео, /raw и /diary: терять их нельзя)
+
+THROTTLE_RATE=0 / BURST_WINDOW_MS=0 — выключить лимит / склейку. Счётчики — BurstMiddleware.stats().
+
+    burst = BurstMiddleware()
+    dp.message.middleware(burst)
+    dp.message.register(on_text, F.text, flags={"coalesce": on_text_batch})
+"""
+
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message
+
+from bot.media_groups import MediaGroupCollector
+
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "1"))  # апдейтов в секунду на пользователя
+THROTTLE_BURST = int(os.getenv("THROTTLE_BURST", "10"))
+BURST_WINDOW = float(os.getenv("BURST_WINDOW_MS", "1500")) / 1000
+BURST_MAX_ITEMS = int(os.getenv("BURST_MAX_ITEMS", "100"))
+NOTICE_INTERVAL = 30.0
+MAX_TRACKED_USERS = 10000
+
+logger = logging.getLogger(__name__)
+
+
+class BurstMiddleware(BaseMiddleware):
+    def __init__(
+        self,
+        rate: float = THROTTLE_RATE,
+        burst: int = THROTTLE_BURST,
+        window: float = BURST_WINDOW,
+        max_items: int = BURST_MAX_ITEMS,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.window = window
+        self._buckets: dict[int, list[float]] = {}  # user_id -> [токены, время, последнее «помедленнее»]
+        self._last: dict[tuple, float] = {}  # (chat, user, batch) -> время последнего склеиваемого сообщения
+        self._bursts = MediaGroupCollector(self._run_batch, window=window, max_items=max_items)
+        self.passed = 0
+        self.merged = 0
+        self.batches = 0
+        self.dropped = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: dict[str, Any],
+    ) -> Any:
+        user_id = event.from_user.id if event.from_user else event.chat.id
+        batch = get_flag(data, "coalesce")
+        if batch is not None:
+            if self.window > 0 and self._coalesce(event, user_id, batch):
+                return None
+        elif get_flag(data, "throttle", default=True) and self.rate > 0 and not self._allow(user_id):
+            self.dropped += 1
+            await self._notice(event, user_id)
+            return None
+        self.passed += 1
+        return await handler(event, data)
+
+    def _coalesce(self, event: Message, user_id: int, batch: Callable) -> bool:
+        """True — сообщение ушло в пачку, хендлер не вызываем."""
+        key = (event.chat.id, user_id, batch)
+        now = time.monotonic()
+        last = self._last.get(key)
+        self._last[key] = now
+        if len(self._last) > MAX_TRACKED_USERS:
+            self._last = {k: t for k, t in self._last.items() if now - t < self.window}
+        if key not in self._bursts and (last is None or now - last >= self.window):
+            return False
+        self._bursts.add(event, key=key, batch=batch)
+        self.merged += 1
+        return True
+
+    async def _run_batch(self, messages: list[Message], batch: Callable) -> None:
+        self.batches += 1
+        await batch(messages)
+
+    def _allow(self, user_id: int) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) > MAX_TRACKED_USERS:
+                # Полные bucket'ы (давно молчавшие пользователи) ничего не помнят — их можно забыть
+                self._buckets = {u: b for u, b in self._buckets.items() if b[0] + (now - b[1]) * self.rate < self.burst}
+            bucket = self._buckets[user_id] = [float(self.burst), now, 0.0]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    async def _notice(self, event: Message, user_id: int) -> None:
+        bucket = self._buckets[user_id]
+        now = time.monotonic()
+        if now - bucket[2] < NOTICE_INTERVAL:
+            return
+        bucket[2] = now
+        logger.info("Throttling user_id=%s (dropped so far: %s)", user_id, self.dropped)
+        try:
+            await event.reply("Слишком много команд подряд — часть пропускаю. Подожди несколько секунд.")
+        except Exception as e:
+            logger.debug("Throttle notice failed: %s", e)
+
+    async def flush(self) -> None:
+        """Отдать накопленные пачки (остановка бота)."""
+        await self._bursts.flush()
+
+    def stats(self) -> dict:
+        return {"passed": self.passed, "merged": self.merged, "batches": self.batches, "dropped": self.dropped,
+                "pending_batches": self._bursts.pending}
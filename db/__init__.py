@@ -0,0 +1,114 @@
+"""
+Общий слой доступа к SQLite для бота и API.
+WAL-журнал, busy_timeout, synchronous=NORMAL, mmap и кэш страниц;
+соединения переиспользуются внутри потока (небольшой пул на поток).
+API читает через read-only соединения (readonly=True).
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parent.parent
+
+# Сколько ждать блокировку писателя, мс (вместо мгновенного «database is locked»)
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Кэш страниц на соединение, КиБ (отрицательное значение в PRAGMA cache_size = КиБ)
+CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+# Память под mmap, байт. 0 — выключить.
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+# Сколько разных БД (путь + режим) держать открытыми в одном потоке
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+
+_local = threading.local()
+
+
+def get_db_path() -> str:
+    return os.getenv("DB_PATH", str(BASE / "db" / "collect.db"))
+
+
+def _apply_pragmas(conn: sqlite3.Connection, readonly: bool) -> None:
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if not readonly:
+        # journal_mode хранится в файле БД: достаточно писателю выставить один раз
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+
+
+def open_connection(path: str | None = None, readonly: bool = False) -> sqlite3.Connection:
+    """Новое соединение с нашими PRAGMA (без пула). Для фоновых задач и скриптов."""
+    path = path or get_db_path()
+    if readonly:
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    else:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # IMMEDIATE: писатель берёт RESERVED-лок сразу, без апгрейда read → write (источник SQLITE_BUSY в WAL)
+        conn = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level="IMMEDIATE", check_same_thread=False
+        )
+    conn.row_factory = sqlite3.Row
+    _apply_pragmas(conn, readonly)
+    return conn
+
+
+def _pool() -> OrderedDict:
+    pool = getattr(_local, "pool", None)
+    # После fork (gunicorn) соединения родителя использовать нельзя
+    if pool is None or getattr(_local, "pid", None) != os.getpid():
+        pool = OrderedDict()
+        _local.pool = pool
+        _local.pid = os.getpid()
+    return pool
+
+
+def get_connection(path: str | None = None, readonly: bool = False) -> sqlite3.Connection:
+    """Соединение из пула текущего потока (создаётся при первом обращении)."""
+    key = (os.path.abspath(path or get_db_path()), readonly)
+    pool = _pool()
+    conn = pool.get(key)
+    if conn is not None:
+        pool.move_to_end(key)
+        return conn
+    conn = open_connection(key[0], readonly=readonly)
+    pool[key] = conn
+    while len(pool) > POOL_SIZE:
+        _, old = pool.popitem(last=False)
+        old.close()
+    return conn
+
+
+@contextmanager
+def connect(path: str | None = None, readonly: bool = False):
+    """
+    with connect(DB_PATH) as conn: ... — как sqlite3.connect в контексте:
+    commit при успешном выходе, rollback при исключении. Соединение остаётся в пуле.
+    """
+    conn = get_connection(path, readonly=readonly)
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        if conn.in_transaction:
+            conn.commit()
+
+
+def close_thread_connections() -> None:
+    """Закрывает соединения пула текущего потока (тесты, завершение воркера)."""
+    pool = getattr(_local, "pool", None)
+    if not pool:
+        return
+    while pool:
+        _, conn = pool.popitem()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,54 @@
+"""
+Асинхронный доступ к SQLite для aiogram-хендлеров и задач планировщика.
+Записи идут через один выделенный поток-писатель (очередь ThreadPoolExecutor),
+чтения — через небольшой пул потоков. Event loop не блокируется на диске.
+
+    raw_id = await run_write(save_raw, user_id, chat_id, text)
+    n = await run_read(get_fallback_unused_count_for_user, user_id)
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+READ_WORKERS = int(os.getenv("SQLITE_READ_WORKERS", "4"))
+
+_writer: ThreadPoolExecutor | None = None
+_readers: ThreadPoolExecutor | None = None
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    if _writer is None:
+        # Один поток: записи сериализуются в порядке поступления, без борьбы за лок SQLite
+        _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+    return _writer
+
+
+def _get_readers() -> ThreadPoolExecutor:
+    global _readers
+    if _readers is None:
+        _readers = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="db-reader")
+    return _readers
+
+
+async def run_write(fn, *args, **kwargs):
+    """Выполняет fn(*args, **kwargs) в потоке-писателе."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_writer(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_read(fn, *args, **kwargs):
+    """Выполняет fn(*args, **kwargs) в пуле читателей."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_readers(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown(wait: bool = True) -> None:
+    """Дожидается очереди записей и останавливает потоки (on_shutdown диспетчера)."""
+    global _writer, _readers
+    for ex in (_writer, _readers):
+        if ex is not None:
+            ex.shutdown(wait=wait)
+    _writer = _readers = None
@@ -0,0 +1,125 @@
+"""
+Кэш справочников в памяти процесса (области, проекты, цели, ключевые слова классификатора).
+
+Инвалидация по счётчикам версий: триггеры на INSERT/UPDATE/DELETE таблиц из VERSIONED_TABLES
+(db/migrations.py) увеличивают cache_versions.version, кто бы ни писал — бот, воркер gunicorn,
+скрипт, sqlite3 в консоли. Запись кэша помнит версии своих таблиц и при несовпадении считается
+заново. Версии перечитываются одним запросом не чаще раза в CACHE_CHECK_MS на БД: чужие правки
+видны не позже чем через CACHE_CHECK_MS, свои — сразу после invalidate().
+
+    @cached("rapa_areas")
+    def get_all_areas(user_id: int, path: str | None = None) -> list[dict]: ...
+
+    metrics()  # {"get_all_areas": {"hits", "misses", "stale", "size"}, ...}
+"""
+
+import functools
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable
+
+from db import connect, get_db_path
+
+CHECK_INTERVAL = float(os.getenv("CACHE_CHECK_MS", "1000")) / 1000
+MAX_ENTRIES = 512  # на функцию; при переполнении кэш функции очищается целиком
+
+# Таблицы с триггерами версий (миграция 014)
+VERSIONED_TABLES = ("rapa_areas", "rapa_projects", "rapa_goals", "rapa_keywords")
+
+_lock = threading.Lock()
+_versions: dict[str, tuple[float, dict[str, int]]] = {}  # path -> (когда проверено, {таблица: версия})
+_caches: list["_Cache"] = []
+
+
+def versions(path: str | None = None) -> dict[str, int] | None:
+    """Версии таблиц (из памяти, если проверяли меньше CHECK_INTERVAL назад). None — таблицы версий нет."""
+    path = path or get_db_path()
+    now = time.monotonic()
+    known = _versions.get(path)
+    if known is not None and now - known[0] < CHECK_INTERVAL:
+        return known[1]
+    try:
+        with connect(path, readonly=True) as conn:
+            current = {r[0]: r[1] for r in conn.execute("SELECT name, version FROM cache_versions")}
+    except sqlite3.Error:
+        # БД до миграции: без счётчиков не кэшируем
+        return None
+    _versions[path] = (now, current)
+    return current
+
+
+def invalidate(path: str | None = None) -> None:
+    """Перечитать версии при следующем обращении (после своей записи в справочник)."""
+    _versions.pop(path or get_db_path(), None)
+
+
+class _Cache:
+    def __init__(self, fn: Callable, tables: tuple[str, ...]):
+        self.fn = fn
+        self.tables = tables
+        self.entries: dict[tuple, tuple[tuple, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, path: str | None, args: tuple, kwargs: dict) -> Any:
+        path = path or get_db_path()
+        current = versions(path)
+        if current is None:
+            self.misses += 1
+            return self.fn(*args, path=path, **kwargs)
+        stamp = tuple(current.get(t, -1) for t in self.tables)
+        key = (path, args, tuple(sorted(kwargs.items())))
+        with _lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self.hits += 1
+                return _copy(entry[1])
+            self.misses += 1
+            if entry is not None:
+                self.stale += 1
+        value = self.fn(*args, path=path, **kwargs)
+        with _lock:
+            if len(self.entries) >= MAX_ENTRIES:
+                self.entries.clear()
+            self.entries[key] = (stamp, value)
+        return _copy(value)
+
+    def clear(self) -> None:
+        with _lock:
+            self.entries.clear()
+
+
+def _copy(value: Any) -> Any:
+    # Строки справочников — плоские dict: вызывающий может их менять, кэш — нет
+    if isinstance(value, list):
+        return [dict(v) if isinstance(v, dict) else v for v in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def cached(*tables: str) -> Callable:
+    """Декоратор: функция с аргументом path=None, результат зависит только от таблиц tables."""
+
+    def wrap(fn: Callable) -> Callable:
+        cache = _Cache(fn, tables)
+        _caches.append(cache)
+
+        @functools.wraps(fn)
+        def wrapper(*args, path: str | None = None, **kwargs):
+            return cache.get(path, args, kwargs)
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return wrap
+
+
+def metrics() -> dict:
+    """Попадания/промахи по функциям; stale — промахи из-за сменившейся версии."""
+    with _lock:
+        return {c.fn.__name__: {"hits": c.hits, "misses": c.misses, "stale": c.stale, "size": len(c.entries)}
+                for c in _caches}
@@ -0,0 +1,303 @@
+"""
+Версионные миграции схемы по PRAGMA user_version.
+Запускаются один раз при старте (init_db бота, старт API); горячие пути DDL не выполняют.
+Новая миграция — новая функция в конце MIGRATIONS, старые не меняем.
+"""
+
+import logging
+import sqlite3
+from pathlib import Path
+
+from db import connect
+
+logger = logging.getLogger(__name__)
+
+SQL_DIR = Path(__file__).resolve().parent
+
+
+def run_script(conn: sqlite3.Connection, sql: str) -> None:
+    """Выполняет SQL-скрипт по одному оператору — внутри текущей транзакции (executescript её коммитит)."""
+    stmt = ""
+    for line in sql.splitlines(keepends=True):
+        stmt += line
+        if sqlite3.complete_statement(stmt):
+            if stmt.strip().strip(";").strip():
+                conn.execute(stmt)
+            stmt = ""
+    if stmt.strip() and not stmt.strip().startswith("--"):
+        conn.execute(stmt)
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> None:
+    """ALTER TABLE ADD COLUMN, если колонки ещё нет (старые БД без user_version)."""
+    if column in table_columns(conn, table):
+        return
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    logger.info("Added %s.%s", table, column)
+
+
+def add_version_triggers(conn: sqlite3.Connection, table: str) -> None:
+    """Счётчик cache_versions[table]: +1 триггером на любой INSERT/UPDATE/DELETE в table."""
+    conn.execute("INSERT OR IGNORE INTO cache_versions (name) VALUES (?)", (table,))
+    for op in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version AFTER {op} ON {table}
+            BEGIN UPDATE cache_versions SET version = version + 1 WHERE name = '{table}'; END
+        """)
+
+
+def _m001_collect(conn: sqlite3.Connection) -> None:
+    """collect_entries, fallback_photos, raw, sprint_reports + колонки старых версий."""
+    run_script(conn, (SQL_DIR / "init.sql").read_text(encoding="utf-8"))
+    add_column(conn, "collect_entries", "published_to_channel", "INTEGER DEFAULT 0")
+    add_column(conn, "collect_entries", "media_type", "TEXT DEFAULT 'photo'")
+    add_column(conn, "fallback_photos", "media_type", "TEXT DEFAULT 'photo'")
+    add_column(conn, "raw", "tags", "TEXT")
+    run_script(conn, """
+        CREATE INDEX IF NOT EXISTS idx_collect_published ON collect_entries(published_to_channel);
+        CREATE TABLE IF NOT EXISTS sprint_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sprint_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            submitted_at TEXT NOT NULL,
+            UNIQUE(sprint_id, user_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_sprint_reports_id ON sprint_reports(sprint_id, user_id);
+    """)
+
+
+def _m002_rapa(conn: sqlite3.Connection) -> None:
+    """RAPA: rapa_schema.sql, колонки raw/areas/projects, дефолтные области."""
+    from bot.rapa import init_rapa_schema
+    init_rapa_schema(conn)
+
+
+def _m003_evernote(conn: sqlite3.Connection) -> None:
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS evernote_tokens (
+            user_id INTEGER PRIMARY KEY,
+            access_token TEXT NOT NULL,
+            note_store_url TEXT,
+            expires_at TEXT,
+            updated_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS evernote_oauth_state (
+            request_token TEXT PRIMARY KEY,
+            request_token_secret TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+    """)
+
+
+def _m004_raw_fts(conn: sqlite3.Connection) -> None:
+    """FTS5-индекс raw_fts + триггеры синхронизации."""
+    run_script(conn, (SQL_DIR / "raw_fts.sql").read_text(encoding="utf-8"))
+
+
+def _m005_collect_board_index(conn: sqlite3.Connection) -> None:
+    """Покрывающий индекс для фото-доски: фильтр + сортировка + поля выдачи без чтения таблицы."""
+    run_script(conn, """
+        CREATE INDEX IF NOT EXISTS idx_collect_published_created
+            ON collect_entries(published_to_channel, created_at DESC, id DESC, media_type, comment);
+        DROP INDEX IF EXISTS idx_collect_published;
+    """)
+
+
+def _m006_collect_file_unique_id(conn: sqlite3.Connection) -> None:
+    """file_unique_id медиа — ключ дискового кэша /api/photo (api/media_cache.py)."""
+    add_column(conn, "collect_entries", "file_unique_id", "TEXT")
+
+
+def _m007_jobs(conn: sqlite3.Connection) -> None:
+    """Очередь фоновых задач API (api/jobs.py): sprint-report и др."""
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after TEXT NOT NULL,
+            locked_until TEXT,
+            locked_by TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs(status, run_after);
+    """)
+
+
+def _m008_channel_outbox(conn: sqlite3.Connection) -> None:
+    """Outbox постов в канал (bot/outbox.py): пост сначала в очередь, отправка — воркером с арендой."""
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS channel_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            source TEXT NOT NULL,
+            source_ids TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_after TEXT NOT NULL,
+            lease_until TEXT,
+            locked_by TEXT,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            sent_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_channel_outbox_status ON channel_outbox(status, run_after);
+    """)
+    add_column(conn, "collect_entries", "outbox_id", "INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_collect_outbox ON collect_entries(outbox_id) WHERE outbox_id IS NOT NULL")
+
+
+def _m009_fsm_state(conn: sqlite3.Connection) -> None:
+    """FSM-состояния бота (bot/fsm_storage.py): режимы /addstock, /rawphoto."""
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            expires_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_fsm_state_expires ON fsm_state(expires_at);
+    """)
+
+
+def _m010_collect_media_items(conn: sqlite3.Connection) -> None:
+    """Альбом (media_group_id) — одна запись: все части JSON-списком, photo_file_id — обложка."""
+    add_column(conn, "collect_entries", "media_items", "TEXT")
+
+
+def _m011_scheduler(conn: sqlite3.Connection) -> None:
+    """Задания APScheduler (bot/scheduler.py, схема как у SQLAlchemyJobStore) и аренда лидера между экземплярами бота."""
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS scheduler_jobs (
+            id TEXT PRIMARY KEY,
+            next_run_time REAL,
+            job_state BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_scheduler_jobs_next ON scheduler_jobs(next_run_time);
+        CREATE TABLE IF NOT EXISTS leader_lease (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at TEXT NOT NULL,
+            acquired_at TEXT NOT NULL
+        );
+    """)
+
+
+def _m012_rapa_keywords(conn: sqlite3.Connection) -> None:
+    """Ключевые слова классификатора Raw (bot/rapa.py) с весами — из БД, а не из кода; начальные — AREA_KEYWORDS."""
+    from bot.rapa import ensure_default_keywords
+
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS rapa_keywords (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            area_slug TEXT NOT NULL,
+            keyword TEXT NOT NULL,
+            weight REAL NOT NULL DEFAULT 1.0,
+            UNIQUE(area_slug, keyword)
+        );
+    """)
+    ensure_default_keywords(conn)
+
+
+def _m013_batch_checkpoints(conn: sqlite3.Connection) -> None:
+    """Прогресс длинных проходов по таблицам (bot/reclassify.py): последний обработанный id и счётчики — для --resume."""
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS batch_checkpoints (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            stats TEXT,
+            updated_at TEXT NOT NULL
+        );
+    """)
+
+
+def _m014_cache_versions(conn: sqlite3.Connection) -> None:
+    """Счётчики версий справочников для кэша в памяти процессов (db/cache.py): любая запись в таблицу — +1 триггером."""
+    from db.cache import VERSIONED_TABLES
+
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    for table in VERSIONED_TABLES:
+        add_version_triggers(conn, table)
+
+
+def _m015_raw_summaries(conn: sqlite3.Connection) -> None:
+    """Пересказы Raw (bot/summarize.py): чем сделан ai_summary, кэш пересказов по хэшу текста, очередь без пересказа."""
+    add_column(conn, "raw", "ai_summary_model", "TEXT")
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS summary_cache (
+            hash TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            model TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_raw_unsummarized ON raw(id) WHERE ai_summary IS NULL AND ai_summary_model IS NULL;
+    """)
+
+
+def _m016_raw_suggested_project(conn: sqlite3.Connection) -> None:
+    """Проект, предложенный для Raw по сходству текста (bot/related.py); project_id ставит пользователь."""
+    add_column(conn, "raw", "suggested_project_id", "INTEGER REFERENCES rapa_projects(id)")
+
+
+def _m017_fsm_state_version(conn: sqlite3.Connection) -> None:
+    """Счётчик версий fsm_state: кэш режимов в процессе бота сверяется с ним (запись с другого экземпляра)."""
+    add_version_triggers(conn, "fsm_state")
+
+
+# Порядок = номер версии (user_version после миграции i равен i + 1)
+MIGRATIONS = [
+    _m001_collect,
+    _m002_rapa,
+    _m003_evernote,
+    _m004_raw_fts,
+    _m005_collect_board_index,
+    _m006_collect_file_unique_id,
+    _m007_jobs,
+    _m008_channel_outbox,
+    _m009_fsm_state,
+    _m010_collect_media_items,
+    _m011_scheduler,
+    _m012_rapa_keywords,
+    _m013_batch_checkpoints,
+    _m014_cache_versions,
+    _m015_raw_summaries,
+    _m016_raw_suggested_project,
+    _m017_fsm_state_version,
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(path: str | None = None) -> int:
+    """Доводит схему до последней версии. Безопасно из нескольких процессов. Возвращает версию."""
+    with connect(path) as conn:
+        # Явный BEGIN IMMEDIATE: DDL и PRAGMA сами транзакцию не открывают; второй процесс ждёт лок
+        conn.execute("BEGIN IMMEDIATE")
+        current = schema_version(conn)
+        for version, step in enumerate(MIGRATIONS, start=1):
+            if version <= current:
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            logger.info("DB migrated to version %s (%s)", version, step.__name__)
+        return max(current, len(MIGRATIONS))
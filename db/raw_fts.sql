@@ -0,0 +1,55 @@
+-- Полнотекстовый поиск по Raw (FTS5, external content = представление raw_fts_src)
+-- unicode61 снимает диакритику только с латиницы, поэтому ё → е делаем в представлении;
+-- так индекс, 'rebuild', highlight и snippet видят один и тот же текст.
+CREATE VIEW IF NOT EXISTS raw_fts_src AS
+SELECT id,
+       replace(replace(title, 'ё', 'е'), 'Ё', 'Е') AS title,
+       replace(replace(content, 'ё', 'е'), 'Ё', 'Е') AS content,
+       replace(replace(tags, 'ё', 'е'), 'Ё', 'Е') AS tags,
+       replace(replace(ai_summary, 'ё', 'е'), 'Ё', 'Е') AS ai_summary
+FROM raw;
+
+-- Префиксные индексы 2/3 символа: поиск по началу слова ("трениров*") без полного скана словаря
+CREATE VIRTUAL TABLE IF NOT EXISTS raw_fts USING fts5(
+    title,
+    content,
+    tags,
+    ai_summary,
+    content='raw_fts_src',
+    content_rowid='id',
+    tokenize="unicode61 remove_diacritics 2 tokenchars '_'",
+    prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS raw_fts_ai AFTER INSERT ON raw BEGIN
+    INSERT INTO raw_fts (rowid, title, content, tags, ai_summary)
+    SELECT id, title, content, tags, ai_summary FROM raw_fts_src WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS raw_fts_ad AFTER DELETE ON raw BEGIN
+    INSERT INTO raw_fts (raw_fts, rowid, title, content, tags, ai_summary)
+    VALUES (
+        'delete', old.id,
+        replace(replace(old.title, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(old.content, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(old.tags, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(old.ai_summary, 'ё', 'е'), 'Ё', 'Е')
+    );
+END;
+
+-- Только при смене индексируемых полей: смена стадии RAPA не переиндексирует длинные транскрипты
+CREATE TRIGGER IF NOT EXISTS raw_fts_au AFTER UPDATE OF title, content, tags, ai_summary ON raw BEGIN
+    INSERT INTO raw_fts (raw_fts, rowid, title, content, tags, ai_summary)
+    VALUES (
+        'delete', old.id,
+        replace(replace(old.title, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(old.content, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(old.tags, 'ё', 'е'), 'Ё', 'Е'),
+        replace(replace(old.ai_summary, 'ё', 'е'), 'Ё', 'Е')
+    );
+    INSERT INTO raw_fts (rowid, title, content, tags, ai_summary)
+    SELECT id, title, content, tags, ai_summary FROM raw_fts_src WHERE id = new.id;
+END;
+
+-- Индексация уже существующих записей
+INSERT INTO raw_fts (raw_fts) VALUES ('rebuild');
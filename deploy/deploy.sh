@@ -18,7 +18,7 @@ echo "=== Avatar Collect: установка на VPS ==="
 # 1. Системные зависимости
 echo "[1/7] Установка системных пакетов..."
 sudo apt-get update
-sudo apt-get install -y python3 python3-venv python3-pip git
+sudo apt-get install -y python3 python3-venv python3-pip git ffmpeg
 
 # 2. Пользователь avatar (если нет)
 if ! id "$SERVICE_USER" &>/dev/null; then
@@ -65,8 +65,9 @@ fi
 # 7. systemd
 echo "[7/7] Установка systemd-сервиса..."
 sudo cp "$APP_DIR/deploy/collect-bot.service" /etc/systemd/system/
+sudo cp "$APP_DIR/deploy/collect-api.service" /etc/systemd/system/
 sudo systemctl daemon-reload
-sudo systemctl enable collect-bot
+sudo systemctl enable collect-bot collect-api
 
 echo ""
 echo "=== Готово ==="
@@ -75,5 +76,6 @@ echo "  1. nano $APP_DIR/.env   # укажи BOT_TOKEN"
 echo "  2. sudo systemctl start collect-bot"
 echo "  3. sudo systemctl status collect-bot"
 echo "  4. sudo journalctl -u collect-bot -f   # логи"
+echo "  5. sudo systemctl start collect-api    # API фото-доски (gunicorn); после обновления кода: systemctl reload collect-api"
 echo ""
 echo "Если была ошибка Conflict — сначала: cd $APP_DIR && ./venv/bin/python deploy/fix_webhook.py"
@@ -0,0 +1,34 @@
+"""
+gunicorn для Collect API (deploy/collect-api.service):
+    gunicorn -c deploy/gunicorn.conf.py "api.collect_api:create_app()"
+Воркеры — процессы (SQLite-пул и кэши у каждого свои), внутри — потоки gthread:
+запросы /api/photo в основном ждут диск и Telegram. Reload без простоя: systemctl reload (SIGHUP).
+"""
+
+import multiprocessing
+import os
+
+bind = f"{os.getenv('COLLECT_API_HOST', '0.0.0.0')}:{os.getenv('COLLECT_API_PORT', '8080')}"
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(4, multiprocessing.cpu_count() * 2))))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_class = "gthread"
+
+# Keep-alive: фото-доска тянет десятки превью подряд с одного соединения
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Долгое (Perplexity для sprint-report) — в фоновых задачах api/jobs.py, запросы короткие
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Плановый перезапуск воркеров — страховка от утечек (Pillow, requests)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = 500
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+proc_name = "avatar-collect-api"
+
+
+def worker_exit(server, worker):
+    """Пул ресайза превью живёт в воркере — закрываем вместе с ним."""
+    from api import thumbnails
+    thumbnails.shutdown()
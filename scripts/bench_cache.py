@@ -0,0 +1,106 @@
+"""
+Справочники RAPA с кэшем (db/cache.py) и без: Flask test client по /api/rapa/areas, /projects, /goals
+и propose_assign (поиск area_id на каждое сообщение). «Без кэша» — исходные функции (__wrapped__),
+«с кэшем» — как в проде; посередине прогона цель добавляется через POST (своя запись видна сразу).
+
+Печатает: запросов в секунду для каждого режима, hits/misses/stale кэша.
+
+Запуск: python scripts/bench_cache.py [-n 3000] [--projects 200]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+USER_ID = 1001
+
+
+def seed(path: str, projects: int) -> None:
+    from db import connect
+
+    rng = random.Random(projects)
+    now = datetime.utcnow().isoformat()
+    with connect(path) as conn:
+        areas = [r[0] for r in conn.execute("SELECT id FROM rapa_areas")]
+        conn.executemany(
+            "INSERT INTO rapa_projects (user_id, area_id, name, status, deadline, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(USER_ID, rng.choice(areas), f"Проект {i}", rng.choice(["active", "active", "done"]),
+              f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", now) for i in range(projects)],
+        )
+        conn.executemany(
+            "INSERT INTO rapa_goals (user_id, area_id, year, name, status, created_at) VALUES (?, ?, 2026, ?, 'active', ?)",
+            [(USER_ID, rng.choice(areas), f"Цель {i}", now) for i in range(20)],
+        )
+
+
+def run(label: str, client, n: int, lookup) -> None:
+    urls = ["/api/rapa/areas", "/api/rapa/projects", "/api/rapa/goals?year=2026"]
+    t0 = time.perf_counter()
+    for i in range(n):
+        if i == n // 2:
+            client.post("/api/rapa/goals", json={"name": "Новая цель", "year": 2026})
+        resp = client.get(urls[i % len(urls)])
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    api = n / (time.perf_counter() - t0)
+
+    from bot.rapa import AREA_KEYWORDS
+
+    slugs = list(AREA_KEYWORDS)
+    t0 = time.perf_counter()
+    for i in range(n):
+        lookup(USER_ID, slugs[i % len(slugs)])
+    lookups = n / (time.perf_counter() - t0)
+    print(f"  {label:>8}: API {api:7.0f} req/s   area lookup {lookups:8.0f} /s")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="RAPA reference data: version-counter cache vs direct queries")
+    ap.add_argument("-n", type=int, default=3000)
+    ap.add_argument("--projects", type=int, default=200)
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+
+    path = str(Path(tempfile.mkdtemp(prefix="avatar-cache-")) / "cache.db")
+    os.environ["DB_PATH"] = path
+    os.environ["JOBS_WORKER"] = "0"
+    import api.collect_api as ca
+    from bot import rapa
+    from db import cache, connect
+
+    ca.DB_PATH = path
+    ca.RAW_OWNER_USER_ID = USER_ID
+    client = ca.create_app().test_client()
+    seed(path, args.projects)
+    print(f"{args.projects} projects, {args.n} requests per mode")
+
+    def uncached_lookup(user_id: int, slug: str) -> int | None:
+        # Как раньше в propose_assign: запрос на каждое сообщение
+        with connect(path, readonly=True) as conn:
+            return rapa.get_area_id_by_slug(conn, user_id, slug)
+
+    def direct(fn):
+        return lambda *a, path=None, **kw: fn.__wrapped__(*a, path=path or os.environ["DB_PATH"], **kw)
+
+    cached = {name: getattr(rapa, name) for name in ("get_all_areas", "get_all_projects", "get_goals_for_year")}
+    for name, fn in cached.items():
+        setattr(rapa, name, direct(fn))
+    run("no cache", client, args.n, uncached_lookup)
+    for name, fn in cached.items():
+        setattr(rapa, name, fn)
+    run("cache", client, args.n, rapa.area_id_for)
+    for name, m in cache.metrics().items():
+        if m["hits"] or m["misses"]:
+            print(f"    {name:<20} {m}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Классификатор Raw на длинных расшифровках (как записи Plaud): старый classify_raw — any(kw in text)
+по каждому списку AREA_KEYWORDS, первая совпавшая область — против скомпилированного (bot/rapa.py):
+один регэксп из префиксного дерева основ, счёт по всем областям. Для сравнения — тот же регэксп
+плоской альтернативой (без дерева).
+
+Печатает: время на текст для каждой длины, сколько текстов задевают больше одной области и в скольких
+старый и новый выбрали разные области (старый — первую по порядку словаря, новый — с наибольшим счётом).
+
+Запуск: python scripts/bench_classify.py [--lengths 2000,20000,100000] [-n 50] [--extra-keywords 100]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+FILLER = ("ну вот значит мы сегодня говорили о том что в целом всё идёт нормально но есть нюансы и "
+          "хочется понять как двигаться дальше потому что времени мало а вопросов много").split()
+LETTERS = "абвгдежзиклмнопрстуфхцчшщэюя"
+
+
+def legacy_classify(content: str, area_keywords: dict[str, list[str]]) -> dict:
+    text = (content or "").lower().strip()
+    result = {"gtd_type": "idea", "area_slug": None, "para_type": "Raw"}
+    if any(w in text for w in ["надо", "нужно", "сделать", "проверить", "позвонить", "написать", "отправить", "купить"]):
+        result["gtd_type"] = "task"
+    for slug, keywords in area_keywords.items():
+        if any(kw in text for kw in keywords):
+            result["area_slug"] = slug
+            break
+    if result["gtd_type"] == "task" and result["area_slug"]:
+        result["para_type"] = "Project"
+    elif "ссылка" in text or "http" in text:
+        result["para_type"] = "Resource"
+    return result
+
+
+def transcript(rng: random.Random, length: int) -> str:
+    """Разговор: в основном «вода», изредка ключевые слова 1–3 областей (одна — заметно чаще)."""
+    from bot.rapa import AREA_KEYWORDS
+
+    areas = rng.sample(list(AREA_KEYWORDS), rng.randint(1, 3))
+    weights = [6, 2, 1][: len(areas)]
+    words: list[str] = []
+    size = 0
+    while size < length:
+        if rng.random() < 0.03:
+            area = rng.choices(areas, weights)[0]
+            word = rng.choice(AREA_KEYWORDS[area]) + rng.choice(["", "а", "у", "ом", "ами"])
+        else:
+            word = rng.choice(FILLER)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def timed(fn, texts: list[str]) -> tuple[float, list]:
+    t0 = time.perf_counter()
+    out = [fn(t) for t in texts]
+    return (time.perf_counter() - t0) / len(texts) * 1000, out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="RAPA classifier: nested keyword scan vs compiled scorer")
+    ap.add_argument("--lengths", default="2000,20000,100000", help="длины текстов, символов")
+    ap.add_argument("-n", type=int, default=50, help="текстов на каждую длину")
+    ap.add_argument("--extra-keywords", type=int, default=0,
+                    help="добавить в каждую область N случайных слов (словарь, выросший из rapa_keywords)")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    from bot.rapa import AREA_KEYWORDS, Classifier
+
+    rng = random.Random(args.seed)
+    area_keywords = {slug: list(kws) for slug, kws in AREA_KEYWORDS.items()}
+    for kws in area_keywords.values():
+        kws += ["".join(rng.choice(LETTERS) for _ in range(rng.randint(5, 9))) for _ in range(args.extra_keywords)]
+    keywords = {slug: [(kw, 1.0) for kw in kws] for slug, kws in area_keywords.items()}
+    clf = Classifier(keywords)
+    flat = re.compile(r"(?<!\w)(" + "|".join(sorted(map(re.escape, clf.index), key=len, reverse=True)) + r")\w*")
+
+    def flat_scores(content: str) -> dict:
+        text = content.lower().replace("ё", "е")
+        scores: dict[str, float] = {}
+        for m in flat.finditer(text):
+            for slug, weight in clf.index[m.group(1)]:
+                scores[slug] = scores.get(slug, 0.0) + weight
+        return scores
+
+    print(f"{len(clf.index)} stems, {args.n} transcripts per length")
+    for length in (int(x) for x in args.lengths.split(",")):
+        texts = [transcript(rng, length) for _ in range(args.n)]
+        old_ms, old = timed(lambda t: legacy_classify(t, area_keywords), texts)
+        flat_ms, _ = timed(flat_scores, texts)
+        new_ms, new = timed(clf.classify, texts)
+        multi = sum(1 for r in new if r["alternatives"])
+        differ = sum(1 for a, b in zip(old, new) if a["area_slug"] != b["area_slug"])
+        conf = sum(r["confidence"] for r in new) / len(new)
+        print(f"  {length:>7} chars: legacy {old_ms:7.3f} ms  flat regex {flat_ms:7.3f} ms  compiled {new_ms:7.3f} ms"
+              f"  | multi-area {multi}/{args.n}  different area {differ}/{args.n}  mean confidence {conf:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Бенчмарк слоя SQLite: вставки/сек и p99 чтения при параллельном писателе.
+Сравнивает старый режим (новое sqlite3.connect на каждый вызов, rollback journal)
+и общий слой db (WAL + PRAGMA + пул соединений на поток).
+
+Запуск: python scripts/bench_db.py [--seconds 5] [--readers 4]
+"""
+
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import db
+
+SCHEMA = (ROOT / "db" / "init.sql").read_text(encoding="utf-8")
+INSERT_SQL = (
+    "INSERT INTO raw (user_id, chat_id, title, content, source, created_at, rapa_stage) "
+    "VALUES (1, 1, ?, ?, 'Bench', ?, 'Raw')"
+)
+READ_SQL = "SELECT id, title, created_at FROM raw WHERE user_id = 1 ORDER BY created_at DESC LIMIT 50"
+
+
+def _legacy_conn(path: str, readonly: bool = False):
+    # Как было: новое соединение на каждый вызов, journal_mode по умолчанию (DELETE)
+    return sqlite3.connect(path)
+
+
+def run(mode: str, seconds: float, readers: int) -> dict:
+    tmp = tempfile.mkdtemp(prefix="avatar-bench-")
+    path = str(Path(tmp) / "bench.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(SCHEMA)
+    open_ = _legacy_conn if mode == "legacy" else db.connect
+
+    stop = threading.Event()
+    inserts = 0
+    write_errors = 0
+    read_errors = 0
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def writer():
+        nonlocal inserts, write_errors
+        i = 0
+        while not stop.is_set():
+            i += 1
+            try:
+                with open_(path) as conn:
+                    conn.execute(INSERT_SQL, (f"note {i}", "текст " * 50, datetime.utcnow().isoformat()))
+                inserts += 1
+            except sqlite3.OperationalError:
+                write_errors += 1
+        db.close_thread_connections()
+
+    def reader():
+        nonlocal read_errors
+        local: list[float] = []
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                with open_(path, readonly=True) as conn:
+                    conn.execute(READ_SQL).fetchall()
+                local.append(time.perf_counter() - t0)
+            except sqlite3.OperationalError:
+                read_errors += 1
+        with lock:
+            latencies.extend(local)
+        db.close_thread_connections()
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 if latencies else 0.0
+    return {
+        "mode": mode,
+        "inserts_per_sec": inserts / seconds,
+        "reads": len(latencies),
+        "read_p50_ms": p(0.50),
+        "read_p99_ms": p(0.99),
+        "read_mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "write_errors": write_errors,
+        "read_errors": read_errors,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--readers", type=int, default=4)
+    args = ap.parse_args()
+    for mode in ("legacy", "pooled"):
+        r = run(mode, args.seconds, args.readers)
+        print(
+            f"{r['mode']:>7}: {r['inserts_per_sec']:8.0f} inserts/s | reads {r['reads']:7d} "
+            f"p50 {r['read_p50_ms']:6.2f} ms p99 {r['read_p99_ms']:7.2f} ms | "
+            f"locked: write {r['write_errors']} read {r['read_errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
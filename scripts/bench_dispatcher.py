@@ -0,0 +1,228 @@
+"""
+Пропускная способность Collect-бота: синтетические апдейты через Dispatcher.feed_update
+с фейковой сессией Bot API (сеть не нужна). Смесь: фото, видео, текст с #тегами, /raw, /review,
+/stock, кнопка тега (callback raw_tag:). Показывает updates/s, задержку по хендлерам
+(p50/p95/p99) и максимальную задержку event loop — при блокирующих вызовах SQLite она растёт
+до длительности записи на диск.
+
+--raw-rows 1000,10000,100000 — прогон на базе с таким числом записей Raw (за последний год):
+регрессии save_raw / propose_assign / обзоров видны как рост задержки с размером базы.
+
+Запуск: python scripts/bench_dispatcher.py [-n 2000] [--concurrency 50] [--raw-rows 1000,10000,100000]
+                                          [--write-delay-ms 5] [--api-latency-ms 0]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Message, Update
+
+USER_ID = 1001
+
+
+class FakeSession(BaseSession):
+    """Сессия без сети: Message-методы возвращают фиктивное сообщение, остальные — True."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: dict[str, int] = {}
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if getattr(method, "__returning__", None) is Message:
+            self._message_id += 1
+            chat_id = getattr(method, "chat_id", USER_ID)
+            return Message.model_validate({
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id if isinstance(chat_id, int) else -100, "type": "private"},
+                "text": getattr(method, "text", None) or "",
+            })
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+
+# kind → хендлер, в который попадает апдейт (строки отчёта)
+KINDS = {
+    "photo": "on_photo",
+    "video": "on_video",
+    "text": "on_text_to_raw",
+    "raw": "cmd_raw",
+    "review": "cmd_review",
+    "stock": "cmd_stock",
+    "tag": "on_raw_tag_callback",
+}
+MIX = ["text", "text", "photo", "raw", "tag", "video", "stock", "text", "review", "photo"]
+WORDS = ("надо позвонить проект тренировка идея встреча купить книга статья код отчёт бег сон "
+         "семья работа прочитать написать сделать заметка план неделя").split()
+
+
+def make_update(update_id: int, kind: str, raw_ids: int = 0) -> Update:
+    if kind == "tag":
+        raw_id = update_id % raw_ids + 1 if raw_ids else 1
+        return Update.model_validate({"update_id": update_id, "callback_query": {
+            "id": str(update_id), "chat_instance": "bench", "data": f"raw_tag:{raw_id}:идея",
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "Bench"},
+            "message": {"message_id": update_id, "date": int(time.time()), "text": f"✓ В Raw #{raw_id}",
+                        "chat": {"id": USER_ID, "type": "private"}},
+        }})
+    base = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": USER_ID, "type": "private"},
+        "from": {"id": USER_ID, "is_bot": False, "first_name": "Bench"},
+    }
+    if kind == "text":
+        base["text"] = f"Заметка {update_id}: надо позвонить по проекту #работа"
+    elif kind == "photo":
+        base["photo"] = [{"file_id": f"photo{update_id}", "file_unique_id": f"u{update_id}", "width": 1280, "height": 960}]
+        base["caption"] = f"Срез дня {update_id}"
+    elif kind == "video":
+        base["video"] = {"file_id": f"video{update_id}", "file_unique_id": f"v{update_id}", "width": 720,
+                         "height": 1280, "duration": 7}
+    elif kind == "forward":
+        # Пересланное из чата (не канала): как пачка пересылок в личку
+        base["text"] = f"Переслано {update_id}: созвон с подрядчиком по ремонту"
+        base["forward_origin"] = {"type": "hidden_user", "sender_user_name": "Someone", "date": int(time.time())}
+    elif kind == "raw":
+        base["text"] = f"/raw идея {update_id} про тренировки"
+        base["entities"] = [{"type": "bot_command", "offset": 0, "length": 4}]
+    elif kind == "stock":
+        base["text"] = "/stock"
+        base["entities"] = [{"type": "bot_command", "offset": 0, "length": 6}]
+    elif kind == "review":
+        base["text"] = "/review weekly"
+        base["entities"] = [{"type": "bot_command", "offset": 0, "length": 7}]
+    return Update.model_validate({"update_id": update_id, "message": base})
+
+
+async def _loop_lag(stop: asyncio.Event, out: list[float]) -> None:
+    """Как часто event loop «замирает»: плановый сон 5 мс против фактического."""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.005)
+        out.append(time.perf_counter() - t0 - 0.005)
+
+
+def seed_raw(path: str, rows: int) -> None:
+    """rows записей Raw пользователя USER_ID за последний год (теги, этапы RAPA — как у живой базы)."""
+    from db import connect
+
+    rng = random.Random(rows)
+    now = datetime.utcnow()
+    stages = ["Raw", "Assign", "Assign", "Project", "Archive"]
+    tags = [None, None, "diary", "работа", "идея", "diary,работа"]
+
+    def row(i: int) -> tuple:
+        content = " ".join(rng.choices(WORDS, k=rng.randint(5, 40)))
+        created = (now - timedelta(seconds=rng.randint(0, 365 * 86400))).isoformat()
+        return (USER_ID, USER_ID, content[:80], content, "Telegram", created, rng.choice(stages), rng.choice(tags))
+
+    with connect(path) as conn:
+        for start in range(0, rows, 10000):
+            conn.executemany(
+                """
+                INSERT INTO raw (user_id, chat_id, title, content, source, created_at, rapa_stage, tags)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [row(i) for i in range(start, min(rows, start + 10000))],
+            )
+
+
+async def run(n: int, concurrency: int, write_delay: float, api_latency: float, raw_rows: int) -> None:
+    import bot.collect_bot as cb
+
+    path = str(Path(tempfile.mkdtemp(prefix="avatar-bench-")) / "bench.db")
+    os.environ["DB_PATH"] = path
+    cb.DB_PATH = path
+    cb.CHANNEL_ID = None
+    cb.init_db()
+    t0 = time.perf_counter()
+    seed_raw(path, raw_rows)
+    seed_s = time.perf_counter() - t0
+
+    original = cb.save_raw
+    if write_delay:
+        def slow_save_raw(*args, **kwargs):
+            time.sleep(write_delay)  # медленный диск: блокирует поток, в котором выполняется
+            return original(*args, **kwargs)
+        cb.save_raw = slow_save_raw
+
+    session = FakeSession(latency=api_latency)
+    bot = Bot(token="42:BENCH", session=session)
+    dp = cb.create_dispatcher(bot)
+
+    kinds = [MIX[i % len(MIX)] for i in range(1, n + 1)]
+    updates = [make_update(i, kind, raw_rows) for i, kind in enumerate(kinds, start=1)]
+    latencies: dict[str, list[float]] = {KINDS[k]: [] for k in dict.fromkeys(MIX)}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def feed(kind: str, upd: Update) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            await dp.feed_update(bot, upd)
+            latencies[KINDS[kind]].append(time.perf_counter() - t0)
+
+    stop = asyncio.Event()
+    lag: list[float] = []
+    lag_task = asyncio.create_task(_loop_lag(stop, lag))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(feed(k, u) for k, u in zip(kinds, updates)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await lag_task
+
+    print(f"raw rows {raw_rows} (seeded in {seed_s:.1f}s): {n} updates in {elapsed:.2f}s → {n / elapsed:.0f} updates/s "
+          f"(concurrency {concurrency}, write delay {write_delay * 1000:.0f} ms)")
+    for handler, vals in latencies.items():
+        vals.sort()
+        if vals:
+            pick = lambda q: vals[min(len(vals) - 1, int(len(vals) * q))] * 1000
+            print(f"  {handler:>20}: n={len(vals):6d} p50 {pick(0.5):7.2f} ms p95 {pick(0.95):7.2f} ms p99 {pick(0.99):7.2f} ms")
+    print(f"  event loop lag: max {max(lag, default=0) * 1000:.1f} ms")
+    print(f"  Bot API calls: {session.calls}")
+    cb.save_raw = original
+    await cb.on_shutdown()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Dispatcher throughput")
+    ap.add_argument("-n", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=50)
+    ap.add_argument("--write-delay-ms", type=float, default=0.0)
+    ap.add_argument("--api-latency-ms", type=float, default=0.0)
+    ap.add_argument("--raw-rows", default="1000", help="записей Raw в базе, через запятую: 1000,10000,100000")
+    args = ap.parse_args()
+    # Пропускная способность хендлеров: без лимита на пользователя и склейки пачек (bot/throttling.py)
+    os.environ.setdefault("THROTTLE_RATE", "0")
+    os.environ.setdefault("BURST_WINDOW_MS", "0")
+    import logging
+    logging.disable(logging.WARNING)
+    for rows in (int(x) for x in args.raw_rows.split(",")):
+        asyncio.run(run(args.n, args.concurrency, args.write_delay_ms / 1000, args.api_latency_ms / 1000, rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Стоимость FSM-состояния на апдейт: MemoryStorage (как было — состояние в памяти процесса)
+против SQLiteStorage (bot/fsm_storage.py) с кэшем и без кэша.
+
+1) get_state / set_state по одному: мкс на операцию (кэш-промах, попадание, запись)
+2) Dispatcher.feed_update с фейковой сессией Bot API (как в bench_dispatcher.py): /stock
+   от разных пользователей — FSM-middleware читает состояние на каждом апдейте
+3) «Рестарт»: режим, выставленный одним экземпляром хранилища, виден новому; и второму экземпляру,
+   у которого в кэше уже лежит «состояния нет»
+
+Запуск: python scripts/bench_fsm.py [-n 5000] [--users 200] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from aiogram import Bot
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+from bench_dispatcher import FakeSession
+
+BOT_ID = 42
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=BOT_ID, chat_id=user_id, user_id=user_id)
+
+
+def stock_update(update_id: int, user_id: int) -> Update:
+    return Update.model_validate({"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": "/stock",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+    }})
+
+
+async def micro(storages: dict, n: int, users: int) -> None:
+    print(f"get_state/set_state, {n} ops over {users} users (µs/op)")
+    for name, storage in storages.items():
+        row = []
+        t0 = time.perf_counter()
+        for i in range(n):
+            await storage.set_state(key(i % users), "Mode:adding_stock" if i % 2 else None)
+        row.append(("set", (time.perf_counter() - t0) / n))
+        if hasattr(storage, "_cache"):
+            storage._cache.clear()
+        t0 = time.perf_counter()
+        for i in range(users):
+            await storage.get_state(key(i))
+        row.append(("get cold", (time.perf_counter() - t0) / users))
+        t0 = time.perf_counter()
+        for i in range(n):
+            await storage.get_state(key(i % users))
+        row.append(("get warm", (time.perf_counter() - t0) / n))
+        print(f"  {name:>16}: " + "  ".join(f"{label} {v * 1e6:8.1f}" for label, v in row))
+
+
+async def dispatcher(storages: dict, n: int, users: int, concurrency: int) -> None:
+    import bot.collect_bot as cb
+
+    print(f"feed_update /stock, {n} updates from {users} users, concurrency {concurrency}")
+    for name, storage in storages.items():
+        session = FakeSession()
+        bot = Bot(token=f"{BOT_ID}:BENCH", session=session)
+        dp = cb.create_dispatcher(bot)
+        dp.fsm.storage = storage
+        if hasattr(storage, "_cache"):
+            storage._cache.clear()
+        updates = [stock_update(i, 1000 + i % users) for i in range(1, n + 1)]
+        sem = asyncio.Semaphore(concurrency)
+        lat: list[float] = []
+
+        async def feed(upd: Update) -> None:
+            async with sem:
+                t0 = time.perf_counter()
+                await dp.feed_update(bot, upd)
+                lat.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(feed(u) for u in updates))
+        elapsed = time.perf_counter() - t0
+        lat.sort()
+        pick = lambda q: lat[min(len(lat) - 1, int(len(lat) * q))] * 1000
+        hits = f"  cache hits {storage.hits}, misses {storage.misses}" if hasattr(storage, "hits") else ""
+        print(f"  {name:>16}: {n / elapsed:6.0f} updates/s  p50 {pick(0.5):6.2f} ms  p99 {pick(0.99):6.2f} ms{hits}")
+
+
+async def restart_check() -> None:
+    from bot.fsm_storage import SQLiteStorage
+
+    a = SQLiteStorage()
+    await a.set_state(key(7), "Mode:adding_raw")
+    await a.set_data(key(7), {"since": "bench"})
+    b = SQLiteStorage()  # новый процесс: пустой кэш
+    print(f"restart: state {await b.get_state(key(7))!r}, data {await b.get_data(key(7))}")
+    assert await b.get_state(key(8)) is None  # b кэширует «состояния нет»
+    await a.set_state(key(8), "Mode:adding_stock")
+    print(f"other instance: state {await b.get_state(key(8))!r} right after a's /addstock")
+
+
+async def run(n: int, users: int, concurrency: int) -> None:
+    path = str(Path(tempfile.mkdtemp(prefix="avatar-fsm-")) / "fsm.db")
+    os.environ["DB_PATH"] = path
+    import bot.collect_bot as cb
+    from bot.fsm_storage import SQLiteStorage
+
+    cb.DB_PATH = path
+    cb.CHANNEL_ID = None
+    cb.init_db()
+    storages = {"memory": MemoryStorage(), "sqlite + cache": SQLiteStorage(), "sqlite, no cache": SQLiteStorage(cache_ttl=0)}
+    await micro(storages, n, users)
+    await dispatcher(storages, n, users, concurrency)
+    await restart_check()
+    await cb.on_shutdown()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="FSM storage overhead")
+    ap.add_argument("-n", type=int, default=5000)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=50)
+    args = ap.parse_args()
+    # Пропускная способность хендлеров: без лимита на пользователя и склейки пачек (bot/throttling.py)
+    os.environ.setdefault("THROTTLE_RATE", "0")
+    os.environ.setdefault("BURST_WINDOW_MS", "0")
+    import logging
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args.n, args.users, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
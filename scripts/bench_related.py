@@ -0,0 +1,123 @@
+"""
+Индекс похожих (bot/related.py) на --rows записях Raw: полная сборка, добавление по одной записи
+(как save_raw → propose_assign), запрос похожих и предложение проекта. Часть записей пишется
+«про проект» (слова из его названия и результата) — по ним считается, как часто предложен верный проект.
+
+Печатает: время rebuild, p50/p95 добавления и запросов в мс, размер индекса, точность предложений.
+
+Запуск: python scripts/bench_related.py [--rows 100000] [--queries 300] [--dim 512]
+"""
+
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from load_summarize import transcript  # noqa: E402
+
+USER_ID = 1001
+PROJECTS = [
+    ("Переезд в новый офис", "офис на Тверской, мебель, интернет, договор аренды"),
+    ("Запуск мобильного приложения", "релиз в App Store, тестировщики, push-уведомления"),
+    ("Подготовка к полумарафону", "беговые тренировки, интервалы, пульс, кроссовки"),
+    ("Интеграция с банком", "API банка, эквайринг, сертификаты, платёжный шлюз"),
+    ("Ремонт на даче", "крыша, забор, бригада, смета на материалы"),
+    ("Книга про привычки", "главы, редактор, издательство, рукопись"),
+]
+
+
+def pct(values: list[float], q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+def about(rng: random.Random, project: tuple[str, str]) -> str:
+    words = (project[0] + " " + project[1]).replace(",", "").split()
+    return transcript(rng, rng.randint(2, 5)) + " " + " ".join(rng.sample(words, min(len(words), 6))) + "."
+
+
+def seed(path: str, rows: int, rng: random.Random) -> list[int]:
+    from db import connect
+
+    now = datetime.utcnow().isoformat()
+    with connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO rapa_projects (user_id, name, outcome, status, created_at) VALUES (?, ?, ?, 'active', ?)",
+            [(USER_ID, name, outcome, now) for name, outcome in PROJECTS],
+        )
+        project_ids = [r[0] for r in conn.execute("SELECT id FROM rapa_projects ORDER BY id")]
+        for start in range(0, rows, 10000):
+            texts = [transcript(rng, rng.randint(2, 12)) for _ in range(min(10000, rows - start))]
+            conn.executemany(
+                "INSERT INTO raw (user_id, chat_id, title, content, source, created_at, rapa_stage) VALUES (?, 1, ?, ?, 'Plaud', ?, 'Raw')",
+                [(USER_ID, t[:80], t, now) for t in texts],
+            )
+    return project_ids
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="related-items index: build, incremental add, query latency")
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+
+    path = str(Path(tempfile.mkdtemp(prefix="avatar-related-")) / "related.db")
+    os.environ.update({"DB_PATH": path, "RELATED_DIM": str(args.dim)})
+    from bot import related
+    from db import connect
+    from db.migrations import migrate
+
+    migrate(path)
+    rng = random.Random(args.seed)
+    t0 = time.perf_counter()
+    project_ids = seed(path, args.rows, rng)
+    print(f"{args.rows} raw rows seeded in {time.perf_counter() - t0:.1f} s, dim {args.dim}")
+
+    stats = related.rebuild(path)
+    index = related.get_index(path)
+    index.refresh()
+    size = sum(f.stat().st_size for f in index.dir.iterdir()) / 2**20
+    print(f"  rebuild: {stats['seconds']:.1f} s ({args.rows / stats['seconds']:.0f} rows/s), index {size:.0f} MiB")
+
+    # Добавление по одной (save_raw): INSERT + вектор в индекс + предложенный проект
+    add, hits = [], 0
+    now = datetime.utcnow().isoformat()
+    for i in range(args.queries):
+        n = rng.randrange(len(PROJECTS))
+        text = about(rng, PROJECTS[n])
+        with connect(path) as conn:
+            rid = conn.execute(
+                "INSERT INTO raw (user_id, chat_id, title, content, source, created_at, rapa_stage) VALUES (?, 1, ?, ?, 'Plaud', ?, 'Raw')",
+                (USER_ID, text[:80], text, now),
+            ).lastrowid
+        t0 = time.perf_counter()
+        project = related.suggest_project(related.index_raw(rid, USER_ID, text, path), USER_ID, path)
+        add.append(time.perf_counter() - t0)
+        hits += bool(project and project["project_id"] == project_ids[n])
+    print(f"  add + suggest: p50 {pct(add, 0.5):6.2f} ms  p95 {pct(add, 0.95):6.2f} ms   "
+          f"right project {hits}/{args.queries}")
+
+    query = []
+    for _ in range(args.queries):
+        rid = rng.randint(1, args.rows)
+        t0 = time.perf_counter()
+        items = related.related_items(rid, USER_ID, k=10, path=path)
+        query.append(time.perf_counter() - t0)
+        assert items is not None
+    print(f"  related k=10:  p50 {pct(query, 0.5):6.2f} ms  p95 {pct(query, 0.95):6.2f} ms  "
+          f"(mean {statistics.mean(query) * 1000:.2f} ms over {index.meta['count']} vectors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Микробенчмарк save_raw: до и после одноразовых миграций.
+«До» воспроизводит старый propose_assign: на каждую запись читает rapa_schema.sql,
+executescript, дюжина ALTER TABLE с проглоченной ошибкой и 8 INSERT OR IGNORE областей.
+
+Запуск: python scripts/bench_save_raw.py [-n 2000]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+TEXT = "Надо позвонить партнёру по проекту, обсудить договор и дедлайн спринта #работа"
+
+
+def _legacy_init_rapa_schema(conn: sqlite3.Connection) -> None:
+    from bot.rapa import SUPERHERO_AREAS
+
+    conn.executescript((ROOT / "db" / "rapa_schema.sql").read_text(encoding="utf-8"))
+    alters = [
+        ("rapa_areas", "type", "TEXT"), ("rapa_areas", "goal", "TEXT"),
+        ("rapa_projects", "horizon", "TEXT"), ("rapa_projects", "impact", "TEXT"),
+        ("rapa_projects", "effort", "TEXT"), ("rapa_projects", "start_date", "TEXT"),
+        ("rapa_projects", "next_review", "TEXT"), ("rapa_projects", "daily_focus_count", "INTEGER DEFAULT 0"),
+        ("raw", "para_type", "TEXT DEFAULT 'Raw'"), ("raw", "project_id", "INTEGER"),
+        ("raw", "area_id", "INTEGER"), ("raw", "next_action", "TEXT"), ("raw", "assign_proposed_at", "TEXT"),
+    ]
+    for table, col, typ in alters:
+        try:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {typ}")
+        except sqlite3.OperationalError:
+            pass
+    for name, slug, area_type, goal in SUPERHERO_AREAS:
+        conn.execute(
+            "INSERT OR IGNORE INTO rapa_areas (user_id, name, slug, type, goal, role) VALUES (0, ?, ?, ?, ?, ?)",
+            (name, slug, area_type, goal, name),
+        )
+
+
+def bench(n: int, legacy: bool) -> float:
+    import bot.collect_bot as cb
+    import bot.rapa as rapa
+    from db import connect
+
+    path = str(Path(tempfile.mkdtemp(prefix="avatar-bench-")) / "bench.db")
+    os.environ["DB_PATH"] = path
+    cb.DB_PATH = path
+    cb.init_db()
+
+    original = rapa.propose_assign
+    if legacy:
+        def propose_assign_legacy(raw_id, user_id, content):
+            with connect(path) as conn:
+                _legacy_init_rapa_schema(conn)
+            return original(raw_id, user_id, content)
+        rapa.propose_assign = propose_assign_legacy
+    try:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            cb.save_raw(1, 1, TEXT, tags=["работа"])
+        return time.perf_counter() - t0
+    finally:
+        rapa.propose_assign = original
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="save_raw: до/после миграций")
+    ap.add_argument("-n", type=int, default=2000)
+    args = ap.parse_args()
+    import logging
+    logging.disable(logging.INFO)
+    for label, legacy in (("before (DDL per write)", True), ("after (migrations once)", False)):
+        elapsed = bench(args.n, legacy)
+        print(f"{label:>24}: {args.n / elapsed:8.0f} save_raw/s  {elapsed / args.n * 1e6:8.1f} µs/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк полнотекстового поиска по Raw (raw_fts): p50/p99 search_raw на N записях
+с длинными «транскриптами» Plaud.
+
+Запуск: python scripts/bench_search.py [--rows 100000] [--words 300] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+VOCAB = (
+    "проект задача встреча партнёр договор инвестор продукт семья дети тренировка бег плавание "
+    "велосипед марафон здоровье врач анализ сон привычка цель дневник спринт дедлайн результат "
+    "стратегия команда клиент идея заметка звонок письмо бюджет отчёт запуск релиз дизайн код "
+    "танцы соревнование кадриль рефлексия медитация развитие отпуск поездка билеты ёлка ремонт"
+).split()
+FILLER = "и в на с что это как так но по из за для от до уже ещё очень просто потом сегодня завтра".split()
+
+
+def make_text(rng: random.Random, words: int) -> str:
+    out = []
+    for _ in range(words):
+        out.append(rng.choice(VOCAB) if rng.random() < 0.3 else rng.choice(FILLER))
+    out.append(f"уникум{rng.randrange(1_000_000)}")
+    return " ".join(out)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="raw_fts search latency")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--words", type=int, default=300)
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+
+    path = str(Path(tempfile.mkdtemp(prefix="avatar-bench-")) / "bench.db")
+    os.environ["DB_PATH"] = path
+    from db import connect
+    from db.migrations import migrate
+    from bot.rapa import search_raw
+
+    migrate(path)
+    rng = random.Random(42)
+    t0 = time.perf_counter()
+    batch = 5000
+    with connect(path) as conn:
+        for start in range(0, args.rows, batch):
+            rows = []
+            for i in range(start, min(args.rows, start + batch)):
+                text = make_text(rng, args.words)
+                rows.append((1, 1, text[:80], text, "Plaud", f"2026-01-01T00:00:{i % 60:02d}", "plaud"))
+            conn.executemany(
+                "INSERT INTO raw (user_id, chat_id, title, content, source, created_at, tags) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+    print(f"indexed {args.rows} rows × {args.words} words in {time.perf_counter() - t0:.1f}s")
+
+    queries = {
+        "rare word": lambda: f"уникум{rng.randrange(1_000_000)}",
+        "common word": lambda: rng.choice(VOCAB),
+        "prefix": lambda: rng.choice(VOCAB)[:4],
+        "two words": lambda: f"{rng.choice(VOCAB)} {rng.choice(VOCAB)}",
+        "page 5": lambda: rng.choice(VOCAB),
+    }
+    for label, make_q in queries.items():
+        lat = []
+        offset = 80 if label == "page 5" else 0
+        for _ in range(args.queries):
+            q = make_q()
+            t = time.perf_counter()
+            search_raw(1, q, limit=20, offset=offset)
+            lat.append(time.perf_counter() - t)
+        lat.sort()
+        pick = lambda p: lat[min(len(lat) - 1, int(len(lat) * p))] * 1000
+        print(f"  {label:>12}: p50 {pick(0.5):7.2f} ms  p99 {pick(0.99):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
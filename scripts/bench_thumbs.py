@@ -0,0 +1,102 @@
+"""
+Превью фото-доски: байты на загрузку доски и задержка первого/повторного запроса превью.
+Синтетические «фото» 2560×1920 кладутся прямо в дисковый кэш (сеть не нужна), запросы —
+через тестовый клиент Flask. «Первый экран» — 12 плиток; время оценивается при --mbit.
+
+Запуск: python scripts/bench_thumbs.py [--entries 60] [--mbit 10]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+FIRST_SCREEN = 12
+
+
+def make_photo(path: Path, seed: int) -> None:
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    img = Image.effect_noise((2560, 1920), 40).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(2560), rng.randrange(1920)
+        r = rng.randrange(50, 600)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    img.filter(ImageFilter.GaussianBlur(2)).save(path, "JPEG", quality=90)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="thumbnail pipeline: bytes per board, latency")
+    ap.add_argument("--entries", type=int, default=60)
+    ap.add_argument("--mbit", type=float, default=10.0)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="avatar-thumbs-"))
+    os.environ.update({"DB_PATH": str(tmp / "bench.db"), "MEDIA_CACHE_DIR": str(tmp / "media")})
+    import logging
+    logging.disable(logging.WARNING)
+    import api.collect_api as api
+    from api import media_cache, thumbnails
+    from db import connect
+
+    api.DB_PATH = os.environ["DB_PATH"]
+    client = api.create_app().test_client()
+    rows = []
+    for i in range(1, args.entries + 1):
+        uid = f"AQAD{i:06d}"
+        shard = media_cache.shard_dir(uid)
+        shard.mkdir(parents=True, exist_ok=True)
+        make_photo(shard / f"{uid}.jpg", i)
+        rows.append((i, f"file{i}", uid))
+    with connect(api.DB_PATH) as conn:
+        conn.executemany(
+            """
+            INSERT INTO collect_entries (user_id, chat_id, message_id, photo_file_id, file_unique_id, comment, created_at, published_to_channel)
+            VALUES (1, 1, ?, ?, ?, '', '2026-01-01T10:00:00', 1)
+            """,
+            rows,
+        )
+    board = client.get(f"/api/collect/entries?limit={args.entries}").get_json()["entries"]
+
+    def load(query: str, accept: str) -> tuple[int, int, list[float]]:
+        total = first = 0
+        lat = []
+        for n, e in enumerate(board):
+            t0 = time.perf_counter()
+            r = client.get(f"/api/photo/{e['id']}{query}", headers={"Accept": accept})
+            lat.append(time.perf_counter() - t0)
+            total += len(r.data)
+            if n < FIRST_SCREEN:
+                first += len(r.data)
+        return total, first, sorted(lat)
+
+    print(f"{args.entries} photos 2560×1920, first screen {FIRST_SCREEN} tiles at {args.mbit:.0f} Mbit/s")
+    variants = [
+        ("original", "", "image/jpeg"),
+        ("w=320 webp", "?w=320", "image/webp,*/*"),
+        ("w=640 webp", "?w=640", "image/webp,*/*"),
+        ("w=640 jpeg", "?w=640", "image/jpeg"),
+    ]
+    for label, query, accept in variants:
+        for phase in ("cold", "warm"):
+            total, first, lat = load(query, accept)
+            if phase == "cold" and not query:
+                continue
+            p50 = lat[len(lat) // 2] * 1000
+            p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000
+            paint = first * 8 / (args.mbit * 1e6)
+            print(f"  {label:>11} {phase}: board {total / 1024:8.0f} KB  first screen {first / 1024:7.0f} KB "
+                  f"(~{paint:5.2f} s)  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+    thumbnails.shutdown()
+
+
+if __name__ == "__main__":
+    main()
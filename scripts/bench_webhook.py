@@ -0,0 +1,202 @@
+"""
+Задержка апдейта polling против webhook: фейковый Telegram (aiohttp) генерирует /stock от
+разных пользователей с темпом --rate и ждёт ответ бота (sendMessage с reply на это сообщение).
+Задержка = от появления апдейта в «Telegram» до прихода ответа. Сеть бот ↔ Telegram — --rtt-ms
+на каждый запрос (половина туда, половина обратно), в т.ч. на доставку апдейта webhook'ом.
+
+- polling: dp.start_polling, getUpdates — long poll (апдейт, пришедший между двумя getUpdates,
+  ждёт следующего запроса)
+- webhook: create_webhook_app (bot/collect_bot.py), «Telegram» POST'ит апдейт с секретом;
+  плюс проверки: неверный секрет — 401, GET /healthz — 200
+
+Запуск: python scripts/bench_webhook.py [-n 500] [--rate 50] [--rtt-ms 60] [--mode both|polling|webhook]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from aiohttp import ClientSession, web
+
+TOKEN = "42:WEBHOOK"
+USERS = 50
+
+
+class FakeTelegram:
+    """getUpdates (long poll), sendMessage (фиксирует время ответа), остальные методы — ok."""
+
+    def __init__(self, rtt: float):
+        self.half = rtt / 2
+        self.created: dict[int, float] = {}  # message_id -> когда апдейт появился
+        self.latencies: list[float] = []
+        self._updates: list[dict] = []
+        self._new = asyncio.Event()
+        self._message_id = 10 ** 6
+
+    def make_update(self, update_id: int) -> dict:
+        user_id = 1000 + update_id % USERS
+        self.created[update_id] = time.perf_counter()
+        return {"update_id": update_id, "message": {
+            "message_id": update_id, "date": int(time.time()), "text": "/stock",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+        }}
+
+    def push(self, update: dict) -> None:
+        self._updates.append(update)
+        self._new.set()
+
+    def _ok(self, result) -> web.Response:
+        return web.Response(text=json.dumps({"ok": True, "result": result}), content_type="application/json")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        form = dict(await request.post())
+        await asyncio.sleep(self.half)  # запрос идёт до Telegram
+        if method == "getUpdates":
+            offset = int(form.get("offset") or 0)
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if not self._updates:
+                self._new.clear()
+                try:
+                    await asyncio.wait_for(self._new.wait(), float(form.get("timeout") or 0) or 0.01)
+                except asyncio.TimeoutError:
+                    pass
+            result = list(self._updates)
+        elif method == "sendMessage":
+            reply_to = json.loads(form.get("reply_parameters") or "{}").get("message_id")
+            if reply_to in self.created:
+                self.latencies.append(time.perf_counter() - self.created.pop(reply_to))
+            self._message_id += 1
+            result = {"message_id": self._message_id, "date": int(time.time()),
+                      "chat": {"id": int(form["chat_id"]), "type": "private"}, "text": form.get("text", "")}
+        elif method == "getMe":
+            result = {"id": 42, "is_bot": True, "first_name": "Collect", "username": "collect_bench_bot"}
+        else:
+            result = True
+        await asyncio.sleep(self.half)  # ответ идёт обратно
+        return self._ok(result)
+
+
+async def serve(app: web.Application) -> tuple[web.AppRunner, int]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+async def generate(fake: FakeTelegram, n: int, rate: float, deliver) -> None:
+    start = time.perf_counter()
+    for i in range(1, n + 1):
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        deliver(fake.make_update(i))
+    deadline = time.perf_counter() + 30
+    while fake.created and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+
+def report(label: str, fake: FakeTelegram, n: int, extra: str = "") -> None:
+    lat = sorted(fake.latencies)
+    pick = lambda q: lat[min(len(lat) - 1, int(len(lat) * q))] * 1000 if lat else 0.0
+    print(f"  {label:>8}: answered {len(lat)}/{n}  p50 {pick(0.5):6.1f} ms  p95 {pick(0.95):6.1f} ms  "
+          f"max {pick(1.0):6.1f} ms{extra}")
+
+
+async def run_polling(cb, base: str, fake: FakeTelegram, args) -> None:
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(base)))
+    dp = cb.create_dispatcher(bot)
+    dp.startup.register(cb.drop_webhook)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+    await asyncio.sleep(0.5)
+    await generate(fake, args.n, args.rate, fake.push)
+    await dp.stop_polling()
+    await polling
+    report("polling", fake, args.n)
+
+
+async def run_webhook(cb, base: str, fake: FakeTelegram, args) -> None:
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(base)))
+    dp = cb.create_dispatcher(bot)
+    secret = cb.webhook_secret(TOKEN)
+    runner, port = await serve(cb.create_webhook_app(bot, dp, url="https://bench.local", secret=secret))
+    url = f"http://127.0.0.1:{port}"
+    codes: dict[int, int] = {}
+    pending: set[asyncio.Task] = set()
+
+    async with ClientSession() as http:
+        async def post(update: dict, token: str = secret) -> int:
+            await asyncio.sleep(fake.half)  # доставка апдейта до бота
+            async with http.post(url + cb.WEBHOOK_PATH, json=update,
+                                 headers={"X-Telegram-Bot-Api-Secret-Token": token}) as resp:
+                codes[resp.status] = codes.get(resp.status, 0) + 1
+                return resp.status
+
+        def deliver(update: dict) -> None:
+            task = asyncio.create_task(post(update))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        await generate(fake, args.n, args.rate, deliver)
+        forged = await post({"update_id": 0}, token="wrong")
+        codes[forged] -= 1
+        codes = {code: k for code, k in codes.items() if k}
+        async with http.get(url + "/healthz") as resp:
+            health = resp.status, await resp.json()
+    await runner.cleanup()
+    report("webhook", fake, args.n, f"  http {codes}  forged secret → {forged}  /healthz {health[0]} {health[1]}")
+
+
+async def run(args) -> None:
+    tmp = Path(tempfile.mkdtemp(prefix="avatar-webhook-"))
+    os.environ["DB_PATH"] = str(tmp / "webhook.db")
+    import bot.collect_bot as cb
+
+    cb.DB_PATH = os.environ["DB_PATH"]
+    cb.CHANNEL_ID = None
+    cb.POST_SCHEDULE_TIME = cb.REVIEW_DAILY_TIME = None
+    cb.init_db()
+    print(f"{args.n} updates at {args.rate:.0f}/s from {USERS} users, RTT bot↔Telegram {args.rtt_ms:.0f} ms")
+    for mode in (("polling", "webhook") if args.mode == "both" else (args.mode,)):
+        fake = FakeTelegram(args.rtt_ms / 1000)
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", fake.handle)
+        runner, port = await serve(app)
+        base = f"http://127.0.0.1:{port}"
+        await (run_polling if mode == "polling" else run_webhook)(cb, base, fake, args)
+        await runner.cleanup()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="update latency: polling vs webhook")
+    ap.add_argument("-n", type=int, default=500)
+    ap.add_argument("--rate", type=float, default=50.0, help="апдейтов в секунду")
+    ap.add_argument("--rtt-ms", type=float, default=60.0)
+    ap.add_argument("--mode", choices=("both", "polling", "webhook"), default="both")
+    args = ap.parse_args()
+    import logging
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Нагрузочный тест Collect API: dev-сервер Flask (python -m api.collect_api) против gunicorn
+(deploy/gunicorn.conf.py). Сервер запускается отдельным процессом на временной БД с записями,
+Raw и файлами в дисковом кэше медиа (Telegram не нужен). Клиент — aiohttp с keep-alive.
+Печатает req/s и p50/p95/p99 для /api/collect/entries, /api/rapa/raw и /api/photo.
+
+Запуск: python scripts/load_api.py [--mode both|dev|gunicorn] [-n 3000] [--concurrency 64]
+                                   [--workers 4] [--threads 8]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import aiohttp
+
+USER_ID = 1
+ENTRIES = 2000
+RAWS = 3000
+PHOTO_KB = 120
+
+
+def prepare(tmp: Path) -> dict:
+    """Временная БД + файлы кэша медиа; возвращает окружение для процесса сервера."""
+    env = {
+        **os.environ,
+        "DB_PATH": str(tmp / "load.db"),
+        "MEDIA_CACHE_DIR": str(tmp / "media"),
+        "RAW_OWNER_USER_ID": str(USER_ID),
+        "BOT_TOKEN": "",
+    }
+    os.environ.update({k: env[k] for k in ("DB_PATH", "MEDIA_CACHE_DIR")})
+    from api import media_cache
+    from db import connect
+    from db.migrations import migrate
+
+    migrate(env["DB_PATH"])
+    now = datetime.utcnow()
+    payload = os.urandom(PHOTO_KB * 1024)
+    entries = []
+    for i in range(1, ENTRIES + 1):
+        uid = f"AQAD{i:06d}"
+        shard = media_cache.shard_dir(uid)
+        shard.mkdir(parents=True, exist_ok=True)
+        (shard / f"{uid}.jpg").write_bytes(payload)
+        entries.append((i, f"file{i}", uid, f"день {i}", (now - timedelta(hours=i)).isoformat()))
+    raws = [
+        (USER_ID, USER_ID, f"Заметка {i}", f"Надо сделать задачу {i} по проекту", (now - timedelta(minutes=5 * i)).isoformat())
+        for i in range(RAWS)
+    ]
+    with connect(env["DB_PATH"]) as conn:
+        conn.executemany(
+            """
+            INSERT INTO collect_entries (user_id, chat_id, message_id, photo_file_id, file_unique_id, comment, created_at, published_to_channel)
+            VALUES (1, 1, ?, ?, ?, ?, ?, 1)
+            """,
+            entries,
+        )
+        conn.executemany(
+            "INSERT INTO raw (user_id, chat_id, title, content, created_at) VALUES (?, ?, ?, ?, ?)", raws
+        )
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode: str, env: dict, port: int, workers: int, threads: int) -> subprocess.Popen:
+    env = {**env, "COLLECT_API_PORT": str(port), "COLLECT_API_HOST": "127.0.0.1",
+           "GUNICORN_WORKERS": str(workers), "GUNICORN_THREADS": str(threads), "GUNICORN_LOGLEVEL": "warning"}
+    if mode == "dev":
+        cmd = [sys.executable, "-m", "api.collect_api"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "deploy/gunicorn.conf.py", "api.collect_api:create_app()"]
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(base: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as s:
+        while time.monotonic() < deadline:
+            try:
+                async with s.get(f"{base}/api/gtd/sprint-report-version") as r:
+                    if r.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base} did not start")
+
+
+async def hammer(base: str, paths: list[str], concurrency: int) -> tuple[float, list[float], int]:
+    lat: list[float] = []
+    errors = 0
+    queue = iter(paths)
+    conn = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=conn) as s:
+        async def worker():
+            nonlocal errors
+            for path in queue:
+                t0 = time.perf_counter()
+                try:
+                    async with s.get(base + path) as r:
+                        await r.read()
+                        if r.status != 200:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                lat.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return elapsed, sorted(lat), errors
+
+
+async def run_mode(mode: str, env: dict, n: int, concurrency: int, workers: int, threads: int) -> None:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = start_server(mode, env, port, workers, threads)
+    try:
+        await wait_ready(base)
+        rng = random.Random(7)
+        label = "dev server" if mode == "dev" else f"gunicorn {workers}×{threads} gthread"
+        print(f"{label} (concurrency {concurrency}, n={n} per endpoint)")
+        endpoints = {
+            "entries": lambda: f"/api/collect/entries?limit=60&before_id={rng.randrange(100, ENTRIES)}",
+            "rapa/raw": lambda: "/api/rapa/raw?days=3",
+            "photo": lambda: f"/api/photo/{rng.randrange(1, ENTRIES + 1)}",
+        }
+        for name, make in endpoints.items():
+            elapsed, lat, errors = await hammer(base, [make() for _ in range(n)], concurrency)
+            pick = lambda q: lat[min(len(lat) - 1, int(len(lat) * q))] * 1000
+            print(f"  {name:>9}: {n / elapsed:7.0f} req/s  p50 {pick(0.5):7.2f} ms  p95 {pick(0.95):7.2f} ms  "
+                  f"p99 {pick(0.99):7.2f} ms  errors {errors}")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Collect API: dev server vs gunicorn")
+    ap.add_argument("--mode", choices=("both", "dev", "gunicorn"), default="both")
+    ap.add_argument("-n", type=int, default=3000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=8)
+    args = ap.parse_args()
+    import logging
+    logging.disable(logging.WARNING)
+
+    env = prepare(Path(tempfile.mkdtemp(prefix="avatar-load-")))
+    modes = ("dev", "gunicorn") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        asyncio.run(run_mode(mode, env, args.n, args.concurrency, args.workers, args.threads))
+
+
+if __name__ == "__main__":
+    main()
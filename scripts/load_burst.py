@@ -0,0 +1,111 @@
+"""
+Пачка сообщений от одного пользователя через Dispatcher.feed_update (фейковая сессия Bot API из
+bench_dispatcher.py): --texts текстов подряд, --forwards пересланных из чата (пересылка 200 сообщений),
+--raw команд /raw (захват, не ограничивается) и --commands команд /stock.
+Сравнивает бота без BurstMiddleware (каждый текст — своя запись, своя классификация и свой ответ)
+с BurstMiddleware (bot/throttling.py): первая запись отдельно, остальные — одной транзакцией с
+одним ответом-сводкой; команды сверх лимита отбрасываются, /raw — нет.
+
+Печатает: сообщений Bot API (в личке Telegram держит ~1 сообщение в секунду на чат), записей Raw,
+транзакций записи, время до последней записи в БД и счётчики middleware.
+
+Запуск: python scripts/load_burst.py [--texts 200] [--forwards 100] [--raw 20] [--commands 50] [--gap-ms 5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from bench_dispatcher import USER_ID, FakeSession, make_update
+
+
+async def run_mode(cb, label: str, middleware, args) -> None:
+    from db import connect
+
+    cb._burst = middleware
+    writes = 0
+    original = {name: getattr(cb, name) for name in ("save_raw", "save_raw_many")}
+
+    def counted(fn):
+        def wrapper(*a, **kw):
+            nonlocal writes
+            writes += 1
+            return fn(*a, **kw)
+        return wrapper
+
+    for name, fn in original.items():
+        setattr(cb, name, counted(fn))
+    with connect(cb.DB_PATH) as conn:
+        conn.execute("DELETE FROM raw")
+    session = FakeSession()
+    bot = Bot(token="42:BURST", session=session)
+    dp = cb.create_dispatcher(bot)
+    kinds = ["text"] * args.texts + ["forward"] * args.forwards
+    expected = args.texts + args.forwards + args.raw
+    for kind, n in (("raw", args.raw), ("stock", args.commands)):  # команды вперемешку с текстами
+        for j in range(n):
+            kinds.insert((j + 1) * len(kinds) // (n + 1), kind)
+    updates: list[Update] = [make_update(i, kind) for i, kind in enumerate(kinds, start=1)]
+
+    t0 = time.perf_counter()
+    tasks = []
+    for upd in updates:
+        tasks.append(asyncio.create_task(dp.feed_update(bot, upd)))
+        await asyncio.sleep(args.gap_ms / 1000)
+    await asyncio.gather(*tasks)
+    # Дожидаемся последней пачки (окно склейки)
+    while True:
+        with connect(cb.DB_PATH) as conn:
+            n = conn.execute("SELECT COUNT(*) FROM raw WHERE user_id = ?", (USER_ID,)).fetchone()[0]
+        if n >= expected or time.perf_counter() - t0 > 30:
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - t0
+    for name, fn in original.items():
+        setattr(cb, name, fn)
+    stats = f"  {middleware.stats()}" if middleware.window or middleware.rate else ""
+    print(f"  {label:>8}: replies {session.calls.get('SendMessage', 0):4d}  raw {n:4d}/{expected}  "
+          f"write transactions {writes:4d}  {elapsed:5.2f} s{stats}")
+
+
+async def run(args) -> None:
+    import bot.collect_bot as cb
+    from bot.throttling import BurstMiddleware
+
+    path = str(Path(tempfile.mkdtemp(prefix="avatar-burst-")) / "burst.db")
+    os.environ["DB_PATH"] = path
+    cb.DB_PATH = path
+    cb.CHANNEL_ID = None
+    cb.init_db()
+    print(f"{args.texts} texts + {args.forwards} forwards + {args.raw} /raw + {args.commands} commands from one user, "
+          f"{args.gap_ms:.0f} ms apart")
+    await run_mode(cb, "off", BurstMiddleware(rate=0, window=0), args)
+    await run_mode(cb, "on", BurstMiddleware(), args)
+    await cb.on_shutdown()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="burst coalescing and per-user throttling")
+    ap.add_argument("--texts", type=int, default=200)
+    ap.add_argument("--forwards", type=int, default=100, help="пересланных из чата текстов")
+    ap.add_argument("--raw", type=int, default=20, help="команд /raw <текст>")
+    ap.add_argument("--commands", type=int, default=50)
+    ap.add_argument("--gap-ms", type=float, default=5.0)
+    args = ap.parse_args()
+    import logging
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Публикация под падениями процесса: бот-публикатор запускается дочерним процессом и убивается
+kill -9 через случайные промежутки, пока очередь не опустеет. Сравнивает прежнюю схему
+«пометить → отправить (bot.publisher, повторы при 5xx) → откатить» с outbox (bot/outbox.py,
+аренды и повторная доставка). Фейковый Bot API — из load_publish.py, с долей 5xx.
+
+Печатает время, посты/с, число падений, сколько записей дошло, дубли (at-least-once)
+и потерянные (помечены опубликованными, но в «Telegram» не пришли).
+
+Запуск: python scripts/load_outbox.py [--entries 300] [--latency-ms 50] [--fail-rate 0.05] [--kill-every 0.3:1.5]
+                                      [--lease 2] [--mode both|old|outbox]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from aiohttp import web
+
+from load_publish import CHANNEL_ID, TOKEN, FakeBotApi
+
+
+def _import_bot():
+    import logging
+    logging.disable(logging.WARNING)
+    import bot.collect_bot as cb
+    cb.DB_PATH = os.environ["DB_PATH"]
+    cb.CHANNEL_ID = CHANNEL_ID
+    return cb
+
+
+def pending(cb) -> int:
+    """Сколько записей ещё не опубликовано или висит в outbox неотправленным."""
+    from db import connect
+
+    with connect(cb.DB_PATH) as conn:
+        n = conn.execute("SELECT COUNT(*) FROM collect_entries WHERE published_to_channel = 0").fetchone()[0]
+        n += conn.execute("SELECT COUNT(*) FROM channel_outbox WHERE status IN ('queued', 'sending')").fetchone()[0]
+    return n
+
+
+async def child(mode: str, base: str) -> None:
+    """Один запуск публикатора (его и убивают)."""
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    cb = _import_bot()
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(base)))
+    print("ready", flush=True)  # таймер kill -9 родитель запускает отсюда, а не со старта интерпретатора
+    if mode == "old":
+        from bot import publisher
+
+        async def send(entry):
+            await cb.run_write(cb.mark_published, entry[0])
+            await cb._post_media_to_channel(bot, entry[1], entry[2], entry[3])
+
+        entries = await cb.run_read(cb.get_unpublished_entries)
+        stats = await publisher.publish(entries, send, bucket=cb._channel_bucket())
+        for entry in stats["failed"]:
+            await cb.run_write(cb.mark_unpublished, entry[0])
+    else:
+        from bot import outbox
+
+        await cb.run_scheduled_post(bot)
+        # Добираем строки, брошенные убитым процессом (после истечения аренды)
+        while await cb.run_read(pending, cb):
+            stats = await outbox.deliver(lambda row: cb._send_outbox_row(bot, row), cb._channel_bucket())
+            if not stats["total"]:
+                await asyncio.sleep(0.2)
+    await bot.session.close()
+
+
+async def run_mode(mode: str, args, fake: FakeBotApi, base: str, tmp: Path) -> None:
+    fake.reset()
+    db_path = tmp / f"{mode}.db"
+    env = {**os.environ, "DB_PATH": str(db_path), "OUTBOX_LEASE_SECONDS": str(args.lease),
+           "CHANNEL_POST_RATE": "60000", "CHANNEL_POST_BURST": "50", "CHANNEL_POST_CONCURRENCY": str(args.concurrency)}
+    os.environ["DB_PATH"] = str(db_path)
+    cb = _import_bot()
+    cb.init_db()
+    from db import connect
+
+    with connect(cb.DB_PATH) as conn:
+        conn.executemany(
+            """
+            INSERT INTO collect_entries (user_id, chat_id, message_id, photo_file_id, comment, created_at, published_to_channel, media_type)
+            VALUES (1, 1, ?, ?, '', '2026-01-01T10:00:00', 0, 'photo')
+            """,
+            [(i, f"file{i}") for i in range(args.entries)],
+        )
+    lo, hi = (float(x) for x in args.kill_every.split(":"))
+    rng = random.Random(5)
+    kills = 0
+    elapsed = 0.0  # только время работы публикатора, без запуска интерпретатора и импорта aiogram
+    while True:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, __file__, "--child", mode, "--base", base, env=env, cwd=ROOT,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        await proc.stdout.readline()
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(proc.wait(), rng.uniform(lo, hi))
+            elapsed += time.perf_counter() - t0
+            if proc.returncode == 0 and not pending(cb):
+                break
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            elapsed += time.perf_counter() - t0
+            kills += 1
+        if mode == "old" and not pending(cb):
+            break
+    delivered = Counter(fake.sent)
+    with connect(cb.DB_PATH) as conn:
+        published = {r[0] for r in conn.execute("SELECT photo_file_id FROM collect_entries WHERE published_to_channel = 1")}
+    lost = len(published - set(delivered))
+    dupes = sum(n - 1 for n in delivered.values() if n > 1)
+    label = "old loop" if mode == "old" else "outbox"
+    print(f"  {label:>8}: {elapsed:6.1f} s  {len(delivered) / elapsed:5.1f} posts/s  kills {kills:3d}  "
+          f"delivered {len(delivered)}/{args.entries}  dupes {dupes}  lost {lost}")
+
+
+async def run(args) -> None:
+    fake = FakeBotApi(args.latency_ms / 1000, args.fail_rate, 10 ** 6, 1.0)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", fake.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    tmp = Path(tempfile.mkdtemp(prefix="avatar-outbox-"))
+    print(f"{args.entries} entries, latency {args.latency_ms:.0f} ms, 5xx {args.fail_rate:.0%}, kill -9 every {args.kill_every} s, "
+          f"lease {args.lease}s, concurrency {args.concurrency}")
+    for mode in (("old", "outbox") if args.mode == "both" else (args.mode,)):
+        await run_mode(mode, args, fake, base, tmp)
+    await runner.cleanup()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="channel publishing under kill -9")
+    ap.add_argument("--entries", type=int, default=300)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--fail-rate", type=float, default=0.05)
+    ap.add_argument("--kill-every", default="0.3:1.5", help="интервал до kill -9, секунд (от:до)")
+    ap.add_argument("--lease", type=int, default=2, help="OUTBOX_LEASE_SECONDS")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--mode", choices=("both", "old", "outbox"), default="both")
+    ap.add_argument("--child", choices=("old", "outbox"), help=argparse.SUPPRESS)
+    ap.add_argument("--base", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        asyncio.run(child(args.child, args.base))
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
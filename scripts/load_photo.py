@@ -0,0 +1,171 @@
+"""
+Нагрузочный тест /api/photo против локального фейкового сервера Telegram (getFile + файлы).
+Поднимает фейковый Bot API и Collect API в потоках, прогоняет холодный проход (каждая запись
+один раз — промахи кэша), тёплый (случайные записи), условные запросы (If-None-Match → 304)
+и Range (206). Печатает req/s, p50/p99 и сколько раз API сходил в «Telegram».
+
+Запуск: python scripts/load_photo.py [--entries 200] [-n 5000] [--concurrency 32]
+                                     [--size-kb 300] [--upstream-latency-ms 50]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import requests
+
+TOKEN = "42:LOAD"
+
+
+class FakeTelegram(BaseHTTPRequestHandler):
+    """getFile → file_path photos/<file_id>.jpg (или videos/…mp4), /file/bot… → size_kb случайных байт."""
+
+    latency = 0.0
+    payload = b""
+    calls = {"getFile": 0, "download": 0}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        # Bot API-методы клиент вызывает POST с JSON (getFile)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.do_GET(body)
+
+    def do_GET(self, body: dict | None = None):
+        time.sleep(self.latency)
+        url = urlparse(self.path)
+        if url.path == f"/bot{TOKEN}/getFile":
+            with self.lock:
+                self.calls["getFile"] += 1
+            file_id = (body or {}).get("file_id") or parse_qs(url.query)["file_id"][0]
+            folder, ext = ("videos", "mp4") if file_id.startswith("vid") else ("photos", "jpg")
+            result = {"file_id": file_id, "file_unique_id": f"U{file_id}", "file_size": len(self.payload),
+                      "file_path": f"{folder}/{file_id}.{ext}"}
+            self._send(200, json.dumps({"ok": True, "result": result}).encode(), "application/json")
+        elif url.path.startswith(f"/file/bot{TOKEN}/"):
+            with self.lock:
+                self.calls["download"] += 1
+            self._send(200, self.payload, "application/octet-stream")
+        else:
+            self._send(404, b"{}", "application/json")
+
+
+def serve(server) -> None:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def pct(vals: list[float], q: float) -> float:
+    return vals[min(len(vals) - 1, int(len(vals) * q))] * 1000
+
+
+def run_phase(label: str, base: str, jobs: list[tuple[int, dict]], concurrency: int, expect: int) -> None:
+    local = threading.local()
+    lat: list[float] = []
+    bad = 0
+
+    def one(job):
+        nonlocal bad
+        entry_id, headers = job
+        s = getattr(local, "s", None) or requests.Session()
+        local.s = s
+        t0 = time.perf_counter()
+        r = s.get(f"{base}/api/photo/{entry_id}", headers=headers)
+        _ = r.content
+        lat.append(time.perf_counter() - t0)
+        if r.status_code != expect:
+            bad += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        list(ex.map(one, jobs))
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    print(f"  {label:>12}: {len(jobs) / elapsed:7.0f} req/s  p50 {pct(lat, 0.5):7.2f} ms  "
+          f"p99 {pct(lat, 0.99):7.2f} ms  unexpected status: {bad}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="/api/photo load test")
+    ap.add_argument("--entries", type=int, default=200)
+    ap.add_argument("-n", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--size-kb", type=int, default=300)
+    ap.add_argument("--upstream-latency-ms", type=float, default=50.0)
+    args = ap.parse_args()
+
+    FakeTelegram.latency = args.upstream_latency_ms / 1000
+    FakeTelegram.payload = os.urandom(args.size_kb * 1024)
+    tg = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegram)
+    serve(tg)
+
+    tmp = Path(tempfile.mkdtemp(prefix="avatar-load-"))
+    os.environ.update({
+        "DB_PATH": str(tmp / "load.db"),
+        "BOT_TOKEN": TOKEN,
+        "TELEGRAM_API_BASE": f"http://127.0.0.1:{tg.server_port}",
+        "MEDIA_CACHE_DIR": str(tmp / "media"),
+    })
+    import logging
+    logging.disable(logging.WARNING)
+    import api.collect_api as api
+    from db import connect
+    from werkzeug.serving import make_server
+
+    api.DB_PATH = os.environ["DB_PATH"]
+    api.BOT_TOKEN = TOKEN
+    app = api.create_app()
+    with connect(api.DB_PATH) as conn:
+        conn.executemany(
+            """
+            INSERT INTO collect_entries (user_id, chat_id, message_id, photo_file_id, comment, created_at, published_to_channel, media_type)
+            VALUES (1, 1, ?, ?, '', '2026-01-01T10:00:00', 1, ?)
+            """,
+            [(i, f"vid{i}" if i % 10 == 0 else f"ph{i}", "video" if i % 10 == 0 else "photo")
+             for i in range(1, args.entries + 1)],
+        )
+    http = make_server("127.0.0.1", 0, app, threaded=True)
+    serve(http)
+    base = f"http://127.0.0.1:{http.server_port}"
+
+    ids = list(range(1, args.entries + 1))
+    print(f"{args.entries} entries × {args.size_kb} KB, upstream latency {args.upstream_latency_ms:.0f} ms, "
+          f"concurrency {args.concurrency}")
+    run_phase("cold", base, [(i, {}) for i in ids], args.concurrency, 200)
+    rng = random.Random(1)
+    run_phase("warm", base, [(rng.choice(ids), {}) for _ in range(args.n)], args.concurrency, 200)
+    etags = {i: requests.get(f"{base}/api/photo/{i}").headers.get("ETag") for i in ids[:50]}
+    run_phase("304", base, [(i, {"If-None-Match": etags[i]}) for i in rng.choices(list(etags), k=args.n)],
+              args.concurrency, 304)
+    run_phase("range", base, [(rng.choice(ids), {"Range": "bytes=0-65535"}) for _ in range(args.n)],
+              args.concurrency, 206)
+    r = requests.get(f"{base}/api/photo/10")
+    print(f"  video entry: {r.headers.get('Content-Type')}, Accept-Ranges: {r.headers.get('Accept-Ranges')}")
+    print(f"  upstream calls: {FakeTelegram.calls} (entries: {args.entries})")
+    http.shutdown()
+    tg.shutdown()
+
+
+if __name__ == "__main__":
+    main()
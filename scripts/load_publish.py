@@ -0,0 +1,181 @@
+"""
+Публикация накопленных постов в канал против фейкового Bot API (aiohttp): задержка ответа,
+flood control (не больше --server-limit сообщений в чат за --server-window секунд, иначе 429
+с retry_after) и доля 5xx. Сравнивает старый цикл «по одному, ошибка — откат» с
+bot.publisher (параллельно, token bucket, RetryAfter, повторы с jitter) и с альбомами
+(CHANNEL_POST_ALBUMS=1: до 10 записей одного дня — один sendMediaGroup).
+
+Печатает время пачки, посты/с, сколько постов дошло, дубли, 429 и сколько осталось в очереди.
+
+Запуск: python scripts/load_publish.py [--entries 300] [--latency-ms 150] [--fail-rate 0.03]
+                                       [--server-limit 20 --server-window 2]
+                                       [--rate 540 --burst 10 --concurrency 4] [--mode all|old|new|albums]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from aiohttp import web
+
+TOKEN = "42:PUBLISH"
+CHANNEL_ID = -1001234567890
+
+
+class FakeBotApi:
+    """sendPhoto/sendVideo/sendVideoNote/sendMediaGroup с лимитом на чат (скользящее окно, альбом —
+    по числу медиа) и случайными 5xx."""
+
+    def __init__(self, latency: float, fail_rate: float, limit: int, window: float):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.limit = limit
+        self.window = window
+        self.rng = random.Random(3)
+        self.sent: list[str] = []
+        self.codes: Counter = Counter()
+        self.requests = 0
+        self._recent: dict[str, deque] = {}
+        self._message_id = 0
+
+    def reset(self) -> None:
+        self.sent.clear()
+        self.codes.clear()
+        self.requests = 0
+        self._recent.clear()
+
+    def _reply(self, status: int, body: dict) -> web.Response:
+        self.codes[status] += 1
+        return web.Response(status=status, text=json.dumps(body), content_type="application/json")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        form = dict(await request.post())
+        chat_id = str(form.get("chat_id"))
+        self.requests += 1
+        if method == "sendMediaGroup":
+            file_ids = [m["media"] for m in json.loads(form["media"])]
+        else:
+            file_ids = [form.get({"sendPhoto": "photo", "sendVideo": "video", "sendVideoNote": "video_note"}.get(method, ""), "")]
+        now = time.monotonic()
+        recent = self._recent.setdefault(chat_id, deque())
+        while recent and now - recent[0] > self.window:
+            recent.popleft()
+        if len(recent) + len(file_ids) > self.limit:
+            retry_after = max(1, round(self.window - (now - recent[0]))) if recent else 1
+            return self._reply(429, {"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry_after}",
+                                     "parameters": {"retry_after": retry_after}})
+        recent.extend([now] * len(file_ids))
+        await asyncio.sleep(self.latency)
+        if self.rng.random() < self.fail_rate:
+            return self._reply(502, {"ok": False, "error_code": 502, "description": "Bad Gateway"})
+        messages = []
+        for file_id in file_ids:
+            self.sent.append(file_id)
+            self._message_id += 1
+            messages.append({"message_id": self._message_id, "date": int(time.time()), "chat": {"id": CHANNEL_ID, "type": "channel"}})
+        return self._reply(200, {"ok": True, "result": messages if method == "sendMediaGroup" else messages[0]})
+
+
+async def old_loop(cb, bot) -> None:
+    """Публикация до bot.publisher: по одному, любая ошибка — откат пометки."""
+    for eid, file_id, caption, media_type, _ in await cb.run_read(cb.get_unpublished_entries):
+        await cb.run_write(cb.mark_published, eid)
+        try:
+            await cb._post_media_to_channel(bot, file_id, caption, media_type)
+        except Exception:
+            await cb.run_write(cb.mark_unpublished, eid)
+
+
+async def run(args) -> None:
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    fake = FakeBotApi(args.latency_ms / 1000, args.fail_rate, args.server_limit, args.server_window)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", fake.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    tmp = Path(tempfile.mkdtemp(prefix="avatar-publish-"))
+    os.environ.update({
+        "DB_PATH": str(tmp / "publish.db"),
+        "CHANNEL_POST_RATE": str(args.rate),
+        "CHANNEL_POST_BURST": str(args.burst),
+        "CHANNEL_POST_CONCURRENCY": str(args.concurrency),
+    })
+    import logging
+    import bot.collect_bot as cb
+    from db import connect
+
+    cb.DB_PATH = os.environ["DB_PATH"]
+    cb.CHANNEL_ID = CHANNEL_ID
+    logging.disable(logging.WARNING)
+    cb.init_db()
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")))
+    kinds = ("photo",) * 8 + ("video", "video_note")
+    day0 = datetime(2026, 1, 1, 10)
+
+    print(f"{args.entries} entries, latency {args.latency_ms:.0f} ms, 5xx {args.fail_rate:.0%}, "
+          f"server limit {args.server_limit}/{args.server_window:g}s; bucket {args.rate:g}/min burst {args.burst}, "
+          f"concurrency {args.concurrency}")
+    modes = ("old", "new", "albums") if args.mode == "all" else (args.mode,)
+    for mode in modes:
+        fake.reset()
+        cb.CHANNEL_POST_ALBUMS = mode == "albums"
+        with connect(cb.DB_PATH) as conn:
+            conn.execute("DELETE FROM collect_entries")
+            conn.executemany(
+                """
+                INSERT INTO collect_entries (user_id, chat_id, message_id, photo_file_id, comment, created_at, published_to_channel, media_type)
+                VALUES (1, 1, ?, ?, '', ?, 0, ?)
+                """,
+                [(i, f"file{i}", (day0 + timedelta(days=i // 40)).isoformat(), kinds[i % len(kinds)]) for i in range(args.entries)],
+            )
+        t0 = time.perf_counter()
+        stats = await (old_loop(cb, bot) if mode == "old" else cb.run_scheduled_post(bot))
+        elapsed = time.perf_counter() - t0
+        left = len(await cb.run_read(cb.get_unpublished_entries))
+        dupes = sum(n - 1 for n in Counter(fake.sent).values() if n > 1)
+        label = {"old": "old loop", "new": "publisher", "albums": "albums"}[mode]
+        print(f"  {label:>9}: {elapsed:6.1f} s  {len(fake.sent) / elapsed:5.1f} entries/s  delivered {len(set(fake.sent))}/{args.entries}  "
+              f"dupes {dupes}  left in queue {left}  API calls {fake.requests}  HTTP {dict(sorted(fake.codes.items()))}")
+        if stats:
+            print(f"             batch: p50 {stats['p50_ms']} ms  p95 {stats['p95_ms']} ms  max {stats['max_ms']} ms  "
+                  f"retries {stats['retries']}  flood waits {stats['retry_after']} ({stats['retry_after_s']:.0f}s)  "
+                  f"bucket wait {stats['rate_wait_s']:.1f}s")
+    await bot.session.close()
+    await runner.cleanup()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="channel publishing against a fake Bot API")
+    ap.add_argument("--entries", type=int, default=300)
+    ap.add_argument("--latency-ms", type=float, default=150.0)
+    ap.add_argument("--fail-rate", type=float, default=0.03)
+    ap.add_argument("--server-limit", type=int, default=20)
+    ap.add_argument("--server-window", type=float, default=2.0)
+    ap.add_argument("--rate", type=float, default=540, help="постов в минуту (token bucket)")
+    ap.add_argument("--burst", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--mode", choices=("all", "old", "new", "albums"), default="all")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
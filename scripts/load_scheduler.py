@@ -0,0 +1,134 @@
+"""
+Несколько экземпляров планировщика (bot/scheduler.py) на одной БД: задание "tick" каждую секунду
+и разовое "postat" (как /postat), лидера убиваем kill -9 каждые --kill-every секунд и запускаем
+взамен новый экземпляр.
+
+Печатает: сколько тиков и кто их выполнил, дубли (два тика ближе 0.5 с — два лидера сразу),
+время переключения после kill -9 (до первого тика нового лидера) и сколько раз выполнено
+разовое задание (должно быть ровно 1, хотя его лидер мог умереть до срока).
+
+Запуск: python scripts/load_scheduler.py [--instances 3] [--kills 4] [--kill-every 4] [--lease 3]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def log_tick(path: str, holder: str, task: str) -> None:
+    from db import connect
+
+    with connect(path) as conn:
+        conn.execute("INSERT INTO ticks (holder, at, task) VALUES (?, ?, ?)", (holder, time.time(), task))
+
+
+async def child(path: str, lease: float) -> None:
+    """Один экземпляр бота: только планировщик и аренда."""
+    from bot import scheduler
+    from db.aio import run_write
+
+    sched = scheduler.create_scheduler(path)
+    leader = scheduler.Leader(ttl=lease, path=path, on_elected=sched.resume, on_demoted=sched.pause, on_renewed=sched.wakeup)
+    scheduler.register("tick", lambda: run_write(log_tick, path, leader.holder, "tick"))
+    scheduler.register("postat", lambda: run_write(log_tick, path, leader.holder, "postat"))
+    sched.start(paused=True)
+    if sched.get_job("tick") is None:
+        sched.add_job(scheduler.run_task, "interval", seconds=1, args=["tick"], id="tick", replace_existing=True)
+    leader.start()
+    print("ready", flush=True)
+    await asyncio.Event().wait()
+
+
+async def spawn(path: str, lease: float) -> asyncio.subprocess.Process:
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, __file__, "--child", "--db", path, "--lease", str(lease), cwd=ROOT,
+        stdout=asyncio.subprocess.PIPE,
+    )
+    await proc.stdout.readline()
+    return proc
+
+
+async def run(args) -> None:
+    from bot import scheduler
+    from db import connect
+    from db.migrations import migrate
+
+    path = str(Path(tempfile.mkdtemp(prefix="avatar-scheduler-")) / "scheduler.db")
+    migrate(path)
+    with connect(path) as conn:
+        conn.execute("CREATE TABLE ticks (holder TEXT, at REAL, task TEXT)")
+    print(f"{args.instances} instances, lease {args.lease}s, kill -9 the leader every {args.kill_every}s × {args.kills}")
+
+    procs = [await spawn(path, args.lease) for _ in range(args.instances)]
+    # Разовое задание (как /postat) — срок после первого убийства лидера
+    store = scheduler.create_scheduler(path)
+    store.start(paused=True)
+    store.add_job(scheduler.run_task, "date", run_date=datetime.now() + timedelta(seconds=args.kill_every * 1.5),
+                  args=["postat"], id="postat")
+    store.shutdown(wait=False)
+
+    failovers = []
+    for _ in range(args.kills):
+        await asyncio.sleep(args.kill_every)
+        leader = scheduler.current_leader(path=path)
+        if not leader:
+            print("  no leader at kill time")
+            continue
+        pid = int(leader["holder"].split(":")[1])
+        victim = next(p for p in procs if p.pid == pid)
+        victim.kill()
+        await victim.wait()
+        killed_at = time.time()
+        procs.remove(victim)
+        procs.append(await spawn(path, args.lease))
+        # Ждём первого тика нового лидера
+        while time.time() - killed_at < args.lease * 4:
+            with connect(path) as conn:
+                row = conn.execute(
+                    "SELECT at FROM ticks WHERE at > ? AND holder != ? ORDER BY at LIMIT 1", (killed_at, leader["holder"])
+                ).fetchone()
+            if row:
+                failovers.append(row[0] - killed_at)
+                break
+            await asyncio.sleep(0.1)
+    await asyncio.sleep(2)
+    for p in procs:
+        p.kill()
+        await p.wait()
+
+    with connect(path) as conn:
+        ticks = [r["at"] for r in conn.execute("SELECT at FROM ticks WHERE task = 'tick' ORDER BY at")]
+        holders = conn.execute("SELECT COUNT(DISTINCT holder) FROM ticks WHERE task = 'tick'").fetchone()[0]
+        postat = conn.execute("SELECT COUNT(*) FROM ticks WHERE task = 'postat'").fetchone()[0]
+    dupes = sum(1 for a, b in zip(ticks, ticks[1:]) if b - a < 0.5)
+    print(f"  ticks {len(ticks)} by {holders} leaders, duplicates {dupes}")
+    if failovers:
+        print(f"  failover after kill -9: mean {sum(failovers) / len(failovers):.1f}s  max {max(failovers):.1f}s  "
+              f"({len(failovers)}/{args.kills})")
+    print(f"  one-off job executed {postat} time(s)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="scheduler leader failover under kill -9")
+    ap.add_argument("--instances", type=int, default=3)
+    ap.add_argument("--kills", type=int, default=4)
+    ap.add_argument("--kill-every", type=float, default=4.0)
+    ap.add_argument("--lease", type=float, default=3.0, help="SCHEDULER_LEASE_SECONDS")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--db", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    import logging
+    logging.disable(logging.WARNING)
+    asyncio.run(child(args.db, args.lease) if args.child else run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Пересказы Raw (bot/summarize.py) против заглушки LLM (scripts/stub_llm.py) с задержкой ответа:
+--rows записей (длинные расшифровки и короткие заметки), потом те же тексты ещё раз (повторный Plaud).
+
+Режимы:
+  per-row  — запрос на каждую запись, по одному (как наивный цикл)
+  batched  — короткие заметки пачками, до SUMMARY_CONCURRENCY запросов одновременно
+  offline  — без ключа: экстрактивный TF-IDF пересказ
+Повторный прогон тех же текстов — из кэша по хэшу, без запросов.
+
+Печатает: запросов к LLM, время, записей в секунду, попадания кэша.
+
+Запуск: python scripts/load_summarize.py [--rows 300] [--latency 0.3] [--concurrency 4]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench_classify import FILLER  # noqa: E402
+
+TOPICS = [
+    "Обсудили с партнёром договор по продукту, решили подписать до пятницы.",
+    "Тренировка была тяжёлой, пульс держался высоко, надо добавить сон.",
+    "Дети просили поехать на выходных к родителям, согласовали субботу.",
+    "Сдвигаем дедлайн спринта, потому что интеграция с банком не готова.",
+    "На танцах разбирали новую связку, нужно повторить дома перед соревнованием.",
+    "Врач посмотрел анализы, всё в норме, повторить через три месяца.",
+]
+
+
+def transcript(rng: random.Random, sentences: int) -> str:
+    out = []
+    for _ in range(sentences):
+        if rng.random() < 0.3:
+            out.append(rng.choice(TOPICS))
+        else:
+            out.append(" ".join(rng.choices(FILLER, k=rng.randint(6, 16))).capitalize() + ".")
+    return " ".join(out)
+
+
+def seed(path: str, texts: list[str]) -> None:
+    from db import connect
+
+    now = datetime.utcnow().isoformat()
+    with connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO raw (user_id, chat_id, title, content, source, created_at, rapa_stage) VALUES (1, 1, ?, ?, 'Plaud', ?, 'Raw')",
+            [(t[:80], t, now) for t in texts],
+        )
+
+
+async def run_mode(label: str, path: str, texts: list[str], repeat: bool) -> None:
+    from bot import summarize as sm
+    from db import connect
+
+    with connect(path) as conn:
+        conn.execute("DELETE FROM raw")
+        conn.execute("DELETE FROM summary_cache")
+    seed(path, texts)
+    from stub_llm import StubHandler
+
+    passes = [("first", texts)] + ([("repeat", texts)] if repeat else [])
+    for name, batch in passes:
+        if name == "repeat":
+            seed(path, batch)
+        before = StubHandler.calls["chat"]
+        t0 = time.perf_counter()
+        total = {"rows": 0, "cache_hits": 0, "extractive": 0, "short": 0}
+        while True:
+            stats = await sm.summarize_pending(path, limit=sm.LIMIT)
+            for k in total:
+                total[k] += stats[k]
+            if stats["rows"] < sm.LIMIT:
+                break
+        elapsed = time.perf_counter() - t0
+        done = total["rows"] - total["short"]
+        print(f"  {label:>8} {name:>6}: {total['rows']:4d} rows ({total['short']} short)  "
+              f"LLM requests {StubHandler.calls['chat'] - before:4d}  cache hits {total['cache_hits']:4d}  "
+              f"extractive {total['extractive']:4d}  {elapsed:6.2f} s  {done / elapsed:7.1f} summaries/s")
+
+
+async def run(args) -> None:
+    import stub_llm
+
+    stub = stub_llm.serve(latency=args.latency)
+    path = str(Path(tempfile.mkdtemp(prefix="avatar-summary-")) / "summary.db")
+    os.environ["DB_PATH"] = path
+    from bot import summarize as sm
+    from db.aio import shutdown
+    from db.migrations import migrate
+
+    migrate(path)
+    rng = random.Random(args.seed)
+    texts = [transcript(rng, rng.randint(40, 200)) if rng.random() < 0.3 else transcript(rng, rng.randint(3, 8))
+             for _ in range(args.rows)]
+    print(f"{args.rows} rows, stub LLM latency {args.latency}s")
+
+    os.environ.update({"PERPLEXITY_API_KEY": "stub", "PERPLEXITY_BASE_URL": f"http://127.0.0.1:{stub.server_port}"})
+    sm.BATCH_MAX_ITEMS, sm.CONCURRENCY = 1, 1
+    await run_mode("per-row", path, texts, repeat=False)
+    sm.BATCH_MAX_ITEMS, sm.CONCURRENCY = 8, args.concurrency
+    await run_mode("batched", path, texts, repeat=True)
+    os.environ.pop("PERPLEXITY_API_KEY")
+    await run_mode("offline", path, texts, repeat=False)
+    shutdown(wait=True)
+    stub.shutdown()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="raw summarisation: per-row vs batched vs offline")
+    ap.add_argument("--rows", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.3, help="секунд на ответ заглушки LLM")
+    ap.add_argument("--concurrency", type=int, default=4, help="SUMMARY_CONCURRENCY для batched")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
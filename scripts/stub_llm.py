@@ -0,0 +1,167 @@
+"""
+Локальная заглушка OpenAI-совместимого LLM (Perplexity) и Bot API sendMessage — для проверки
+фоновой задачи sprint-report и пересказов Raw (bot/summarize.py) без сети и ключей.
+Запрос с заметками «[1] …» получает JSON пересказов по номерам, остальные — анализ спринта.
+
+Сервер:  python scripts/stub_llm.py --port 8765 [--latency 2] [--fail-rate 0.3]
+         PERPLEXITY_BASE_URL=http://127.0.0.1:8765 PERPLEXITY_API_KEY=stub
+         TELEGRAM_API_BASE=http://127.0.0.1:8765 python -m api.collect_api
+Демо:    python scripts/stub_llm.py --demo [--latency 2] [--fail-rate 0.5]
+         — POST /api/gtd/sprint-report (202 сразу), опрос /api/jobs/<id> до done/failed.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+ANALYSIS = """1. Сильные стороны: спринт закрыт по основным задачам.
+2. Зоны внимания: спорт просел во второй половине.
+3. Система планирования: задачи мельче — проще закрывать.
+4. Рекомендации: один фокус в день, ревью в пятницу.
+5. Вопрос: что бы ты убрал из следующего спринта?"""
+
+
+_ITEM_RE = re.compile(r"^\[(\d+)\]\n", re.M)
+
+
+def _summary_items(body: dict) -> dict[str, str]:
+    """Заметки из запроса пересказа: {"1": текст, ...}; пусто — это не пересказ."""
+    messages = body.get("messages") or []
+    text = messages[-1].get("content", "") if messages else ""
+    marks = list(_ITEM_RE.finditer(text))
+    return {m.group(1): text[m.end(): marks[i + 1].start() if i + 1 < len(marks) else len(text)].strip()
+            for i, m in enumerate(marks)}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fail_rate = 0.0
+    rng = random.Random(1)
+    calls = {"chat": 0, "chat_failed": 0, "sendMessage": 0, "summary_items": 0}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, obj: dict) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # клиент ушёл по таймауту — так и задумано в проверке таймаутов
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            time.sleep(self.latency)
+            with self.lock:
+                self.calls["chat"] += 1
+                fail = self.rng.random() < self.fail_rate
+                if fail:
+                    self.calls["chat_failed"] += 1
+            if fail:
+                self._json(500, {"error": {"message": "stub: injected failure", "type": "server_error"}})
+                return
+            items = _summary_items(body)
+            if items:
+                with self.lock:
+                    self.calls["summary_items"] += len(items)
+            content = json.dumps({n: f"Кратко: {text[:120]}" for n, text in items.items()}, ensure_ascii=False) if items else ANALYSIS
+            self._json(200, {
+                "id": f"stub-{time.time_ns()}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "sonar"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 80, "total_tokens": 180},
+            })
+        elif self.path.endswith("/sendMessage"):
+            with self.lock:
+                self.calls["sendMessage"] += 1
+            self._json(200, {"ok": True, "result": {"message_id": self.calls["sendMessage"], "date": int(time.time()),
+                                                    "chat": {"id": body.get("chat_id"), "type": "private"}}})
+        else:
+            self._json(404, {"ok": False, "description": "Not Found"})
+
+
+def serve(port: int = 0, latency: float = 0.0, fail_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Запускает заглушку в фоновом потоке (для тестов/демо). server.server_port — порт."""
+    StubHandler.latency = latency
+    StubHandler.fail_rate = fail_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def demo(latency: float, fail_rate: float) -> None:
+    stub = serve(latency=latency, fail_rate=fail_rate)
+    base = f"http://127.0.0.1:{stub.server_port}"
+    tmp = Path(tempfile.mkdtemp(prefix="avatar-jobs-"))
+    os.environ.update({
+        "DB_PATH": str(tmp / "jobs.db"),
+        "PERPLEXITY_BASE_URL": base,
+        "PERPLEXITY_API_KEY": "stub",
+        "TELEGRAM_API_BASE": base,
+        "RAW_OWNER_USER_ID": "1",
+        "JOBS_RETRY_BASE_DELAY": "0.5",
+        "JOBS_POLL_INTERVAL": "0.2",
+    })
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    import api.collect_api as api
+
+    api.DB_PATH = os.environ["DB_PATH"]
+    api.BOT_TOKEN = "42:STUB"
+    client = api.create_app().test_client()
+    t0 = time.perf_counter()
+    r = client.post("/api/gtd/sprint-report", json={"sprint_id": "s9_2026", "sprint": {"id": "Спринт 9"}, "items": []})
+    print(f"POST sprint-report: {r.status_code} in {(time.perf_counter() - t0) * 1000:.1f} ms → {r.get_json()}")
+    url = r.get_json()["status_url"]
+    while True:
+        job = client.get(url).get_json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.2)
+    print(f"job {job['status']} after {time.perf_counter() - t0:.1f}s, attempts {job['attempts']}, error: {job['error']}")
+    if job["result"]:
+        print(f"  result: sent={not job['result'].get('warning')}, analysis {len(job['result']['analysis'])} chars")
+    print(f"  stub calls: {StubHandler.calls}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="stub LLM + Bot API sendMessage")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="секунд на ответ LLM")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="доля ответов 500")
+    ap.add_argument("--demo", action="store_true")
+    args = ap.parse_args()
+    if args.demo:
+        demo(args.latency, args.fail_rate)
+        return
+    server = serve(args.port, args.latency, args.fail_rate)
+    print(f"stub LLM on http://127.0.0.1:{server.server_port} (latency {args.latency}s, fail rate {args.fail_rate})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()